@@ -1,22 +1,80 @@
-
+from concurrent.futures import ProcessPoolExecutor
 from PyPDF2 import PdfReader
-from gpt4all import GPT4All
-import pyttsx3
 import os
+import sys
+import tempfile
+import threading
+import time
+from audio import read_wav_header
+from boilerplate import BoilerplateFilter
+from cache import SummaryCache
+from chunking import approx_token_count, iter_sentences
+
+
+def _extract_page_range(pdf_path, start, stop):
+    """Extract the text of pages [start, stop) in a worker process."""
+    # Each worker opens its own reader; PdfReader objects are not picklable
+    reader = PdfReader(pdf_path)
+    return [reader.pages[i].extract_text() for i in range(start, stop)]
+
 
 class PDFProcessingAgent:
     def __init__(self):
         self.reader = None
     
-    def process_pdf(self, pdf_path, chunk_size=1000):
-        """Extract text from PDF and return as a single string."""
+    def iter_pages(self, pdf_path):
+        """Yield (page_number, text) for each non-empty page as it is extracted.
+
+        Pages are parsed lazily, so callers can start working on the first
+        page while the rest of the document is still being read. Errors are
+        raised to the caller rather than swallowed.
+        """
+        self.reader = PdfReader(pdf_path)
+        for page_number, page in enumerate(self.reader.pages, start=1):
+            page_text = page.extract_text()
+            if page_text:
+                yield page_number, page_text
+
+    def iter_pages_parallel(self, pdf_path, workers=None, pages_per_task=None):
+        """Yield (page_number, text) like iter_pages, extracting across a process pool.
+
+        The page range is split into small batches so the first pages are
+        yielded while later batches are still being parsed. Output is
+        identical to iter_pages.
+        """
+        self.reader = PdfReader(pdf_path)
+        page_count = len(self.reader.pages)
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1 or page_count <= 1:
+            yield from self.iter_pages(pdf_path)
+            return
+        
+        if pages_per_task is None:
+            # Several batches per worker keeps the pool busy and the first
+            # results arriving early
+            pages_per_task = max(1, -(-page_count // (workers * 4)))
+        ranges = [(start, min(start + pages_per_task, page_count))
+                  for start in range(0, page_count, pages_per_task)]
+        
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+            futures = [executor.submit(_extract_page_range, pdf_path, start, stop)
+                       for start, stop in ranges]
+            for (start, _), future in zip(ranges, futures):
+                for offset, page_text in enumerate(future.result()):
+                    if page_text:
+                        yield start + offset + 1, page_text
+
+    def process_pdf(self, pdf_path, strip_boilerplate=True):
+        """Extract text from PDF and return as a single string.
+
+        Running headers, footers and page numbers are removed unless
+        strip_boilerplate is False.
+        """
         try:
-            self.reader = PdfReader(pdf_path)
-            text = ""
-            for page in self.reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+            pages = self.iter_pages(pdf_path)
+            if strip_boilerplate:
+                pages = BoilerplateFilter().filter(pages)
+            text = "".join(page_text + "\n" for _, page_text in pages)
             
             if not text.strip():
                 raise ValueError("No text could be extracted from the PDF")
@@ -28,50 +86,186 @@ class PDFProcessingAgent:
             return ""  # Return empty string if there's an error
 
 class TextSummarizationAgent:
-    def __init__(self, model_name="orca-mini-3b-gguf2-q4_0.ggml"):
-        try:
-            self.model = GPT4All(model_name, allow_download=True)
-        except Exception as e:
-            print(f"Warning: Could not load model {model_name}. Using simple text truncation instead. Error: {str(e)}")
-            self.model = None
+    PROMPT_TEMPLATE = "Please summarize the following text in a concise manner:\n\n{text}"
+    REDUCE_PROMPT_TEMPLATE = ("Please combine the following consecutive summaries into a single "
+                              "concise summary that keeps their order:\n\n{text}")
+    # Framing gpt4all's chat_session() applies, needed when streaming outside a session
+    CHAT_TEMPLATE = "### Human: \n{prompt}\n### Assistant:\n"
+    CONTEXT_TOKENS = 2048  # Context window of the default model
+    PROMPT_OVERHEAD_TOKENS = 64  # Chat session header/footer plus a safety margin
+    # Ends the truncated text returned when the model is unavailable or fails
+    TRUNCATION_MARKER = "... [truncated]"
+
+    def __init__(self, model_name="orca-mini-3b-gguf2-q4_0.ggml", max_tokens=500, n_threads=None,
+                 cache=None, model_factory=None):
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        self.n_threads = n_threads
+        self.cache = cache
+        # Called as model_factory(model_name, n_threads) instead of GPT4All,
+        # e.g. with the offline stand-ins in fakes.py
+        self.model_factory = model_factory
+        # The model is loaded (and downloaded if needed) on first use, so
+        # building the agent is free; warm_up() starts loading it early
+        self._model = None
+        self._model_loaded = False
+        self._model_lock = threading.Lock()
+    
+    @property
+    def model(self):
+        """The GPT4All model, or None if it could not be loaded."""
+        with self._model_lock:
+            if not self._model_loaded:
+                try:
+                    if self.model_factory is not None:
+                        self._model = self.model_factory(self.model_name, self.n_threads)
+                    else:
+                        from gpt4all import GPT4All
+                        self._model = GPT4All(self.model_name, allow_download=True,
+                                              n_threads=self.n_threads)
+                except Exception as e:
+                    print(f"Warning: Could not load model {self.model_name}. Using simple text truncation instead. Error: {str(e)}")
+                    self._model = None
+                self._model_loaded = True
+            return self._model
+    
+    def warm_up(self):
+        """Load the model in a background thread so it is ready for the first chunk."""
+        thread = threading.Thread(target=lambda: self.model, daemon=True)
+        thread.start()
+        return thread
+    
+    def cache_key(self, text, prompt_template=None):
+        """Cache key covering the text, model, prompt and generation parameters."""
+        return SummaryCache.make_key(text, self.model_name, prompt_template or self.PROMPT_TEMPLATE,
+                                     {"max_tokens": self.max_tokens})
+    
+    def count_tokens(self, text):
+        """Count tokens in text for chunk sizing."""
+        # gpt4all does not expose the model tokenizer, so use the approximation
+        return approx_token_count(text)
+    
+    @classmethod
+    def token_budget(cls, max_tokens=500):
+        """Largest chunk, in tokens, that fits in the context alongside the prompt and a
+        max_tokens summary. Needs no model, so chunking can be planned before one loads."""
+        prompt_tokens = approx_token_count(cls.PROMPT_TEMPLATE.format(text=""))
+        return cls.CONTEXT_TOKENS - max_tokens - prompt_tokens - cls.PROMPT_OVERHEAD_TOKENS
     
-    def summarize(self, text):
+    def input_token_budget(self):
+        """Largest chunk, in tokens, that fits in the context alongside the prompt and summary."""
+        return self.token_budget(self.max_tokens)
+    
+    def summarize(self, text, prompt_template=None):
         """Generate a summary of the given text."""
+        prompt_template = prompt_template or self.PROMPT_TEMPLATE
+        key = None
+        if self.cache is not None:
+            key = self.cache_key(text, prompt_template)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
         if self.model is None:
             # Fallback to simple text truncation if model loading failed
-            return text[:500] + "... [truncated]"
+            return text[:500] + self.TRUNCATION_MARKER
             
         try:
-            prompt = f"Please summarize the following text in a concise manner:\n\n{text}"
+            prompt = prompt_template.format(text=text)
             with self.model.chat_session():
-                response = self.model.generate(prompt, max_tokens=500)
+                response = self.model.generate(prompt, max_tokens=self.max_tokens)
+            if key is not None and response and response.strip():
+                self.cache.put(key, response)
             return response
         except Exception as e:
             print(f"Warning: Summarization failed: {str(e)}")
-            return text[:500] + "... [truncated]"
+            return text[:500] + self.TRUNCATION_MARKER
+    
+    def summarize_stream(self, text, prompt_template=None, min_chars=40):
+        """Yield the summary sentence by sentence while the model is still generating.
+
+        Short sentences are merged up to min_chars so TTS isn't called for
+        every fragment.
+        """
+        prompt_template = prompt_template or self.PROMPT_TEMPLATE
+        key = None
+        if self.cache is not None:
+            key = self.cache_key(text, prompt_template)
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield from iter_sentences([cached], min_chars)
+                return
+        
+        if self.model is None:
+            yield from iter_sentences([text[:500] + self.TRUNCATION_MARKER], min_chars)
+            return
+        
+        parts = []
+        
+        def record(tokens):
+            for token in tokens:
+                parts.append(token)
+                yield token
+        
+        yielded = False
+        try:
+            # gpt4all cannot stream inside chat_session(), so apply its framing here
+            prompt = self.CHAT_TEMPLATE.format(prompt=prompt_template.format(text=text))
+            tokens = self.model.generate(prompt, max_tokens=self.max_tokens, streaming=True)
+            for sentence in iter_sentences(record(tokens), min_chars):
+                yielded = True
+                yield sentence
+        except Exception as e:
+            print(f"Warning: Streaming summarization failed: {str(e)}")
+            if not yielded:
+                yield from iter_sentences([text[:500] + self.TRUNCATION_MARKER], min_chars)
+            return
+        
+        response = "".join(parts)
+        if key is not None and response.strip():
+            self.cache.put(key, response)
 
-import os
-import sys
-import tempfile
-import time
-import pyttsx3
-from pydub import AudioSegment
 
 class TTSAgent:
-    def __init__(self):
-        self.engine = None
+    # Chunks are kept as PCM WAV; only the published podcast is encoded
+    FORMAT = "wav"
+
+    def __init__(self, rate=180, volume=0.9, engine_factory=None):
         self.voices = []
-        self._init_engine()
+        # Called instead of pyttsx3.init(), e.g. with the stand-in in fakes.py
+        self.engine_factory = engine_factory
+        self.rate = rate  # Speed of speech
+        self.volume = volume  # Volume level (0.0 to 1.0)
+        # The engine starts on first use; its retries can take seconds
+        self._engine = None
+        self._engine_started = False
+    
+    @property
+    def engine(self):
+        """The pyttsx3 engine, or None if it could not be initialized."""
+        if not self._engine_started:
+            self._init_engine()
+        return self._engine
     
     def _init_engine(self):
         """Initialize the TTS engine with available voices."""
+        self._engine_started = True
+        self._engine = None
+        init = self.engine_factory
+        if init is None:
+            try:
+                import pyttsx3
+            except ImportError as e:
+                print(f"[TTS] Warning: pyttsx3 is not available: {str(e)}")
+                return
+            init = pyttsx3.init
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                self.engine = pyttsx3.init()
+                self._engine = init()
                 # Set properties for better voice quality
-                self.engine.setProperty('rate', 180)  # Speed of speech
-                self.engine.setProperty('volume', 0.9)  # Volume level (0.0 to 1.0)
+                self.engine.setProperty('rate', self.rate)
+                self.engine.setProperty('volume', self.volume)
                 
                 # Get available voices
                 self.voices = self.engine.getProperty('voices')
@@ -88,6 +282,16 @@ class TTSAgent:
                 else:
                     time.sleep(1)  # Wait before retrying
     
+    def settings(self):
+        """Return the settings that determine the synthesized audio for a given text."""
+        voice = None
+        if self.engine is not None:
+            try:
+                voice = self.engine.getProperty('voice')
+            except Exception:
+                pass
+        return {"voice": voice, "rate": self.rate, "volume": self.volume, "format": self.FORMAT}
+    
     def _save_direct_mp3(self, text, output_file):
         """Save text directly to MP3 using pyttsx3."""
         try:
@@ -100,8 +304,38 @@ class TTSAgent:
             print(f"[TTS] Error saving to MP3: {str(e)}")
             return None
     
+    def _save_wav(self, text, output_file):
+        """Save text as PCM WAV, converting losslessly if the engine writes another format."""
+        output_dir = os.path.dirname(output_file)
+        temp_file = os.path.join(output_dir, f"temp_{os.urandom(8).hex()}.wav")
+        try:
+            self.engine.save_to_file(text, temp_file)
+            self.engine.runAndWait()
+            if not os.path.exists(temp_file) or os.path.getsize(temp_file) == 0:
+                print("[TTS] Error: WAV file not generated or is empty")
+                return None
+            if read_wav_header(temp_file) is None:
+                # e.g. AIFF from the macOS driver; PCM to PCM loses nothing
+                from pydub import AudioSegment
+                AudioSegment.from_file(temp_file).export(output_file, format="wav")
+            else:
+                os.replace(temp_file, output_file)
+            return output_file
+        except Exception as e:
+            print(f"[TTS] Error saving to WAV: {str(e)}")
+            return None
+        finally:
+            if os.path.exists(temp_file):
+                try:
+                    os.unlink(temp_file)
+                except OSError:
+                    pass
+    
     def text_to_speech(self, text, output_file):
-        """Convert text to speech and save to file."""
+        """Convert text to speech and save to file.
+
+        A .wav output_file gets lossless PCM; anything else is saved as MP3.
+        """
         if not text or not text.strip():
             print("[TTS] Error: Empty text provided")
             return None
@@ -114,6 +348,9 @@ class TTSAgent:
         output_dir = os.path.dirname(output_file)
         if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir, exist_ok=True)
+        
+        if output_file.lower().endswith(".wav"):
+            return self._save_wav(text, output_file)
             
         # Create a temporary file in the same directory as the output file
         # to avoid cross-device link issues
@@ -150,6 +387,7 @@ class TTSAgent:
                 
                 # Convert WAV to MP3
                 try:
+                    from pydub import AudioSegment
                     audio = AudioSegment.from_wav(temp_wav_path)
                     if len(audio) == 0:
                         print("[TTS] Error: Audio has 0 duration")
@@ -198,10 +436,18 @@ class TTSAgent:
 class PublishingAgent:
     def __init__(self):
         self.published_files = []
+        self.segments = {}  # playlist path -> [(segment path, seconds)] in play order
     
-    def publish(self, file_path):
-        """Publish the file (in this case, just track published files)."""
+    def publish(self, file_path, playlist=None, seconds=None):
+        """Publish the file (in this case, just track published files).
+
+        With playlist, file_path is the next segment of that streaming
+        playlist; segments are registered one by one while the job runs.
+        """
         if os.path.exists(file_path):
-            self.published_files.append(file_path)
+            if playlist is not None:
+                self.segments.setdefault(playlist, []).append((file_path, seconds))
+            else:
+                self.published_files.append(file_path)
             return True
         return False
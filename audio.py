@@ -0,0 +1,328 @@
+import json
+import os
+import struct
+import ffmpeg
+
+# Codec ffmpeg writes for each output extension we stream-copy into
+_CONTAINER_CODECS = {".mp3": "mp3", ".wav": "pcm_s16le", ".ogg": "vorbis", ".opus": "opus"}
+PLAYLIST_NAME = "playlist.m3u8"
+SEGMENT_PATTERN = "segment_%05d.ts"
+
+
+def probe_audio(path):
+    """Return (codec, sample_rate, channels, duration_seconds) from the file header.
+
+    Only the container and stream headers are read; nothing is decoded.
+    """
+    info = ffmpeg.probe(path)
+    stream = next(s for s in info["streams"] if s.get("codec_type") == "audio")
+    duration = float(stream.get("duration") or info.get("format", {}).get("duration") or 0)
+    return stream["codec_name"], int(stream["sample_rate"]), int(stream["channels"]), duration
+
+
+def read_wav_header(path):
+    """Parse a PCM WAV file's header without reading its samples.
+
+    Returns a dict with sample_rate, channels, sample_width, data_offset,
+    data_size, frames, duration_ms and size, or None if path is not PCM WAV.
+    """
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+            chunk_id, size = header[:4], struct.unpack("<I", header[4:])[0]
+            if chunk_id == b"fmt ":
+                data = f.read(size + size % 2)
+                if len(data) < 16:
+                    return None
+                audio_format, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", data[:16])
+                # 1 is PCM; 0xFFFE (extensible) is accepted for PCM payloads too
+                if audio_format not in (1, 0xFFFE) or bits % 8 or not channels or not sample_rate:
+                    return None
+                fmt = (sample_rate, channels, bits // 8)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    return None
+                sample_rate, channels, sample_width = fmt
+                data_offset = f.tell()
+                # Streaming writers may leave the data size unset or too large
+                block_align = channels * sample_width
+                data_size = min(size, file_size - data_offset) // block_align * block_align
+                frames = data_size // block_align
+                return {
+                    "sample_rate": sample_rate,
+                    "channels": channels,
+                    "sample_width": sample_width,
+                    "data_offset": data_offset,
+                    "data_size": data_size,
+                    "frames": frames,
+                    "duration_ms": frames * 1000 // sample_rate,
+                    "size": file_size,
+                }
+            else:
+                f.seek(size + size % 2, 1)
+
+
+def sidecar_path(path):
+    return f"{path}.json"
+
+
+def write_sidecar(path, header):
+    """Record a chunk's WAV header next to it so later stages can skip parsing."""
+    with open(sidecar_path(path), "w", encoding="utf-8") as f:
+        json.dump(header, f)
+
+
+def load_chunk_header(path):
+    """Return the header of a WAV chunk, or None if the chunk is missing or invalid.
+
+    The sidecar is trusted when the file size still matches it; otherwise
+    the WAV header is parsed again. No audio is decoded either way.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return None
+    try:
+        with open(sidecar_path(path), encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("size") == size:
+            return header
+    except (OSError, ValueError):
+        pass
+    header = read_wav_header(path)
+    if header is not None and header["frames"] > 0:
+        write_sidecar(path, header)
+        return header
+    return None
+
+
+def _id3v2_size(header):
+    """Size of a leading ID3v2 tag given the file's first 10 bytes, or 0 if there is none."""
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7F)  # Syncsafe integer
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+class StreamingConcat:
+    """Append audio files one at a time to a single output file.
+
+    The output grows as chunks are appended, so it is complete moments after
+    the last chunk arrives. PCM WAV chunks (the pipeline's intermediate
+    format) are read straight into a single long-running encoder, so the
+    only codec pass is the final encode. If the first chunk already has the
+    output codec, chunks are appended frame for frame without re-encoding
+    and a chunk with different parameters is converted to match on its own.
+    Anything else is decoded once by ffmpeg. Memory use is constant.
+
+    With segment_dir, the same encoder also writes an HLS event playlist of
+    AAC segments of about segment_seconds each, which players can start on
+    while chunks are still being appended; new_segments() returns the
+    segments finished so far.
+    """
+
+    BLOCK_SIZE = 64 * 1024
+
+    def __init__(self, output_path, bitrate="192k", tags=None, segment_dir=None,
+                 segment_seconds=6, segment_bitrate="128k"):
+        self.output_path = output_path
+        self.bitrate = bitrate
+        self.tags = tags or {}
+        self.segment_dir = segment_dir
+        self.segment_seconds = segment_seconds
+        self.segment_bitrate = segment_bitrate
+        self.playlist_path = os.path.join(segment_dir, PLAYLIST_NAME) if segment_dir else None
+        self.segments = 0
+        self.chunks = 0
+        self._format = None
+        self._copy = False
+        self._file = None
+        self._encoder = None
+        self._pcm_bytes = 0
+
+    def _metadata(self):
+        return {f"metadata:g:{i}": f"{key}={value}" for i, (key, value) in enumerate(self.tags.items())}
+
+    def _chunk_format(self, path):
+        """Return ((codec, sample_rate, channels), wav_header) for a chunk."""
+        header = load_chunk_header(path) if path.lower().endswith(".wav") else None
+        if header is not None:
+            codec = f"pcm_s{8 * header['sample_width']}le"
+            return (codec, header["sample_rate"], header["channels"]), header
+        return probe_audio(path)[:3], None
+
+    def _start(self, path):
+        (codec, sample_rate, channels), _ = self._chunk_format(path)
+        self._format = (codec, sample_rate, channels)
+        target_codec = _CONTAINER_CODECS.get(os.path.splitext(self.output_path)[1].lower())
+        # Segments need an encoder, so MP3 chunks are decoded when segmenting
+        self._copy = codec == target_codec == "mp3" and not self.segment_dir
+        if self._copy:
+            print("  - Chunks are already MP3, appending frames without re-encoding")
+            self._file = open(self.output_path, "wb")
+        else:
+            pcm = ffmpeg.input("pipe:", format="s16le", ar=sample_rate, ac=channels)
+            outputs = [pcm.output(self.output_path, audio_bitrate=self.bitrate, **self._metadata())]
+            if self.segment_dir:
+                self._clear_segments()
+                outputs.append(pcm.output(
+                    self.playlist_path, format="hls", acodec="aac",
+                    audio_bitrate=self.segment_bitrate, hls_time=self.segment_seconds,
+                    hls_list_size=0, hls_playlist_type="event", hls_flags="temp_file",
+                    hls_segment_filename=os.path.join(self.segment_dir, SEGMENT_PATTERN)))
+            self._encoder = (
+                ffmpeg.merge_outputs(*outputs)
+                .global_args("-loglevel", "error")
+                .overwrite_output()
+                .run_async(pipe_stdin=True)
+            )
+
+    def _clear_segments(self):
+        """Remove a previous run's playlist and segments, so players never mix the two."""
+        os.makedirs(self.segment_dir, exist_ok=True)
+        for name in os.listdir(self.segment_dir):
+            if name == PLAYLIST_NAME or (name.startswith("segment_") and ".ts" in name):
+                os.remove(os.path.join(self.segment_dir, name))
+
+    def new_segments(self):
+        """Return [(path, seconds)] for the segments listed in the playlist since the last call.
+
+        ffmpeg lists a segment once it is complete and replaces the playlist
+        atomically, so everything returned can be served right away.
+        """
+        if not self.playlist_path:
+            return []
+        try:
+            with open(self.playlist_path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return []
+        listed = []
+        seconds = None
+        for line in lines:
+            if line.startswith("#EXTINF:"):
+                seconds = float(line[len("#EXTINF:"):].split(",")[0])
+            elif line and not line.startswith("#") and seconds is not None:
+                listed.append((os.path.join(self.segment_dir, line), seconds))
+                seconds = None
+        new = listed[self.segments:]
+        self.segments = len(listed)
+        return new
+
+    def _pipe(self, process, sink):
+        """Copy a subprocess's stdout into sink in fixed-size blocks."""
+        copied = 0
+        while True:
+            block = process.stdout.read(self.BLOCK_SIZE)
+            if not block:
+                break
+            sink.write(block)
+            copied += len(block)
+        if process.wait() != 0:
+            raise RuntimeError("ffmpeg failed to decode the chunk")
+        return copied
+
+    def _append_mp3_frames(self, path):
+        """Append a chunk's MP3 frames, leaving out its ID3 tags."""
+        end = os.path.getsize(path)
+        with open(path, "rb") as f:
+            # Drop a trailing ID3v1 tag
+            if end >= 128:
+                f.seek(end - 128)
+                if f.read(3) == b"TAG":
+                    end -= 128
+            f.seek(0)
+            f.seek(_id3v2_size(f.read(10)))
+            remaining = end - f.tell()
+            while remaining > 0:
+                block = f.read(min(self.BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                self._file.write(block)
+                remaining -= len(block)
+
+    def _append_pcm(self, path, header):
+        remaining = header["data_size"]
+        with open(path, "rb") as f:
+            f.seek(header["data_offset"])
+            while remaining > 0:
+                block = f.read(min(self.BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                self._encoder.stdin.write(block)
+                remaining -= len(block)
+        return header["data_size"] - remaining
+
+    def append(self, path):
+        """Append one audio file to the output."""
+        if self._format is None:
+            self._start(path)
+        chunk_format, header = self._chunk_format(path)
+        if self._copy:
+            if chunk_format == self._format:
+                self._append_mp3_frames(path)
+            else:
+                # Convert just this chunk to the stream's parameters
+                _, sample_rate, channels = self._format
+                converter = (
+                    ffmpeg.input(path)
+                    .output("pipe:", format="mp3", ar=sample_rate, ac=channels,
+                            audio_bitrate=self.bitrate, write_xing=0, id3v2_version=0)
+                    .global_args("-loglevel", "error")
+                    .run_async(pipe_stdout=True)
+                )
+                self._pipe(converter, self._file)
+        elif header is not None and chunk_format == self._format and chunk_format[0] == "pcm_s16le":
+            # Lossless intermediate: the samples go straight to the encoder
+            self._pcm_bytes += self._append_pcm(path, header)
+        else:
+            _, sample_rate, channels = self._format
+            decoder = (
+                ffmpeg.input(path)
+                .output("pipe:", format="s16le", ar=sample_rate, ac=channels)
+                .global_args("-loglevel", "error")
+                .run_async(pipe_stdout=True)
+            )
+            self._pcm_bytes += self._pipe(decoder, self._encoder.stdin)
+        self.chunks += 1
+
+    def close(self):
+        """Finish the output file and return its duration in seconds."""
+        if self._copy:
+            self._file.close()
+            if self.tags:
+                # Add the tags with a stream copy; the audio is not re-encoded
+                tagged = f"{self.output_path}.tagged{os.path.splitext(self.output_path)[1]}"
+                (ffmpeg.input(self.output_path)
+                 .output(tagged, acodec="copy", **self._metadata())
+                 .global_args("-loglevel", "error")
+                 .overwrite_output()
+                 .run())
+                os.replace(tagged, self.output_path)
+            return probe_audio(self.output_path)[3]
+        if self._encoder is not None:
+            self._encoder.stdin.close()
+            if self._encoder.wait() != 0:
+                raise RuntimeError("ffmpeg failed to encode the output")
+            _, sample_rate, channels = self._format
+            return self._pcm_bytes / (2 * sample_rate * channels)
+        return 0.0
+
+    def abort(self):
+        """Stop writing and release any open file or encoder process."""
+        if self._file is not None:
+            self._file.close()
+        if self._encoder is not None:
+            self._encoder.stdin.close()
+            self._encoder.kill()
+            self._encoder.wait()
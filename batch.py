@@ -0,0 +1,399 @@
+"""Convert many PDFs into podcasts through one shared set of warm workers.
+
+Usage:
+    python batch.py books/ extra.pdf [--summarize-workers 2] [--tts-workers 2]
+"""
+
+import argparse
+import collections
+import os
+import queue
+import sys
+import threading
+import time
+from agents import PublishingAgent, TextSummarizationAgent
+from audio import sidecar_path
+from cache import DEFAULT_AUDIO_CACHE_BYTES, DEFAULT_SUMMARY_CACHE_BYTES
+from ordering import CHUNK_END
+from podcast import PodcastJob, check_job_options
+from queues import DEFAULT_QUEUE_SIZE, BoundedQueue
+from workers import SummarizerPool, TTSPool
+
+DEFAULT_ACTIVE_DOCUMENTS = 4
+
+
+def find_pdfs(paths):
+    """Expand files and directories into a sorted, de-duplicated list of PDF paths."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.lower().endswith(".pdf"))
+        else:
+            found.append(path)
+    return list(dict.fromkeys(os.path.abspath(path) for path in found))
+
+
+def podcast_paths(pdf_paths, output_dir):
+    """Name each podcast after its PDF, numbering documents that share a name."""
+    used = collections.Counter()
+    paths = []
+    for pdf_path in pdf_paths:
+        stem = os.path.splitext(os.path.basename(pdf_path))[0]
+        used[stem] += 1
+        if used[stem] > 1:
+            stem = f"{stem}-{used[stem]}"
+        paths.append(os.path.join(output_dir, f"{stem}.mp3"))
+    return paths
+
+
+class Document:
+    """One PDF's progress through the shared pipeline, and its own podcast.
+
+    Text is extracted and audio merged by the document's own PodcastJob, so
+    chunking, boilerplate removal and encoding match main.py. Chunks from
+    every document share the worker pools, keyed by (document id, chunk
+    index); each document's audio goes to its job's merge stage, which
+    publishes the podcast as soon as its last chunk is in.
+    """
+
+    def __init__(self, doc_id, pdf_path, output_path, chunk_tokens=None, stream=False,
+                 strip_boilerplate=True, summarizer=None, publisher=None,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        self.id = doc_id
+        self.pdf_path = pdf_path
+        self.name = os.path.basename(pdf_path)
+        self.output_path = output_path
+        self.stream = stream
+        stem = os.path.splitext(os.path.basename(output_path))[0]
+        self.job = PodcastJob(pdf_path, output_dir=os.path.dirname(output_path),
+                              output_file=os.path.basename(output_path), summarizer=summarizer,
+                              publisher=publisher, chunk_tokens=chunk_tokens, stream=stream,
+                              strip_boilerplate=strip_boilerplate, title=stem)
+        self.text_queue = BoundedQueue(f"text:{self.name}", queue_size)
+        # Unbounded, so the shared publisher thread never waits on one document
+        self.audio_queue = queue.Queue()
+        self.status = "waiting"
+        self.total = None  # Chunk count, known once extraction has finished
+        self.extracted = 0
+        self.summarized = 0
+        self.closed = 0  # Chunks whose audio has reached the publisher
+        self.failed = 0
+        self.duration = 0.0
+        self.started = None
+        self.elapsed = None
+        self.on_finish = None
+        self._sentences = collections.Counter()  # idx -> streamed sentences received
+        self._ends = {}  # idx -> sentence count of streamed chunks that are complete
+        self._chunk_paths = []
+        self._audio_done = False
+        self._merge_thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.status = "running"
+        self.started = time.time()
+        threading.Thread(target=self._extract, daemon=True).start()
+        self._merge_thread = threading.Thread(target=self._merge, daemon=True)
+        self._merge_thread.start()
+
+    def _extract(self):
+        try:
+            self.job.extract(None, self)
+        except Exception as e:
+            print(f"[Batch] {self.name}: Error during extraction: {str(e)}")
+        finally:
+            with self._lock:
+                if self.total is None:
+                    self.total = self.extracted
+                    self.text_queue.put(None)
+        self.maybe_finish()
+
+    def put(self, item):
+        """Chunks from the job's extract stage pass through here on their way to the scheduler."""
+        if item is None:
+            with self._lock:
+                self.total = self.extracted
+        else:
+            self.extracted += 1
+        self.text_queue.put(item)
+
+    def add_audio(self, key, audio_path):
+        """Take a synthesized chunk (or sentence) keyed within this document."""
+        with self._lock:
+            if audio_path is None:
+                self.failed += 1
+            elif audio_path != CHUNK_END:
+                self._chunk_paths.append(audio_path)
+            if not self.stream:
+                self.closed += 1
+            else:
+                # The end marker can overtake the chunk's last sentences
+                idx, n = key
+                if audio_path == CHUNK_END:
+                    self._ends[idx] = n
+                else:
+                    self._sentences[idx] += 1
+                if self._ends.get(idx) == self._sentences[idx]:
+                    del self._ends[idx]
+                    self._sentences.pop(idx, None)
+                    self.closed += 1
+            self.audio_queue.put((key, audio_path))
+        if audio_path != CHUNK_END:
+            print(f"[Batch] {self.progress()}")
+        self.maybe_finish()
+
+    def maybe_finish(self, force=False):
+        """End the document's audio once every chunk is in (or right away with force)."""
+        with self._lock:
+            if self.status != "running" or self._audio_done:
+                return
+            if not force and (self.total is None or self.closed < self.total):
+                return
+            self._audio_done = True
+        self.audio_queue.put(None)
+
+    def wait(self):
+        """Block until the document's podcast is merged, if it was started."""
+        if self._merge_thread is not None:
+            self._merge_thread.join()
+
+    def _merge(self):
+        podcast = queue.Queue()
+        try:
+            self.job.merge(self.audio_queue, podcast)
+        except Exception as e:
+            print(f"[Batch] {self.name}: Error while merging audio: {str(e)}")
+        path = None if podcast.empty() else podcast.get()
+        self.elapsed = time.time() - self.started
+        merged = self.job.metrics.report()["stages"].get("merge", {})
+        self.duration = merged.get("audio_seconds", 0.0)
+        if path is None:
+            self.status = "failed"
+        else:
+            self.status = "done" if self.closed == self.total else "partial"
+        self._remove_chunks()
+        print(f"[Batch] {self.name}: {self.status} after {self.elapsed:.1f}s ({self.progress()})")
+        if self.on_finish is not None:
+            self.on_finish(self)
+
+    def _remove_chunks(self):
+        """Delete the document's chunk WAVs and their sidecars once the podcast is encoded."""
+        for path in self._chunk_paths:
+            for name in (path, sidecar_path(path)):
+                try:
+                    os.remove(name)
+                except OSError:
+                    pass
+
+    def progress(self):
+        total = "?" if self.total is None else self.total
+        return (f"{self.name}: {self.summarized}/{total} summarized, "
+                f"{self.closed}/{total} synthesized, {self.failed} failed")
+
+
+class BatchRunner:
+    """Run many documents through one SummarizerPool and one TTSPool.
+
+    The models and TTS engines load once for the whole batch. At most
+    max_active documents are in flight at a time, and their chunks are
+    handed to the summarizers round-robin, so a long book doesn't hold up
+    the short ones queued behind it.
+    """
+
+    def __init__(self, pdf_paths, output_dir, summarize_workers=1, tts_workers=1,
+                 chunk_tokens=None, stream=False, max_active=DEFAULT_ACTIVE_DOCUMENTS,
+                 tts_timeout=300, cache_dir=None, strip_boilerplate=True, model_factory=None,
+                 engine_factory=None):
+        self.output_dir = output_dir
+        self.chunk_dir = os.path.join(output_dir, "chunks")
+        self.stream = stream
+        self.max_active = max(1, max_active)
+        # Only sizes chunks; the models are loaded by the summarizer pool
+        summarizer = TextSummarizationAgent(model_factory=model_factory)
+        self.publisher = PublishingAgent()
+        self.documents = [
+            Document(doc_id, pdf_path, output_path, chunk_tokens, stream, strip_boilerplate,
+                     summarizer, self.publisher)
+            for doc_id, (pdf_path, output_path)
+            in enumerate(zip(pdf_paths, podcast_paths(pdf_paths, output_dir)))
+        ]
+        self.summarizers = SummarizerPool(
+            summarize_workers, model_name=summarizer.model_name, max_tokens=summarizer.max_tokens,
+            cache_path=os.path.join(cache_dir, "summaries.db") if cache_dir else None,
+            cache_bytes=DEFAULT_SUMMARY_CACHE_BYTES, model_factory=model_factory)
+        self.tts = TTSPool(tts_workers, self.chunk_dir, task_timeout=tts_timeout,
+                           cache_dir=os.path.join(cache_dir, "audio") if cache_dir else None,
+                           cache_bytes=DEFAULT_AUDIO_CACHE_BYTES, engine_factory=engine_factory)
+        self.text_queue = BoundedQueue("text", DEFAULT_QUEUE_SIZE)
+        self.summary_queue = BoundedQueue("summary", DEFAULT_QUEUE_SIZE)
+        self.audio_queue = BoundedQueue("audio", DEFAULT_QUEUE_SIZE)
+        self._slots = threading.Semaphore(self.max_active)
+
+    def _split_key(self, key):
+        """Return (document, key within the document) for a pipeline key."""
+        if self.stream:
+            (doc_id, idx), sentence = key
+            return self.documents[doc_id], (idx, sentence)
+        doc_id, idx = key
+        return self.documents[doc_id], idx
+
+    def _finished(self, document):
+        self._slots.release()
+
+    def _schedule(self):
+        """Admit documents as slots free up and feed their chunks round-robin."""
+        waiting = collections.deque(self.documents)
+        active = []
+        try:
+            while waiting or active:
+                while waiting and self._slots.acquire(blocking=False):
+                    document = waiting.popleft()
+                    document.on_finish = self._finished
+                    document.start()
+                    active.append(document)
+                moved = False
+                for document in list(active):
+                    try:
+                        item = document.text_queue.get_nowait()
+                    except queue.Empty:
+                        continue
+                    moved = True
+                    if item is None:
+                        active.remove(document)  # Its slot is held until it is published
+                        continue
+                    idx, chunk = item
+                    self.text_queue.put(((document.id, idx), chunk))
+                if not moved:
+                    time.sleep(0.05)
+        finally:
+            self.text_queue.put(None)
+
+    def _summarize(self):
+        try:
+            self.summarizers.run(self.text_queue, self, stream=self.stream)
+        except Exception as e:
+            print(f"[Batch] Summarizer error: {str(e)}")
+        finally:
+            self.summary_queue.put(None)
+
+    def put(self, item):
+        """Summaries from the summarizer pool pass through here on their way to TTS."""
+        key, text = item
+        if not self.stream or text is None:
+            self._split_key(key)[0].summarized += 1
+        self.summary_queue.put(item)
+
+    def _synthesize(self):
+        try:
+            self.tts.run(self.summary_queue, self.audio_queue)
+        except Exception as e:
+            print(f"[Batch] TTS error: {str(e)}")
+        finally:
+            self.audio_queue.put(None)
+
+    def _publish(self):
+        while True:
+            item = self.audio_queue.get()
+            if item is None:
+                break
+            key, audio_path = item
+            document, doc_key = self._split_key(key)
+            document.add_audio(doc_key, audio_path)
+        # Anything still open lost chunks upstream; publish what it has
+        for document in self.documents:
+            document.maybe_finish(force=True)
+        for document in self.documents:
+            document.wait()
+
+    def run(self):
+        """Process every document and return the list of Documents."""
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        print(f"[Batch] {len(self.documents)} documents, up to {self.max_active} in flight")
+        started = time.time()
+        self.summarizers.start()
+        try:
+            if self.tts.start() == 0:
+                print("[!] WARNING: No TTS worker could start an engine. Audio will not be generated.")
+                return self.documents
+            threads = [threading.Thread(target=target, daemon=True)
+                       for target in (self._schedule, self._summarize, self._synthesize,
+                                      self._publish)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            self.summarizers.stop()
+            self.tts.stop()
+        print(f"\n[Batch] Finished in {time.time() - started:.1f}s "
+              f"(models and engines loaded once)")
+        return self.documents
+
+
+def print_report(documents):
+    print(f"{'document':<40} {'status':>8} {'chunks':>7} {'failed':>7} {'audio s':>8} {'wall s':>7}")
+    for document in documents:
+        total = "-" if document.total is None else document.total
+        elapsed = "-" if document.elapsed is None else f"{document.elapsed:.1f}"
+        print(f"{document.name[:40]:<40} {document.status:>8} {total:>7} {document.failed:>7} "
+              f"{document.duration:>8.1f} {elapsed:>7}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert many PDFs into podcasts in one run.")
+    parser.add_argument("paths", nargs="+", help="PDF files or directories of PDFs")
+    parser.add_argument("--output-dir", default=os.path.join("output", "batch"),
+                        help="where the podcasts are written (default: output/batch)")
+    parser.add_argument("--summarize-workers", type=int, default=1,
+                        help="summarizer processes shared by all documents (default: 1)")
+    parser.add_argument("--tts-workers", type=int, default=1,
+                        help="TTS processes shared by all documents (default: 1)")
+    parser.add_argument("--tts-timeout", type=float, default=300,
+                        help="seconds before a TTS worker stuck on a chunk is restarted")
+    parser.add_argument("--chunk-tokens", type=int, default=None,
+                        help="token budget per summarized chunk (default: fit the model context)")
+    parser.add_argument("--max-active", type=int, default=DEFAULT_ACTIVE_DOCUMENTS,
+                        help=f"documents in flight at once (default: {DEFAULT_ACTIVE_DOCUMENTS})")
+    parser.add_argument("--stream", action="store_true",
+                        help="send summaries to TTS sentence by sentence as they are generated")
+    parser.add_argument("--keep-boilerplate", action="store_true",
+                        help="don't strip repeated headers, footers, page numbers and "
+                             "near-duplicate chunks before summarizing")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="don't read or write the summary and audio caches")
+    parser.add_argument("--fake", action="store_true",
+                        help="use the stand-in model and TTS engine from fakes.py")
+    args = parser.parse_args(argv)
+    try:
+        check_job_options(args.chunk_tokens, stream=args.stream)
+    except ValueError as e:
+        parser.error(str(e))
+
+    pdf_paths = find_pdfs(args.paths)
+    missing = [path for path in pdf_paths if not os.path.exists(path)]
+    if missing:
+        print(f"Error: PDF file not found at {missing[0]}")
+        return 1
+    if not pdf_paths:
+        print("Error: No PDF files found")
+        return 1
+
+    model_factory = engine_factory = None
+    if args.fake:
+        from fakes import FakeLLM, FakeTTS
+        model_factory = FakeLLM(seconds_per_call=0.05, seconds_per_token=0.002)
+        engine_factory = FakeTTS(seconds_per_call=0.02, realtime_factor=0.02)
+    runner = BatchRunner(pdf_paths, args.output_dir, args.summarize_workers, args.tts_workers,
+                         chunk_tokens=args.chunk_tokens, stream=args.stream,
+                         max_active=args.max_active, tts_timeout=args.tts_timeout,
+                         cache_dir=None if args.no_cache else os.path.join("output", "cache"),
+                         strip_boilerplate=not args.keep_boilerplate,
+                         model_factory=model_factory, engine_factory=engine_factory)
+    documents = runner.run()
+    print_report(documents)
+    return 0 if all(document.status == "done" for document in documents) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,396 @@
+"""Benchmarks for the PDF to podcast pipeline.
+
+Usage:
+    python benchmark.py extraction [--pages 50 200 500] [--workers 2 4]
+    python benchmark.py intermediate [--minutes 10] [--chunk-seconds 30]
+    python benchmark.py startup [--repeat 5]
+    python benchmark.py pipeline [--pages 5 20 50] [--workers 1 2] [--json results.json]
+
+The pipeline benchmark runs fully offline: it generates synthetic PDFs and
+uses the fake model and TTS engine from fakes.py.
+"""
+
+import argparse
+import array
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from PyPDF2 import PdfReader, PdfWriter
+from agents import PDFProcessingAgent
+from audio import StreamingConcat, read_wav_header, write_sidecar
+from fakes import FakeLLM, FakeTTS
+
+SAMPLE_PDF = "Atomic habits ( PDFDrive )-34-38.pdf"
+
+
+def build_pdf(page_count, output_path, source_pdf=SAMPLE_PDF):
+    """Write a PDF of page_count pages by cycling through the pages of source_pdf."""
+    source = PdfReader(source_pdf)
+    writer = PdfWriter()
+    for i in range(page_count):
+        writer.add_page(source.pages[i % len(source.pages)])
+    with open(output_path, "wb") as f:
+        writer.write(f)
+    return output_path
+
+
+_WORDS = ("habit system identity change small daily result outcome process goal progress "
+          "behavior environment cue craving response reward practice improve repeat simple "
+          "focus time energy people action choice future better every stack track").split()
+
+
+def write_synthetic_pdf(path, pages, words_per_page=350, seed=0, running_header=None):
+    """Write a PDF of pages pages of deterministic pseudo-English text.
+
+    The PDF is assembled by hand (one Helvetica text object per page), so no
+    fixture or PDF writing library is needed. With running_header, every
+    page starts with that line and ends with its page number, like a book.
+    """
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page_number in range(1, pages + 1):
+        words = []
+        while len(words) < words_per_page:
+            sentence = [rng.choice(_WORDS) for _ in range(rng.randint(6, 18))]
+            sentence[0] = sentence[0].capitalize()
+            sentence[-1] += "."
+            words.extend(sentence)
+        lines = []
+        line = ""
+        for word in words:
+            if len(line) + len(word) + 1 > 90:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+        if running_header:
+            lines = [running_header] + lines + [str(page_number)]
+        text = " T* ".join(f"({line}) Tj" for line in lines)
+        content = f"BT /F1 10 Tf 12 TL 40 800 Td {text} ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+                       % len(objects))
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                % (len(objects) + 1, xref))
+    return path
+
+
+def _time_pages(pages):
+    start = time.perf_counter()
+    result = list(pages)
+    return time.perf_counter() - start, result
+
+
+def bench_extraction(page_counts, worker_counts):
+    """Compare serial and process-pool text extraction across document sizes."""
+    agent = PDFProcessingAgent()
+    print(f"{'pages':>6} {'mode':>12} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for page_count in page_counts:
+            pdf_path = build_pdf(page_count, os.path.join(tmp, f"bench_{page_count}.pdf"))
+
+            serial_time, serial_pages = _time_pages(agent.iter_pages(pdf_path))
+            print(f"{page_count:>6} {'serial':>12} {serial_time:>9.2f} "
+                  f"{page_count / serial_time:>9.1f} {1.0:>8.2f}")
+
+            for workers in worker_counts:
+                parallel_time, parallel_pages = _time_pages(
+                    agent.iter_pages_parallel(pdf_path, workers=workers))
+                if parallel_pages != serial_pages:
+                    print(f"[Benchmark] Error: parallel output with {workers} workers "
+                          f"differs from serial output")
+                    return False
+                print(f"{page_count:>6} {f'{workers} workers':>12} {parallel_time:>9.2f} "
+                      f"{page_count / parallel_time:>9.1f} {serial_time / parallel_time:>8.2f}")
+    return True
+
+
+def write_tone_wav(path, seconds, sample_rate=22050):
+    """Write a mono 16-bit sine tone, roughly what pyttsx3/espeak produces."""
+    samples = array.array("h", (int(8000 * math.sin(2 * math.pi * 220 * i / sample_rate))
+                                for i in range(int(seconds * sample_rate))))
+    if sys.byteorder == "big":
+        samples.byteswap()
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+    return path
+
+
+def _cpu_seconds():
+    """User + system CPU time of this process and its finished child processes (ffmpeg)."""
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def _mp3_intermediate(wav_paths, output_path):
+    """The previous chunk path: encode to MP3, decode to validate, decode again to merge, re-encode."""
+    from pydub import AudioSegment
+    podcast = AudioSegment.empty()
+    for wav_path in wav_paths:
+        mp3_path = wav_path[:-4] + ".mp3"
+        AudioSegment.from_wav(wav_path).export(mp3_path, format="mp3", bitrate="192k")
+        if len(AudioSegment.from_file(mp3_path)) == 0:
+            raise RuntimeError("validation failed")
+        podcast += AudioSegment.from_file(mp3_path)
+    podcast.export(output_path, format="mp3", bitrate="192k")
+
+
+def _pcm_intermediate(wav_paths, output_path):
+    """The current chunk path: validate from the WAV header, encode once when merging."""
+    merger = StreamingConcat(output_path, bitrate="192k")
+    for wav_path in wav_paths:
+        header = read_wav_header(wav_path)
+        if header is None or header["frames"] == 0:
+            raise RuntimeError("validation failed")
+        write_sidecar(wav_path, header)
+        merger.append(wav_path)
+    merger.close()
+
+
+def bench_intermediate(minutes, chunk_seconds):
+    """Compare CPU time per audio minute for MP3 and PCM chunk intermediates."""
+    chunk_count = max(1, int(minutes * 60 // chunk_seconds))
+    audio_minutes = chunk_count * chunk_seconds / 60
+    print(f"{chunk_count} chunks of {chunk_seconds}s ({audio_minutes:.1f} audio minutes)")
+    print(f"{'intermediate':>13} {'cpu s':>8} {'cpu s/min':>10} {'wall s':>8}")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tone = write_tone_wav(os.path.join(tmp, "tone.wav"), chunk_seconds)
+        for name, run in (("mp3", _mp3_intermediate), ("pcm", _pcm_intermediate)):
+            directory = os.path.join(tmp, name)
+            os.makedirs(directory)
+            wav_paths = []
+            for i in range(chunk_count):
+                wav_paths.append(os.path.join(directory, f"chunk_{i}.wav"))
+                shutil.copyfile(tone, wav_paths[-1])
+            cpu_start = _cpu_seconds()
+            wall_start = time.perf_counter()
+            run(wav_paths, os.path.join(directory, "podcast.mp3"))
+            cpu = _cpu_seconds() - cpu_start
+            wall = time.perf_counter() - wall_start
+            results[name] = cpu
+            print(f"{name:>13} {cpu:>8.2f} {cpu / audio_minutes:>10.3f} {wall:>8.2f}")
+    saved = (results["mp3"] - results["pcm"]) / audio_minutes
+    print(f"CPU saved per audio minute: {saved:.3f}s "
+          f"({100 * (1 - results['pcm'] / results['mp3']):.0f}%)")
+    return True
+
+
+STARTUP_COMMANDS = (
+    ("import main", ["-c", "import main"]),
+    ("main.py --help", ["main.py", "--help"]),
+    ("main.py --dry-run", ["main.py", "--dry-run", SAMPLE_PDF]),
+    ("missing PDF", ["main.py", "missing.pdf"]),
+)
+
+
+def bench_startup(repeat):
+    """Time how long main.py takes to import, print help, dry-run and reject a missing file."""
+    print(f"{'command':>18} {'median s':>9} {'min s':>7}")
+    for name, args in STARTUP_COMMANDS:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *args], stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start)
+        print(f"{name:>18} {statistics.median(times):>9.3f} {min(times):>7.3f}")
+    return True
+
+
+def _peak_rss_mb(who):
+    rss = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_offline_pipeline(pdf_path, output_dir, summarize_workers, tts_workers, llm, tts,
+                         chunk_tokens=None):
+    """Run the podcast pipeline on pdf_path with fake backends and return its metrics report.
+
+    The report's "podcast" is the podcast's path, or None if none was written.
+    """
+    from agents import TextSummarizationAgent, TTSAgent
+    from metrics import Metrics
+    from podcast import PodcastJob
+
+    job = PodcastJob(pdf_path, output_dir=output_dir,
+                     summarizer=TextSummarizationAgent(model_factory=llm),
+                     tts_agent=TTSAgent(engine_factory=tts), metrics=Metrics(),
+                     chunk_tokens=chunk_tokens, summarize_workers=summarize_workers,
+                     tts_workers=tts_workers)
+    pipeline = job.pipeline()
+    job.metrics.sample_queues(pipeline.channels, 0.1)
+    podcast_path = job.run(pipeline)
+    job.metrics.stop()
+    report = job.metrics.report()
+    report["podcast"] = podcast_path
+    return report
+
+
+def _pipeline_child(config_path):
+    """Entry point of the fresh interpreter that runs one benchmark configuration."""
+    with open(config_path, encoding="utf-8") as f:
+        config = json.load(f)
+    sys.stdout = open(os.devnull, "w")  # The pipeline's progress output
+    report = run_offline_pipeline(config["pdf_path"], config["output_dir"],
+                                  config["summarize_workers"], config["tts_workers"],
+                                  FakeLLM(**config["llm"]), FakeTTS(**config["tts"]),
+                                  config["chunk_tokens"])
+    report["rss_mb"] = _peak_rss_mb(resource.RUSAGE_SELF)
+    report["worker_rss_mb"] = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+    with open(config["result_path"], "w", encoding="utf-8") as f:
+        json.dump(report, f)
+
+
+def bench_pipeline(page_counts, worker_counts, llm, tts, chunk_tokens=None, json_path=None,
+                   running_header=None):
+    """End-to-end throughput, time to first audio, peak RSS and stage utilization, offline."""
+    print(f"{'pages':>5} {'workers':>7} {'wall s':>7} {'chars/s':>8} {'audio x':>8} "
+          f"{'ttfa s':>7} {'rss MB':>7} {'wkr MB':>7}  utilization extract/summarize/tts/merge")
+    results = []
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for page_count in page_counts:
+            pdf_path = write_synthetic_pdf(os.path.join(tmp, f"synthetic_{page_count}.pdf"),
+                                           page_count, running_header=running_header)
+            for workers in worker_counts:
+                run_dir = os.path.join(tmp, f"run_{page_count}_{workers}")
+                config = {"pdf_path": pdf_path, "output_dir": run_dir,
+                          "summarize_workers": workers, "tts_workers": workers,
+                          "llm": vars(llm), "tts": vars(tts), "chunk_tokens": chunk_tokens,
+                          "result_path": os.path.join(tmp, "result.json")}
+                config_path = os.path.join(tmp, "config.json")
+                with open(config_path, "w", encoding="utf-8") as f:
+                    json.dump(config, f)
+                # A fresh interpreter per run, so peak RSS isn't carried over
+                completed = subprocess.run(
+                    [sys.executable, "-c", "import benchmark, sys; benchmark._pipeline_child(sys.argv[1])",
+                     config_path], cwd=os.path.dirname(os.path.abspath(__file__)))
+                if completed.returncode != 0:
+                    print(f"[Benchmark] Error: run with {page_count} pages and {workers} workers failed")
+                    return False
+                with open(config["result_path"], encoding="utf-8") as f:
+                    report = json.load(f)
+
+                stages = report["stages"]
+                wall = report["wall_seconds"]
+                merged = stages.get("merge", {}).get("chunks", 0)
+                if not report["podcast"] or not merged:
+                    # Throughput of a run that wrote no podcast would be meaningless
+                    ok = False
+                    results.append({"pages": page_count, "workers": workers, "failed": True,
+                                    "wall_seconds": wall, "merged_chunks": merged})
+                    print(f"{page_count:>5} {workers:>7} {wall:>7.2f}  FAILED: "
+                          + (f"{merged} chunks merged but no podcast written" if merged
+                             else "no chunks merged"))
+                    continue
+                capacity = {"extract": 1, "summarize": workers, "tts": workers, "merge": 1}
+                utilization = {stage: stages.get(stage, {}).get("busy_seconds", 0) / (wall * slots)
+                               for stage, slots in capacity.items()}
+                chars = stages.get("extract", {}).get("counters", {}).get("chars", 0)
+                audio = stages.get("merge", {}).get("audio_seconds", 0)
+                ttfa = stages.get("merge", {}).get("first_done_seconds") or 0.0
+                results.append({"pages": page_count, "workers": workers, "wall_seconds": wall,
+                                "chars_per_second": chars / wall, "audio_per_second": audio / wall,
+                                "time_to_first_audio": ttfa, "rss_mb": report["rss_mb"],
+                                "worker_rss_mb": report["worker_rss_mb"],
+                                "utilization": utilization, "failed": False})
+                print(f"{page_count:>5} {workers:>7} {wall:>7.2f} {chars / wall:>8.0f} "
+                      f"{audio / wall:>8.2f} {ttfa:>7.2f} {report['rss_mb']:>7.0f} "
+                      f"{report['worker_rss_mb']:>7.0f}  "
+                      + "/".join(f"{100 * utilization[stage]:.0f}%" for stage in capacity))
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {json_path}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline benchmarks.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    extraction = subparsers.add_parser("extraction", help="serial vs parallel PDF extraction")
+    extraction.add_argument("--pages", type=int, nargs="+", default=[50, 200, 500])
+    extraction.add_argument("--workers", type=int, nargs="+",
+                            default=sorted({2, os.cpu_count() or 2}))
+
+    intermediate = subparsers.add_parser("intermediate",
+                                         help="CPU cost of MP3 vs PCM chunk intermediates")
+    intermediate.add_argument("--minutes", type=float, default=10)
+    intermediate.add_argument("--chunk-seconds", type=float, default=30)
+
+    startup = subparsers.add_parser("startup", help="time to import main.py and handle quick commands")
+    startup.add_argument("--repeat", type=int, default=5)
+
+    pipeline = subparsers.add_parser("pipeline",
+                                     help="offline end-to-end run with fake model and TTS")
+    pipeline.add_argument("--pages", type=int, nargs="+", default=[5, 20, 50])
+    pipeline.add_argument("--workers", type=int, nargs="+", default=[1, 2],
+                          help="summarizer and TTS workers per run")
+    pipeline.add_argument("--chunk-tokens", type=int, default=None)
+    pipeline.add_argument("--summary-words", type=int, default=60,
+                          help="words the fake model writes per summary")
+    pipeline.add_argument("--llm-call-seconds", type=float, default=0.05)
+    pipeline.add_argument("--llm-token-seconds", type=float, default=0.002)
+    pipeline.add_argument("--tts-call-seconds", type=float, default=0.02)
+    pipeline.add_argument("--tts-realtime-factor", type=float, default=0.02,
+                          help="fake synthesis time per second of audio")
+    pipeline.add_argument("--sample-rate", type=int, default=22050,
+                          help="sample rate of the fake audio, which sets its size")
+    pipeline.add_argument("--running-header", default=None,
+                          help="put this header and a page number on every synthetic page")
+    pipeline.add_argument("--json", default=None, help="also write the results to this file")
+
+    args = parser.parse_args(argv)
+    if args.benchmark == "extraction":
+        ok = bench_extraction(args.pages, args.workers)
+    elif args.benchmark == "intermediate":
+        ok = bench_intermediate(args.minutes, args.chunk_seconds)
+    elif args.benchmark == "startup":
+        ok = bench_startup(args.repeat)
+    elif args.benchmark == "pipeline":
+        llm = FakeLLM(args.summary_words, args.llm_call_seconds, args.llm_token_seconds)
+        tts = FakeTTS(sample_rate=args.sample_rate, seconds_per_call=args.tts_call_seconds,
+                      realtime_factor=args.tts_realtime_factor)
+        ok = bench_pipeline(args.pages, args.workers, llm, tts, args.chunk_tokens, args.json,
+                            args.running_header)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+import collections
+import hashlib
+import random
+import re
+
+_DIGITS = re.compile(r"\d+")
+_NON_WORD = re.compile(r"[^\w#]+")
+_WORD = re.compile(r"\S+")
+# A page number once digits are normalized: "12", "Page 12", "12 of 300", "- 12 -"
+_PAGE_NUMBER = re.compile(r"^(page )?#( (of|/) #)?$")
+# A roman numeral up to xxxix such as "xiv" (the lookahead rules out an empty match); only
+# a page number when numerals recur in the same place on other pages, unlike a lone "I"
+_ROMAN_NUMERAL = re.compile(r"^(?=[ivx])x{0,3}(ix|iv|v?i{0,3})$")
+
+
+def normalize_line(line):
+    """Lowercase, replace every number with # and keep only words, so "12  ATOMIC HABITS"
+    and "14 Atomic Habits" compare equal."""
+    return " ".join(_NON_WORD.sub(" ", _DIGITS.sub("#", line.lower())).split())
+
+
+def _words(text):
+    """Return the (span, normalized word) of each word of text, skipping bare punctuation."""
+    words = []
+    for match in _WORD.finditer(text):
+        word = normalize_line(match.group())
+        if word:
+            words.append((match.span(), word))
+    return words
+
+
+def _strip_numbers(words, head=True, tail=True):
+    """Drop the normalized numbers ("#") at the start and/or end of a list of words."""
+    start, stop = 0, len(words)
+    while head and start < stop and words[start] == "#":
+        start += 1
+    while tail and stop > start and words[stop - 1] == "#":
+        stop -= 1
+    return words[start:stop]
+
+
+class BoilerplateFilter:
+    """Strip running headers, footers and page numbers from a stream of pages.
+
+    Lines at the top or bottom edge_lines of a page are compared, digits
+    normalized, with the same positions on the pages around it: a line that
+    appears on at least min_fraction of the pages in a window of 2 * radius
+    + 1 pages (and on min_pages of them) is boilerplate, so a chapter title
+    repeated only within its chapter is caught too. Leading and trailing
+    word n-grams are indexed the same way, for headers that extraction glued
+    onto the body text. Pages are released radius pages late, once the pages
+    after them have been indexed.
+
+    Once cleaned, a page of at least min_duplicate_chars that nearly repeats
+    an earlier page is dropped; repeated pages would otherwise be chunked
+    at shifted boundaries and no longer match chunk by chunk.
+    """
+
+    def __init__(self, radius=8, min_pages=3, min_fraction=0.3, edge_lines=3, min_words=4,
+                 max_words=12, max_line_chars=100, min_duplicate_chars=200):
+        self.radius = radius
+        self.min_pages = min_pages
+        self.min_fraction = min_fraction
+        self.edge_lines = edge_lines
+        self.min_words = min_words
+        self.max_words = max_words
+        self.max_line_chars = max_line_chars
+        self.min_duplicate_chars = min_duplicate_chars
+        self.duplicates = NearDuplicateIndex() if min_duplicate_chars else None
+        self.chars_in = 0
+        self.chars_removed = 0
+        self.lines_removed = 0
+        self.page_numbers_removed = 0
+        self.removed = collections.Counter()  # normalized pattern -> times removed
+        self._pages = collections.deque()  # (page_number, lines, features) in the window
+        self._released = 0  # How many of the pages in the window have been released
+        self._counts = collections.Counter()
+
+    def _edges(self, lines):
+        """Return {index: "top" or "bottom"} for the first and last edge_lines non-blank lines."""
+        filled = [i for i, line in enumerate(lines) if line.strip()]
+        edges = {i: "bottom" for i in filled[-self.edge_lines:]}
+        edges.update((i, "top") for i in filled[:self.edge_lines])
+        return edges
+
+    def _features(self, lines):
+        features = set()
+        for i, position in self._edges(lines).items():
+            if len(lines[i]) <= self.max_line_chars:
+                normalized = normalize_line(lines[i])
+                features.add(("line", normalized))
+                if _ROMAN_NUMERAL.match(normalized):
+                    features.add(("roman", position))
+        words = _strip_numbers([word for _, word in _words("\n".join(lines))])
+        for n in range(self.min_words, min(self.max_words, len(words)) + 1):
+            features.add(("head", tuple(words[:n])))
+            features.add(("tail", tuple(words[-n:])))
+        return features
+
+    def _repeated(self, feature):
+        count = self._counts[feature]
+        return count >= self.min_pages and count >= self.min_fraction * len(self._pages)
+
+    def _strip(self, lines):
+        edges = self._edges(lines)
+        kept = []
+        for i, line in enumerate(lines):
+            normalized = normalize_line(line)
+            if i in edges and normalized:
+                if _PAGE_NUMBER.match(normalized) or (_ROMAN_NUMERAL.match(normalized)
+                                                      and self._repeated(("roman", edges[i]))):
+                    self.page_numbers_removed += 1
+                    self.chars_removed += len(line) + 1
+                    continue
+                if len(line) <= self.max_line_chars and self._repeated(("line", normalized)):
+                    self.lines_removed += 1
+                    self.removed[normalized] += 1
+                    self.chars_removed += len(line) + 1
+                    continue
+            kept.append(line)
+        text = "\n".join(kept)
+        return self._strip_ngrams(text)
+
+    def _strip_ngrams(self, text):
+        """Remove the longest repeated leading and trailing word n-grams glued to the text."""
+        words = _words(text)
+        spans = [span for span, _ in words]
+        normalized = [word for _, word in words]
+        # A page number glued to a header goes with it, so n-grams skip numbers
+        lead = len(normalized) - len(_strip_numbers(normalized, tail=False))
+        trail = len(normalized) - len(_strip_numbers(normalized, head=False))
+        if lead + trail >= len(normalized):
+            return text
+        head = next((n for n in range(min(self.max_words, len(spans) - lead - trail - 1),
+                                      self.min_words - 1, -1)
+                     if self._repeated(("head", tuple(normalized[lead:lead + n])))), 0)
+        end = len(normalized) - trail
+        tail = next((n for n in range(min(self.max_words, end - lead - head - 1),
+                                      self.min_words - 1, -1)
+                     if self._repeated(("tail", tuple(normalized[end - n:end])))), 0)
+        if not head and not tail:
+            return text
+        start, stop = (lead + head if head else 0), (end - tail if tail else len(spans))
+        for pattern in (normalized[:start], normalized[stop:]):
+            if pattern:
+                self.lines_removed += 1
+                self.removed[" ".join(pattern)] += 1
+        kept = text[spans[start][0]:spans[stop - 1][1]]
+        self.chars_removed += len(text) - len(kept)
+        return kept
+
+    @property
+    def duplicate_pages(self):
+        return self.duplicates.duplicates if self.duplicates else 0
+
+    def _release(self, released):
+        page_number, lines, _ = self._pages[self._released]
+        self._released += 1
+        # Pages more than radius behind the next page to release leave the index
+        while self._released > self.radius:
+            _, _, features = self._pages.popleft()
+            self._counts.subtract(features)
+            self._released -= 1
+        text = self._strip(lines)
+        if self.duplicates is not None and len(text) >= self.min_duplicate_chars:
+            if self.duplicates.add(page_number, text) is not None:
+                self.chars_removed += len(text) + 1
+                return
+        released.append((page_number, text))
+
+    def feed(self, page_number, text):
+        """Add a page and return the list of (page_number, text) pages released by it."""
+        self.chars_in += len(text) + 1
+        lines = text.split("\n")
+        features = self._features(lines)
+        self._counts.update(features)
+        self._pages.append((page_number, lines, features))
+        released = []
+        while len(self._pages) - self._released > self.radius:
+            self._release(released)
+        return released
+
+    def flush(self):
+        """Release every page still held."""
+        released = []
+        while self._released < len(self._pages):
+            self._release(released)
+        return released
+
+    def filter(self, pages):
+        """Wrap an iterable of (page_number, text), yielding pages with boilerplate removed."""
+        for page_number, text in pages:
+            yield from self.feed(page_number, text)
+        yield from self.flush()
+
+
+class NearDuplicateIndex:
+    """Recognize texts that nearly repeat an earlier one, with MinHash and LSH banding.
+
+    Each text is reduced to a signature of num_perm minimum hashes over its
+    word shingles; texts whose signatures agree on at least threshold of
+    their entries (an estimate of their Jaccard similarity) are duplicates.
+    Banding the signature means a text is only compared with the earlier
+    texts that share a band with it.
+    """
+
+    PRIME = (1 << 61) - 1
+
+    def __init__(self, threshold=0.85, num_perm=64, bands=16, shingle_words=5, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_words = shingle_words
+        rng = random.Random(seed)
+        self._permutations = [(rng.randrange(1, self.PRIME), rng.randrange(self.PRIME))
+                              for _ in range(num_perm)]
+        self._buckets = collections.defaultdict(list)  # (band, rows) -> keys
+        self._signatures = {}
+        self.duplicates = 0
+        self.duplicate_chars = 0
+
+    def _shingles(self, text):
+        words = normalize_line(text).split()
+        n = self.shingle_words
+        shingles = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        return [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+                for s in shingles]
+
+    def signature(self, text):
+        hashes = self._shingles(text)
+        return tuple(min((a * h + b) % self.PRIME for h in hashes) for a, b in self._permutations)
+
+    def similarity(self, first, second):
+        """Estimate the Jaccard similarity of two signatures."""
+        return sum(x == y for x, y in zip(first, second)) / len(first)
+
+    def add(self, key, text):
+        """Index text under key, or return the key of an earlier near-duplicate instead."""
+        signature = self.signature(text)
+        bands = [(band, signature[band * self.rows:(band + 1) * self.rows])
+                 for band in range(self.bands)]
+        candidates = {other for band in bands for other in self._buckets.get(band, ())}
+        for other in sorted(candidates):
+            if self.similarity(signature, self._signatures[other]) >= self.threshold:
+                self.duplicates += 1
+                self.duplicate_chars += len(text)
+                return other
+        self._signatures[key] = signature
+        for band in bands:
+            self._buckets[band].append(key)
+        return None
+
+
+def removal_report(boilerplate, duplicates=None):
+    """Describe how much text was dropped before summarization."""
+    total = boilerplate.chars_in
+    removed = boilerplate.chars_removed + (duplicates.duplicate_chars if duplicates else 0)
+    percent = 100 * removed / total if total else 0.0
+    report = (f"Removed {removed} of {total} characters ({percent:.1f}%): "
+              f"{boilerplate.lines_removed} repeated header/footer lines, "
+              f"{boilerplate.page_numbers_removed} page numbers, "
+              f"{boilerplate.duplicate_pages} near-duplicate pages")
+    if duplicates is not None:
+        report += f", {duplicates.duplicates} near-duplicate chunks"
+    common = ", ".join(f'"{pattern}" x{count}' for pattern, count in boilerplate.removed.most_common(3))
+    return report + (f" (most common: {common})" if common else "")
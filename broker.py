@@ -0,0 +1,697 @@
+"""Task broker for spreading summarization and TTS over several machines.
+
+Usage:
+    python main.py book.pdf --broker output/broker.db        # the job, on one machine
+    python broker.py worker output/broker.db [--kinds summarize tts] [--fake]
+    python broker.py status output/broker.db
+
+The broker is a SQLite database that the job and its workers open as a
+shared file. The job submits a task per chunk; workers claim tasks under a
+lease that they renew while working, and a task whose lease runs out (its
+worker died or hung) goes back to the queue, up to max_attempts times.
+Results are collected by the job and fed back into the ordered merge.
+
+Journal modes:
+    wal     (default on local disks) needs shared memory, so every process
+            using the broker must run on the same host.
+    delete  (default on network filesystems) is for workers on other hosts.
+            SQLite then locks the file with POSIX advisory locks, which the
+            share must honour across hosts: NFSv4, or NFSv3 with lockd
+            running, mounted without nolock/local_lock; SMB/CIFS mounted
+            without nobrl. Without working locks the database gets corrupted.
+
+The first process to open a broker records its journal mode in the
+database, and every later process uses that mode. If the job's disk is
+exported to the workers, it sees a local disk but the workers do not, so
+create the broker with --journal-mode delete.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from agents import TextSummarizationAgent, TTSAgent
+from audio import read_wav_header, write_sidecar
+from cache import AudioCache, SummaryCache
+from ordering import CHUNK_END
+from workers import chunk_name, synthesize_chunk
+
+KINDS = ("summarize", "tts")
+DEFAULT_LEASE_SECONDS = 60
+DEFAULT_MAX_ATTEMPTS = 3
+JOURNAL_MODES = ("wal", "delete")
+# Filesystems other hosts can open files on, where WAL mode does not work
+NETWORK_FILESYSTEMS = ("nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "ceph", "glusterfs",
+                       "lustre", "fuse.sshfs")
+
+
+def on_network_share(path):
+    """Best-effort check that path is on a network filesystem (Linux mounts and UNC paths)."""
+    path = os.path.realpath(path)
+    if path.startswith("\\\\"):
+        return True
+    try:
+        with open("/proc/mounts", encoding="utf-8") as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return False
+    # The mount point with the longest matching prefix holds path
+    best, fstype = "", None
+    for mount_point, kind in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        if ((path == mount_point or path.startswith(mount_point.rstrip("/") + "/"))
+                and len(mount_point) > len(best)):
+            best, fstype = mount_point, kind
+    return fstype in NETWORK_FILESYSTEMS
+
+
+class TaskBroker:
+    """A queue of tasks in SQLite, claimed under renewable leases.
+
+    Tasks go queued -> leased -> done, or back to queued when their worker
+    gives them up or stops renewing the lease; after max_attempts claims a
+    task is failed instead. Each job submits to its own queue name and
+    collects (and removes) its finished tasks from it.
+
+    journal_mode is "wal" or "delete" (see the module docstring); by default
+    it is the mode the broker was created with, or for a new broker "delete"
+    on a network filesystem and "wal" otherwise.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS tasks ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, queue TEXT NOT NULL, kind TEXT NOT NULL, "
+        "key TEXT NOT NULL, payload TEXT NOT NULL, state TEXT NOT NULL DEFAULT 'queued', "
+        "worker TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+        "max_attempts INTEGER NOT NULL, result BLOB, info TEXT, error TEXT, created REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, kind, id)",
+        "CREATE INDEX IF NOT EXISTS tasks_queue ON tasks (queue, state)",
+    )
+
+    def __init__(self, path, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 journal_mode=None):
+        if journal_mode is not None and journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"journal_mode must be one of {', '.join(JOURNAL_MODES)}")
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.journal_mode = journal_mode
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connect(self):
+        # Each process opens its own connection; transactions are explicit
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+            try:
+                self._set_journal_mode(conn)
+                for statement in self.SCHEMA:
+                    conn.execute(statement)
+            except BaseException:
+                conn.close()
+                raise
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _set_journal_mode(self, conn):
+        """Use the journal mode recorded in the database, recording ours if it is new."""
+        shared = on_network_share(self.path)
+        conn.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO settings (name, value) VALUES ('journal_mode', ?)",
+                     (self.journal_mode or ("delete" if shared else "wal"),))
+        mode = conn.execute("SELECT value FROM settings WHERE name = 'journal_mode'").fetchone()[0]
+        if self.journal_mode is not None and self.journal_mode != mode:
+            raise ValueError(f"Broker {self.path} uses journal mode {mode}, not {self.journal_mode}; "
+                             f"every process must use the broker's mode")
+        if mode == "wal" and shared:
+            raise ValueError(f"Broker {self.path} uses WAL, which only works when every process is "
+                             f"on one host; create it with --journal-mode delete to share it "
+                             f"over the network")
+        conn.execute(f"PRAGMA journal_mode={mode}")
+
+    def _transaction(self, work):
+        """Run work(conn) in a write transaction and return its result."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+    def _expire(self, conn, now):
+        """Fail leased tasks whose lease ran out on their last allowed attempt."""
+        conn.execute("UPDATE tasks SET state = 'failed', error = 'lease expired' "
+                     "WHERE state = 'leased' AND lease_until < ? AND attempts >= max_attempts",
+                     (now,))
+
+    def submit(self, queue, kind, key, payload, max_attempts=None):
+        """Add a task and return its id."""
+        return self._transaction(lambda conn: conn.execute(
+            "INSERT INTO tasks (queue, kind, key, payload, max_attempts, created) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (queue, kind, json.dumps(key), json.dumps(payload),
+             max_attempts or self.max_attempts, time.time())).lastrowid)
+
+    def claim(self, worker, kinds=KINDS, lease_seconds=None):
+        """Lease the oldest available task of one of kinds to worker, or return None.
+
+        Returns a dict with id, queue, kind, key, payload and attempts.
+        """
+        lease_seconds = lease_seconds or self.lease_seconds
+
+        def work(conn):
+            now = time.time()
+            self._expire(conn, now)
+            row = conn.execute(
+                f"SELECT id, queue, kind, key, payload, attempts FROM tasks "
+                f"WHERE kind IN ({', '.join('?' * len(kinds))}) "
+                f"AND (state = 'queued' OR (state = 'leased' AND lease_until < ?)) "
+                f"ORDER BY id LIMIT 1", (*kinds, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, "
+                         "attempts = attempts + 1 WHERE id = ?", (worker, now + lease_seconds, row[0]))
+            return {"id": row[0], "queue": row[1], "kind": row[2], "key": json.loads(row[3]),
+                    "payload": json.loads(row[4]), "attempts": row[5] + 1}
+
+        return self._transaction(work)
+
+    def heartbeat(self, task_id, worker, lease_seconds=None):
+        """Extend worker's lease on a task; False if the lease was lost to another worker."""
+        lease_until = time.time() + (lease_seconds or self.lease_seconds)
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+            (lease_until, task_id, worker)).rowcount == 1)
+
+    def complete(self, task_id, worker, result, info=None):
+        """Store a task's result (str or bytes); False if worker no longer holds the lease."""
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET state = 'done', result = ?, info = ? "
+            "WHERE id = ? AND worker = ? AND state = 'leased'",
+            (result, json.dumps(info or {}), task_id, worker)).rowcount == 1)
+
+    def fail(self, task_id, worker, error, retry=True):
+        """Give a task up: requeue it if attempts remain (and retry is set), else fail it."""
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET error = ?, worker = NULL, lease_until = NULL, "
+            "state = CASE WHEN ? AND attempts < max_attempts THEN 'queued' ELSE 'failed' END "
+            "WHERE id = ? AND worker = ? AND state = 'leased'",
+            (error, int(retry), task_id, worker)).rowcount == 1)
+
+    def release(self, task_id, worker):
+        """Return a task to the queue without counting the attempt, e.g. on shutdown."""
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET state = 'queued', worker = NULL, lease_until = NULL, "
+            "attempts = attempts - 1 WHERE id = ? AND worker = ? AND state = 'leased'",
+            (task_id, worker)).rowcount == 1)
+
+    def collect(self, queue):
+        """Remove and return queue's finished tasks as dicts with key, kind, state, result, info, error."""
+        def work(conn):
+            self._expire(conn, time.time())
+            rows = conn.execute(
+                "SELECT id, kind, key, state, result, info, error, worker, attempts FROM tasks "
+                "WHERE queue = ? AND state IN ('done', 'failed') ORDER BY id", (queue,)).fetchall()
+            if rows:
+                conn.execute(f"DELETE FROM tasks WHERE id IN ({', '.join('?' * len(rows))})",
+                             [row[0] for row in rows])
+            return [{"id": row[0], "kind": row[1], "key": json.loads(row[2]), "state": row[3],
+                     "result": row[4], "info": json.loads(row[5] or "{}"), "error": row[6],
+                     "worker": row[7], "attempts": row[8]} for row in rows]
+
+        return self._transaction(work)
+
+    def cancel(self, queue):
+        """Drop every task of queue, finished or not."""
+        return self._transaction(lambda conn: conn.execute(
+            "DELETE FROM tasks WHERE queue = ?", (queue,)).rowcount)
+
+    def stats(self, queue=None):
+        """Return {state: count}, for one queue or all of them."""
+        with self._lock:
+            conn = self._connect()
+            if queue is None:
+                rows = conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall()
+            else:
+                rows = conn.execute("SELECT state, COUNT(*) FROM tasks WHERE queue = ? GROUP BY state",
+                                    (queue,)).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+class _BrokerPool:
+    """Job side of the broker: submit items as tasks and turn finished tasks into results.
+
+    Has the run()/start()/stop() shape of the local worker pools, so the job
+    uses it in their place. At most max_in_flight tasks are outstanding;
+    beyond that the input queue backs up as usual.
+    """
+
+    KIND = None
+
+    def __init__(self, broker, metrics=None, max_in_flight=32, poll_interval=0.2,
+                 wait_warning_seconds=30):
+        self.broker = broker
+        self.metrics = metrics
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.wait_warning_seconds = wait_warning_seconds
+        self.queue = f"{socket.gethostname()}-{os.getpid()}-{os.urandom(4).hex()}"
+        self.cache_stats = {"hits": 0, "misses": 0}
+        self.retried = 0
+        self._texts = {}  # Task key -> submitted text, for fallbacks and metrics
+
+    def start(self):
+        print(f"[Broker] Sending {self.KIND} tasks to {self.broker.path} (queue {self.queue})")
+
+    def stop(self):
+        """Withdraw anything still queued, e.g. after a cancel."""
+        self.broker.cancel(self.queue)
+
+    def _payload(self, text, **options):
+        return dict(options, text=text)
+
+    def _submit(self, key, text, **options):
+        self._texts[json.dumps(key)] = text
+        self.broker.submit(self.queue, self.KIND, key, self._payload(text, **options))
+
+    def _record(self, task):
+        """Fold a finished task's worker timing and cache use into the metrics."""
+        info = task["info"]
+        if task["attempts"] > 1:
+            self.retried += 1
+        if "cache_hit" in info:
+            self.cache_stats["hits" if info["cache_hit"] else "misses"] += 1
+        if self.metrics is not None and "seconds" in info:
+            text = self._texts.get(json.dumps(task["key"]), "")
+            self.metrics.observe(self.KIND, info["seconds"], _key(task["key"]), len(text),
+                                 info.get("audio_seconds", 0.0), info.get("started"),
+                                 lane=f"{self.KIND}-{task['worker']}")
+
+    def _gather(self, in_queue, submit, handle):
+        """Submit in_queue items with submit(item) -> bool until None; handle(task) each result.
+
+        submit returns False for items it dealt with itself. Returns once
+        every submitted task has been handled.
+        """
+        submitted = [0]
+        fed = threading.Event()
+        in_flight = threading.Semaphore(self.max_in_flight)
+
+        def feed():
+            while True:
+                in_flight.acquire()
+                item = in_queue.get()
+                if item is None:
+                    break
+                if submit(item):
+                    submitted[0] += 1
+                else:
+                    in_flight.release()
+            fed.set()
+
+        threading.Thread(target=feed, daemon=True).start()
+
+        handled = 0
+        waiting_since = time.time()
+        while not (fed.is_set() and handled == submitted[0]):
+            tasks = self.broker.collect(self.queue)
+            for task in tasks:
+                self._record(task)
+                handle(task)
+                self._texts.pop(json.dumps(task["key"]), None)
+                handled += 1
+                in_flight.release()
+            if tasks:
+                waiting_since = time.time()
+                continue
+            if time.time() - waiting_since > self.wait_warning_seconds:
+                stats = self.broker.stats(self.queue)
+                print(f"[Broker] Waiting for workers: {stats.get('queued', 0)} {self.KIND} tasks "
+                      f"queued, {stats.get('leased', 0)} in progress")
+                waiting_since = time.time()
+            time.sleep(self.poll_interval)
+        if self.retried:
+            print(f"[Broker] {self.retried} {self.KIND} tasks were retried after a lost worker")
+        return handled
+
+
+def _key(key):
+    """Chunk keys come back from JSON as lists; make tuples of them again."""
+    return tuple(key) if isinstance(key, list) else key
+
+
+class BrokerSummarizer(_BrokerPool):
+    """Summarize chunks on broker workers; a stand-in for SummarizerPool."""
+
+    KIND = "summarize"
+
+    def __init__(self, broker, summarizer, metrics=None, **kwargs):
+        super().__init__(broker, metrics, **kwargs)
+        self.summarizer = summarizer
+
+    def _payload(self, text, prompt_template=None):
+        return {"text": text, "prompt_template": prompt_template,
+                "model_name": self.summarizer.model_name, "max_tokens": self.summarizer.max_tokens}
+
+    def _summary(self, task):
+        if task["state"] == "done":
+            return task["result"]
+        # Same fallback as a failing local model; the manifest doesn't record it
+        print(f"[Summarizer] Error: Chunk {task['key']} failed on the workers: {task['error']}")
+        if self.metrics is not None:
+            self.metrics.count("summarize", "failures")
+        text = self._texts.get(json.dumps(task["key"]), "")
+        return text[:500] + self.summarizer.TRUNCATION_MARKER
+
+    def map(self, items, prompt_template=None):
+        """Summarize an iterable of (idx, text) and yield (idx, summary) as each completes."""
+        submitted = 0
+        for idx, text in items:
+            self._submit(idx, text, prompt_template=prompt_template)
+            submitted += 1
+        received = 0
+        while received < submitted:
+            tasks = self.broker.collect(self.queue)
+            for task in tasks:
+                self._record(task)
+                received += 1
+                if task["state"] == "done":
+                    yield _key(task["key"]), task["result"]
+            if not tasks:
+                time.sleep(self.poll_interval)
+
+    def run(self, in_queue, out_queue, prompt_template=None, stream=False):
+        """Summarize (idx, chunk) items from in_queue into (idx, summary) items on out_queue.
+
+        Streaming is not supported: summaries come back whole. Returns the
+        number of chunks; the caller forwards the poison pill downstream.
+        """
+        if stream:
+            raise ValueError("Summaries can't be streamed through the broker")
+
+        def submit(item):
+            self._submit(item[0], item[1], prompt_template=prompt_template)
+            return True
+
+        def handle(task):
+            out_queue.put((_key(task["key"]), self._summary(task)))
+            print(f"[Summarizer] Processed chunk {task['key']} on {task['worker']}")
+
+        return self._gather(in_queue, submit, handle)
+
+
+class BrokerTTS(_BrokerPool):
+    """Synthesize summaries on broker workers; a stand-in for TTSPool.
+
+    Workers send the WAV back through the broker, so they need no access
+    to the job's output directory; it is written to chunk_<n>.wav here.
+    """
+
+    KIND = "tts"
+
+    def __init__(self, broker, tts_agent, output_dir, metrics=None, **kwargs):
+        super().__init__(broker, metrics, **kwargs)
+        self.tts_agent = tts_agent
+        self.output_dir = output_dir
+
+    def _payload(self, text):
+        # Voice settings travel with the task, so every worker speaks alike
+        return {"text": text, "rate": self.tts_agent.rate, "volume": self.tts_agent.volume}
+
+    def _write(self, task):
+        """Write a finished task's audio to the output directory and return its path, or None."""
+        name = chunk_name(_key(task["key"]))
+        audio_path = os.path.abspath(os.path.join(self.output_dir, f"chunk_{name}.{TTSAgent.FORMAT}"))
+        temp_path = os.path.join(self.output_dir, f"temp_chunk_{name}_{os.urandom(4).hex()}.wav")
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(task["result"])
+            header = read_wav_header(temp_path)
+            if header is None or header["frames"] == 0:
+                print(f"[TTS] Error: Chunk {task['key']} from {task['worker']} is not valid PCM WAV")
+                return None
+            os.replace(temp_path, audio_path)
+            write_sidecar(audio_path, header)
+            return audio_path
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def run(self, in_queue, out_queue):
+        """Synthesize (idx, text) items from in_queue, putting (idx, path) on out_queue.
+
+        Chunks that fail are reported as (idx, None). Returns (processed,
+        failed); the caller forwards the poison pill downstream.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        counts = {"processed": 0, "failed": 0}
+
+        def submit(item):
+            idx, text = item
+            if text is None:
+                out_queue.put((idx, CHUNK_END))  # Streamed chunk is complete
+                return False
+            if not text.strip():
+                print(f"[TTS] Warning: Empty text for chunk {idx}")
+                out_queue.put((idx, None))
+                counts["failed"] += 1
+                if self.metrics is not None:
+                    self.metrics.count("tts", "failures")
+                return False
+            self._submit(idx, text)
+            return True
+
+        def handle(task):
+            audio_path = None
+            if task["state"] == "done":
+                audio_path = self._write(task)
+            else:
+                print(f"[TTS] Error: Chunk {task['key']} failed on the workers: {task['error']}")
+            if audio_path:
+                counts["processed"] += 1
+                print(f"[TTS] Received chunk {task['key']} from {task['worker']}")
+            else:
+                counts["failed"] += 1
+                if self.metrics is not None:
+                    self.metrics.count("tts", "failures")
+            # Failures are forwarded too, so the publisher doesn't wait for them
+            out_queue.put((_key(task["key"]), audio_path))
+
+        self._gather(in_queue, submit, handle)
+        return counts["processed"], counts["failed"]
+
+
+class BrokerWorker:
+    """Claim tasks from a broker and run them with locally loaded models and TTS engines.
+
+    The lease on a task is renewed every lease_seconds / 3 while it runs,
+    for at most task_timeout seconds: a hung model or engine then loses the
+    lease and another worker retries the task.
+    """
+
+    def __init__(self, broker, kinds=KINDS, worker_id=None, cache_dir=None, model_factory=None,
+                 engine_factory=None, n_threads=None, task_timeout=300, poll_interval=0.5):
+        self.broker = broker
+        self.kinds = tuple(kinds)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.summary_cache = SummaryCache(os.path.join(cache_dir, "summaries.db")) if cache_dir else None
+        self.audio_cache = AudioCache(os.path.join(cache_dir, "audio")) if cache_dir else None
+        self.model_factory = model_factory
+        self.engine_factory = engine_factory
+        self.n_threads = n_threads
+        self.task_timeout = task_timeout
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self.failed = 0
+        # Agents are created on first use and kept per model or voice settings
+        self._summarizers = {}
+        self._tts_agents = {}
+
+    def _summarizer(self, payload):
+        settings = (payload["model_name"], payload["max_tokens"])
+        if settings not in self._summarizers:
+            self._summarizers[settings] = TextSummarizationAgent(
+                payload["model_name"], max_tokens=payload["max_tokens"], n_threads=self.n_threads,
+                cache=self.summary_cache, model_factory=self.model_factory)
+        return self._summarizers[settings]
+
+    def _tts_agent(self, payload):
+        settings = (payload["rate"], payload["volume"])
+        if settings not in self._tts_agents:
+            self._tts_agents[settings] = TTSAgent(payload["rate"], payload["volume"],
+                                                  engine_factory=self.engine_factory)
+        return self._tts_agents[settings]
+
+    def _summarize(self, task):
+        payload = task["payload"]
+        summarizer = self._summarizer(payload)
+        cache = summarizer.cache
+        hits = cache.hits if cache else 0
+        summary = summarizer.summarize(payload["text"], payload["prompt_template"])
+        if summary.endswith(summarizer.TRUNCATION_MARKER):
+            raise RuntimeError("the model is unavailable or failed")
+        info = {"cache_hit": cache.hits > hits} if cache else {}
+        return summary, info
+
+    def _synthesize(self, task):
+        payload = task["payload"]
+        tts_agent = self._tts_agent(payload)
+        if tts_agent.engine is None:
+            raise RuntimeError("no TTS engine")
+        hits = self.audio_cache.hits if self.audio_cache else 0
+        with tempfile.TemporaryDirectory() as directory:
+            audio_path = synthesize_chunk(tts_agent, _key(task["key"]), payload["text"], directory,
+                                          self.audio_cache)
+            if audio_path is None:
+                # The engine may be in a bad state after a failure; start a fresh one
+                tts_agent._init_engine()
+                raise RuntimeError("synthesis failed")
+            header = read_wav_header(audio_path)
+            with open(audio_path, "rb") as f:
+                audio = f.read()
+        info = {"audio_seconds": header["duration_ms"] / 1000 if header else 0.0}
+        if self.audio_cache:
+            info["cache_hit"] = self.audio_cache.hits > hits
+        return audio, info
+
+    def _keep_leased(self, task, done):
+        """Renew the lease on task until done is set or task_timeout has passed."""
+        interval = self.broker.lease_seconds / 3
+        deadline = time.time() + self.task_timeout
+        while not done.wait(interval):
+            if time.time() > deadline:
+                print(f"[Worker {self.worker_id}] Task {task['id']} passed {self.task_timeout}s, "
+                      f"letting its lease expire")
+                return
+            if not self.broker.heartbeat(task["id"], self.worker_id):
+                print(f"[Worker {self.worker_id}] Lost the lease on task {task['id']}")
+                return
+
+    def process(self, task):
+        """Run one claimed task and report its result or failure to the broker."""
+        print(f"[Worker {self.worker_id}] {task['kind']} chunk {task['key']} "
+              f"(task {task['id']}, attempt {task['attempts']})")
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._keep_leased, args=(task, done), daemon=True)
+        heartbeat.start()
+        started = time.time()
+        try:
+            if task["kind"] == "summarize":
+                result, info = self._summarize(task)
+            else:
+                result, info = self._synthesize(task)
+        except Exception as e:
+            print(f"[Worker {self.worker_id}] Error: Task {task['id']} failed: {str(e)}")
+            self.failed += 1
+            self.broker.fail(task["id"], self.worker_id, str(e))
+            return False
+        finally:
+            done.set()
+            heartbeat.join()
+        info.update(started=started, seconds=time.time() - started)
+        if not self.broker.complete(task["id"], self.worker_id, result, info):
+            print(f"[Worker {self.worker_id}] Warning: Task {task['id']} was reassigned, "
+                  f"result discarded")
+            return False
+        self.processed += 1
+        return True
+
+    def run(self, idle_exit=None):
+        """Claim and process tasks until Ctrl-C, or until idle for idle_exit seconds."""
+        print(f"[Worker {self.worker_id}] Waiting for {'/'.join(self.kinds)} tasks on {self.broker.path}")
+        idle_since = time.time()
+        task = None
+        try:
+            while True:
+                task = self.broker.claim(self.worker_id, self.kinds)
+                if task is None:
+                    if idle_exit is not None and time.time() - idle_since > idle_exit:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                self.process(task)
+                task = None
+                idle_since = time.time()
+        except KeyboardInterrupt:
+            if task is not None and self.broker.release(task["id"], self.worker_id):
+                print(f"\n[Worker {self.worker_id}] Returned task {task['id']} to the queue")
+        print(f"[Worker {self.worker_id}] Stopping: {self.processed} tasks done, {self.failed} failed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Work on, or inspect, a podcast task broker.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    worker_parser = subparsers.add_parser("worker", help="claim and run tasks until Ctrl-C")
+    worker_parser.add_argument("broker", help="broker database shared with the job")
+    worker_parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS),
+                               help="task kinds to take (default: both)")
+    worker_parser.add_argument("--id", default=None, help="worker name (default: host-pid)")
+    worker_parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                               help="lease on a claimed task, renewed while it runs "
+                                    f"(default: {DEFAULT_LEASE_SECONDS})")
+    worker_parser.add_argument("--task-timeout", type=float, default=300,
+                               help="seconds before a task that is still running is given up")
+    worker_parser.add_argument("--threads", type=int, default=None, help="CPU threads for the model")
+    worker_parser.add_argument("--cache-dir", default=os.path.join("output", "cache"),
+                               help="this machine's summary and audio caches")
+    worker_parser.add_argument("--no-cache", action="store_true")
+    worker_parser.add_argument("--idle-exit", type=float, default=None,
+                               help="exit after this many seconds without a task")
+    worker_parser.add_argument("--fake", action="store_true",
+                               help="use the stand-in model and TTS engine from fakes.py")
+
+    status_parser = subparsers.add_parser("status", help="count tasks by state")
+    status_parser.add_argument("broker")
+    for subparser in (worker_parser, status_parser):
+        subparser.add_argument("--journal-mode", choices=JOURNAL_MODES, default=None,
+                               help="journal mode of a new broker (default: delete on a network "
+                                    "filesystem, else wal); must match an existing broker's")
+    args = parser.parse_args(argv)
+
+    broker = TaskBroker(args.broker, lease_seconds=getattr(args, "lease_seconds", DEFAULT_LEASE_SECONDS),
+                        journal_mode=args.journal_mode)
+    try:
+        stats = broker.stats()  # Opens the database, checking its journal mode
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    if args.command == "status":
+        print(" ".join(f"{state}={count}" for state, count in sorted(stats.items())) or "empty")
+        return 0
+
+    model_factory = engine_factory = None
+    if args.fake:
+        from fakes import FakeLLM, FakeTTS
+        model_factory = FakeLLM(seconds_per_call=0.05, seconds_per_token=0.002)
+        engine_factory = FakeTTS(seconds_per_call=0.02, realtime_factor=0.02)
+    worker = BrokerWorker(broker, args.kinds, args.id, None if args.no_cache else args.cache_dir,
+                          model_factory, engine_factory, args.threads, args.task_timeout)
+    worker.run(args.idle_exit)
+    broker.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+DEFAULT_SUMMARY_CACHE_BYTES = 256 * 1024 * 1024
+DEFAULT_AUDIO_CACHE_BYTES = 1024 * 1024 * 1024
+
+
+def content_key(*parts):
+    """SHA-256 over length-prefixed parts, so different splits can't collide."""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class _SQLiteCache:
+    """Shared plumbing for caches indexed by a SQLite database.
+
+    Each process opens its own connection (connections must not cross a
+    fork) and WAL mode lets readers and writers in several processes work
+    on the same database.
+    """
+
+    SCHEMA = ()
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connect(self):
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def stats(self):
+        """Return hit/miss counts for this process."""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class SummaryCache(_SQLiteCache):
+    """Persistent summary cache keyed by a content hash, with LRU eviction.
+
+    Entries live in a SQLite database so several worker processes (and
+    several runs) can share one cache safely.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS summaries ("
+        "key TEXT PRIMARY KEY, summary TEXT NOT NULL, "
+        "size INTEGER NOT NULL, last_used REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries(last_used)",
+    )
+
+    def __init__(self, path, max_bytes=DEFAULT_SUMMARY_CACHE_BYTES):
+        super().__init__(path, max_bytes)
+
+    @staticmethod
+    def make_key(text, model_name, prompt_template, params):
+        """Hash everything that affects the generated summary."""
+        return content_key(model_name, prompt_template, json.dumps(params, sort_keys=True), text)
+
+    def get(self, key):
+        """Return the cached summary for key, or None on a miss."""
+        with self._lock:
+            try:
+                conn = self._connect()
+                row = conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE summaries SET last_used = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+                self.hits += 1
+                return row[0]
+            except sqlite3.Error as e:
+                print(f"[Cache] Warning: Summary cache read failed: {str(e)}")
+                self.misses += 1
+                return None
+
+    def put(self, key, summary):
+        """Store a summary and evict least recently used entries beyond the size cap."""
+        size = len(summary.encode("utf-8"))
+        with self._lock:
+            try:
+                conn = self._connect()
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO summaries (key, summary, size, last_used) VALUES (?, ?, ?, ?)",
+                        (key, summary, size, time.time()),
+                    )
+                    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+                    if total > self.max_bytes:
+                        oldest = conn.execute(
+                            "SELECT key, size FROM summaries ORDER BY last_used"
+                        ).fetchall()
+                        for old_key, old_size in oldest:
+                            if total <= self.max_bytes:
+                                break
+                            conn.execute("DELETE FROM summaries WHERE key = ?", (old_key,))
+                            total -= old_size
+            except sqlite3.Error as e:
+                print(f"[Cache] Warning: Summary cache write failed: {str(e)}")
+
+
+class AudioCache(_SQLiteCache):
+    """Content-addressed cache of synthesized audio files.
+
+    Files are stored as <directory>/<key>.<format>, keyed by a hash of the
+    text and voice settings. The index records each file's size and
+    duration, so an entry is validated by a stat() call rather than by
+    decoding the audio. Least recently used files are evicted beyond the
+    size cap.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS audio ("
+        "key TEXT PRIMARY KEY, filename TEXT NOT NULL, size INTEGER NOT NULL, "
+        "duration_ms INTEGER NOT NULL, last_used REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS audio_last_used ON audio(last_used)",
+    )
+
+    def __init__(self, directory, max_bytes=DEFAULT_AUDIO_CACHE_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(os.path.join(directory, "index.db"), max_bytes)
+        self.directory = directory
+
+    @staticmethod
+    def make_key(text, settings):
+        """Hash the text together with the voice, rate, volume and format."""
+        return content_key(json.dumps(settings, sort_keys=True, default=str), text)
+
+    def get(self, key):
+        """Return (path, duration_ms) for a valid cached file, or None on a miss."""
+        with self._lock:
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT filename, size, duration_ms FROM audio WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    filename, size, duration_ms = row
+                    path = os.path.join(self.directory, filename)
+                    try:
+                        valid = os.path.getsize(path) == size
+                    except OSError:
+                        valid = False
+                    if valid:
+                        conn.execute("UPDATE audio SET last_used = ? WHERE key = ?", (time.time(), key))
+                        conn.commit()
+                        self.hits += 1
+                        return path, duration_ms
+                    # The file is missing or was truncated; forget it
+                    with conn:
+                        conn.execute("DELETE FROM audio WHERE key = ?", (key,))
+                    _remove_quietly(path)
+                self.misses += 1
+                return None
+            except sqlite3.Error as e:
+                print(f"[Cache] Warning: Audio cache read failed: {str(e)}")
+                self.misses += 1
+                return None
+
+    def put(self, key, source_path, duration_ms):
+        """Copy a validated audio file into the cache and return the cached path."""
+        extension = os.path.splitext(source_path)[1]
+        filename = f"{key}{extension}"
+        path = os.path.join(self.directory, filename)
+        with self._lock:
+            try:
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                link_or_copy(source_path, temp_path)
+                os.replace(temp_path, path)
+                size = os.path.getsize(path)
+                conn = self._connect()
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO audio (key, filename, size, duration_ms, last_used) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (key, filename, size, duration_ms, time.time()),
+                    )
+                    self._evict(conn)
+                return path
+            except (OSError, sqlite3.Error) as e:
+                print(f"[Cache] Warning: Audio cache write failed: {str(e)}")
+                return None
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM audio").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for old_key, filename, size in conn.execute(
+            "SELECT key, filename, size FROM audio ORDER BY last_used"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM audio WHERE key = ?", (old_key,))
+            _remove_quietly(os.path.join(self.directory, filename))
+            total -= size
+
+
+def link_or_copy(source, destination):
+    """Hard-link source to destination, copying when links aren't supported."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,147 @@
+import re
+
+# A sentence ends at . ! or ? (optionally followed by a closing quote or
+# bracket) and whitespace; a blank line always ends a paragraph.
+_BOUNDARY = re.compile(r"(?:(?<=[.!?])|(?<=[.!?][\"'”’)\]]))\s+|\n\s*\n")
+
+
+# Llama-family tokenizers (the default orca-mini model) average fewer than 4
+# characters per token on English prose and far fewer on numbers and symbols
+# from PDFs, so estimate on the high side: an undercount overflows the context
+# and the model returns nothing
+CHARS_PER_TOKEN = 3
+
+
+def approx_token_count(text):
+    """Approximate the token count of text, erring high (CHARS_PER_TOKEN characters per token)."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def split_sentences(text):
+    """Split text on sentence and paragraph boundaries.
+
+    The last element is the text after the final boundary, which is an empty
+    string when text ends on a boundary.
+    """
+    return _BOUNDARY.split(text)
+
+
+class TextChunker:
+    """Pack whole sentences into chunks of at most max_tokens tokens.
+
+    Text can be given all at once with chunk(), or incrementally with feed()
+    and flush() so chunks are produced while a document is still being read.
+    Sentences are only split when a single sentence exceeds the budget.
+    """
+
+    def __init__(self, max_tokens, count_tokens=None):
+        if max_tokens < 1:
+            raise ValueError("max_tokens must be at least 1")
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens or approx_token_count
+        self._pending = ""
+        self._sentences = []
+        self._tokens = 0
+
+    def feed(self, text):
+        """Add text and return the list of chunks completed by it."""
+        units = split_sentences(self._pending + text)
+        # The text after the last boundary may continue in the next call
+        self._pending = units.pop()
+        if self.count_tokens(self._pending) > self.max_tokens:
+            # No boundary in sight; don't let the tail grow without limit
+            units.append(self._pending)
+            self._pending = ""
+        return self._pack(units)
+
+    def flush(self):
+        """Return the remaining chunks and reset the chunker."""
+        chunks = self._pack([self._pending])
+        self._pending = ""
+        if self._sentences:
+            chunks.append(self._emit())
+        return chunks
+
+    def chunk(self, text):
+        """Split a complete text into chunks."""
+        return self.feed(text) + self.flush()
+
+    def _pack(self, units):
+        chunks = []
+        for unit in units:
+            sentence = " ".join(unit.split())
+            if not sentence:
+                continue
+            tokens = self.count_tokens(sentence)
+            pieces = [(sentence, tokens)] if tokens <= self.max_tokens else self._split_long(sentence)
+            for piece, piece_tokens in pieces:
+                # The space joining a piece to the previous one counts too
+                if self._sentences and self._tokens + 1 + piece_tokens > self.max_tokens:
+                    chunks.append(self._emit())
+                self._tokens += piece_tokens + (1 if self._sentences else 0)
+                self._sentences.append(piece)
+        return chunks
+
+    def _emit(self):
+        chunk = " ".join(self._sentences)
+        self._sentences = []
+        self._tokens = 0
+        return chunk
+
+    def _split_long(self, sentence):
+        """Split an over-budget sentence on word boundaries."""
+        pieces = []
+        words = []
+        tokens = 0
+        for word in sentence.split(" "):
+            word_tokens = self.count_tokens(word) + 1
+            if word_tokens > self.max_tokens:
+                # A single "word" larger than the budget (e.g. a URL or table row)
+                if words:
+                    piece = " ".join(words)
+                    pieces.append((piece, self.count_tokens(piece)))
+                    words = []
+                    tokens = 0
+                step = max(1, len(word) * self.max_tokens // word_tokens)
+                for i in range(0, len(word), step):
+                    part = word[i:i + step]
+                    pieces.append((part, self.count_tokens(part)))
+                continue
+            if words and tokens + word_tokens > self.max_tokens:
+                piece = " ".join(words)
+                pieces.append((piece, self.count_tokens(piece)))
+                words = []
+                tokens = 0
+            words.append(word)
+            tokens += word_tokens
+        if words:
+            piece = " ".join(words)
+            pieces.append((piece, self.count_tokens(piece)))
+        return pieces
+
+
+def iter_sentences(pieces, min_chars=0):
+    """Yield complete sentences from an iterable of text fragments such as LLM tokens.
+
+    Sentences shorter than min_chars are joined with the following one. Any
+    trailing text without a closing boundary is yielded at the end.
+    """
+    buffer = ""
+    pending = ""
+    for piece in pieces:
+        buffer += piece
+        if not _BOUNDARY.search(buffer):
+            continue
+        units = split_sentences(buffer)
+        buffer = units.pop()
+        for unit in units:
+            sentence = " ".join(unit.split())
+            if not sentence:
+                continue
+            pending = f"{pending} {sentence}" if pending else sentence
+            if len(pending) >= min_chars:
+                yield pending
+                pending = ""
+    tail = " ".join(f"{pending} {buffer}".split())
+    if tail:
+        yield tail
@@ -0,0 +1,97 @@
+"""Deterministic stand-ins for GPT4All and pyttsx3, for running the pipeline offline.
+
+Both are configured with latency and output size knobs and are picklable,
+so they can be handed to the worker pools:
+
+    TextSummarizationAgent(model_factory=FakeLLM(seconds_per_token=0.01))
+    TTSAgent(engine_factory=FakeTTS(realtime_factor=0.05))
+"""
+
+import contextlib
+import time
+import wave
+
+
+class FakeLLM:
+    """Model factory whose "summary" is the first summary_words words of the prompt's text.
+
+    Each call costs seconds_per_call plus seconds_per_token per generated word.
+    """
+
+    def __init__(self, summary_words=60, seconds_per_call=0.0, seconds_per_token=0.0):
+        self.summary_words = summary_words
+        self.seconds_per_call = seconds_per_call
+        self.seconds_per_token = seconds_per_token
+
+    def __call__(self, model_name, n_threads=None):
+        return _FakeModel(self)
+
+
+class _FakeModel:
+    def __init__(self, config):
+        self.config = config
+
+    @contextlib.contextmanager
+    def chat_session(self):
+        yield
+
+    def _words(self, prompt, max_tokens):
+        # The text follows the instruction line(s) of the prompt templates
+        text = prompt.split("\n\n", 1)[-1]
+        return text.split()[:min(self.config.summary_words, max_tokens)]
+
+    def _tokens(self, words):
+        time.sleep(self.config.seconds_per_call)
+        for i, word in enumerate(words):
+            time.sleep(self.config.seconds_per_token)
+            yield word if i == 0 else f" {word}"
+
+    def generate(self, prompt, max_tokens=200, streaming=False):
+        tokens = self._tokens(self._words(prompt, max_tokens))
+        return tokens if streaming else "".join(tokens)
+
+
+class FakeTTS:
+    """Engine factory that writes silent PCM WAV at words_per_minute speaking speed.
+
+    Synthesis takes seconds_per_call plus realtime_factor times the audio
+    duration; sample_rate sets the output size.
+    """
+
+    def __init__(self, words_per_minute=180, sample_rate=22050, seconds_per_call=0.0,
+                 realtime_factor=0.0):
+        self.words_per_minute = words_per_minute
+        self.sample_rate = sample_rate
+        self.seconds_per_call = seconds_per_call
+        self.realtime_factor = realtime_factor
+
+    def __call__(self):
+        return _FakeEngine(self)
+
+
+class _FakeEngine:
+    def __init__(self, config):
+        self.config = config
+        self._properties = {"voices": ["fake"], "voice": "fake"}
+        self._jobs = []
+
+    def setProperty(self, name, value):
+        self._properties[name] = value
+
+    def getProperty(self, name):
+        return self._properties.get(name)
+
+    def save_to_file(self, text, path):
+        self._jobs.append((text, path))
+
+    def runAndWait(self):
+        jobs, self._jobs = self._jobs, []
+        for text, path in jobs:
+            seconds = max(1, len(text.split())) * 60 / self.config.words_per_minute
+            time.sleep(self.config.seconds_per_call + self.config.realtime_factor * seconds)
+            frames = int(seconds * self.config.sample_rate)
+            with wave.open(path, "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(self.config.sample_rate)
+                f.writeframes(bytes(2 * frames))
@@ -1,369 +1,178 @@
-
+import argparse
+import json
 import os
 import sys
-import time
-import threading
-import queue
 from agents import PDFProcessingAgent, TextSummarizationAgent, TTSAgent, PublishingAgent
-from pydub import AudioSegment
-
-# Ensure the output directory exists
-output_dir = "output"
-os.makedirs(output_dir, exist_ok=True)
-
-# Shared queues between agents
-text_queue = queue.Queue()
-summary_queue = queue.Queue()
-audio_queue = queue.Queue()
-
-# Setup agents
-pdf_agent = PDFProcessingAgent()
-summarizer = TextSummarizationAgent()
-tts_agent = TTSAgent()
-publisher = PublishingAgent()
-
-output_dir = "output"
-os.makedirs(output_dir, exist_ok=True)
-
-
-def extract_text_chunks(pdf_path, chunk_size=1000):
-    print("[PDF] Extracting text...")
-    try:
-        full_text = pdf_agent.process_pdf(pdf_path)
-        if not full_text:
-            print("[PDF] Error: No text could be extracted from the PDF")
-            text_queue.put(None)
-            return
-            
-        # Split text into chunks
-        chunks = []
-        for i in range(0, len(full_text), chunk_size):
-            chunk = full_text[i:i + chunk_size].strip()
-            if chunk:  # Only add non-empty chunks
-                chunks.append(chunk)
-        
-        if not chunks:
-            print("[PDF] Error: No valid text chunks could be created")
-            text_queue.put(None)
-            return
-            
-        print(f"[PDF] Extracted {len(chunks)} text chunks")
-        for idx, chunk in enumerate(chunks):
-            text_queue.put((idx, chunk))
-        text_queue.put(None)  # Poison pill
-        
-    except Exception as e:
-        print(f"[PDF] Error: {str(e)}")
-        text_queue.put(None)  # Ensure we don't deadlock
+from broker import JOURNAL_MODES, TaskBroker
+from cache import AudioCache, SummaryCache, content_key
+from chunking import CHARS_PER_TOKEN
+from manifest import JobManifest, file_hash
+from mapreduce import CHARS_PER_MINUTE
+from metrics import Metrics, print_summary
+from podcast import PodcastJob, check_job_options
+from queues import DEFAULT_MEMORY_BUDGET_BYTES, DEFAULT_QUEUE_SIZE, print_queue_stats
 
 
-def summarize_chunks():
-    while True:
-        item = text_queue.get()
-        if item is None:
-            summary_queue.put(None)  # Pass poison pill forward
-            break
-        idx, chunk = item
-        print(f"[Summarizer] Processing chunk of {len(chunk)} characters")
-        summary = summarizer.summarize(chunk)  # Fixed method name
-        print(f"[Summarizer] Generated summary of {len(summary)} characters")
-        summary_queue.put((idx, summary))
-        print(f"[Summarizer] Processed chunk {idx}")
-
-
-def tts_chunks():
-    print("\n[TTS] Starting text-to-speech processing...")
-    
-    if not hasattr(tts_agent, 'engine') or tts_agent.engine is None:
-        print("[!] WARNING: TTS engine not available. Audio will not be generated.")
-        audio_queue.put(None)  # Signal end of processing
-        return
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a PDF into a podcast.")
+    parser.add_argument("pdf_path", nargs="?", default="Atomic habits ( PDFDrive )-34-38.pdf",
+                        help="PDF file to convert")
+    parser.add_argument("--extract-workers", type=int, default=1,
+                        help="processes used for PDF text extraction (default: 1)")
+    parser.add_argument("--chunk-tokens", type=int, default=None,
+                        help="token budget per summarized chunk (default: fit the model context)")
+    parser.add_argument("--summarize-workers", type=int, default=1,
+                        help="summarizer processes, each loading its own model (default: 1)")
+    parser.add_argument("--target-minutes", type=float, default=None,
+                        help="reduce chunk summaries hierarchically to about this podcast length")
+    parser.add_argument("--target-chars", type=int, default=None,
+                        help="like --target-minutes, as a total summary length in characters")
+    parser.add_argument("--tts-workers", type=int, default=1,
+                        help="TTS processes, each with its own engine; also the limit on "
+                             "concurrent syntheses (default: 1)")
+    parser.add_argument("--tts-timeout", type=float, default=300,
+                        help="seconds before a TTS worker stuck on a chunk is restarted")
+    parser.add_argument("--broker", default=None, metavar="PATH",
+                        help="send summarize and TTS tasks to workers through this broker database "
+                             "(see broker.py) instead of running them here")
+    parser.add_argument("--broker-journal-mode", choices=JOURNAL_MODES, default=None,
+                        help="journal mode of a new broker database; use delete when workers on "
+                             "other hosts open it (default: delete on a network filesystem, else wal)")
+    parser.add_argument("--stream", action="store_true",
+                        help="send summaries to TTS sentence by sentence as they are generated")
+    parser.add_argument("--segments", action="store_true",
+                        help="also publish output/podcast_segments/playlist.m3u8, an HLS playlist "
+                             "that grows as chunks finish and can be played before the job ends")
+    parser.add_argument("--keep-boilerplate", action="store_true",
+                        help="don't strip repeated headers, footers, page numbers and "
+                             "near-duplicate chunks before summarizing")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="don't read or write the summary and audio caches")
+    parser.add_argument("--summary-cache-mb", type=int, default=None,
+                        help="size cap for the summary cache in MB (default: 256)")
+    parser.add_argument("--audio-cache-mb", type=int, default=None,
+                        help="size cap for the synthesized audio cache in MB (default: 1024)")
+    parser.add_argument("--text-queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"chunks waiting for the summarizer; 0 is unbounded "
+                             f"(default: {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument("--summary-queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"summaries waiting for TTS; 0 is unbounded (default: {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument("--audio-queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"audio chunks waiting for the publisher; 0 is unbounded "
+                             f"(default: {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument("--memory-budget-mb", type=float,
+                        default=DEFAULT_MEMORY_BUDGET_BYTES / (1024 * 1024),
+                        help="total text held in the queues before producers block; 0 disables "
+                             f"the budget (default: {DEFAULT_MEMORY_BUDGET_BYTES // (1024 * 1024)})")
+    parser.add_argument("--trace", action="store_true",
+                        help="also record a span per chunk and stage in output/trace.json")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore the job manifest and start over instead of resuming")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only report the chunk plan and expected LLM calls")
+    args = parser.parse_args()
+    pdf_path = args.pdf_path
     
-    processed = 0
-    failed = 0
+    if not os.path.exists(pdf_path):
+        print(f"Error: PDF file not found at {pdf_path}")
+        sys.exit(1)
     
+    target_chars = args.target_chars
+    if args.target_minutes is not None:
+        target_chars = int(args.target_minutes * CHARS_PER_MINUTE)
     try:
-        while True:
-            item = summary_queue.get()
-            if item is None:  # End of processing signal
-                print(f"\n[TTS] Completed: {processed} chunks processed, {failed} failed")
-                audio_queue.put(None)  # Signal end of processing
-                break
-                
-            idx, summary = item
-            if not summary or not summary.strip():
-                print(f"[TTS] Warning: Empty text for chunk {idx}")
-                failed += 1
-                continue
-            
-            try:
-                # Create output directory if it doesn't exist
-                os.makedirs(output_dir, exist_ok=True)
-                
-                # Generate a unique filename for this chunk
-                audio_path = os.path.abspath(os.path.join(output_dir, f"chunk_{idx}.mp3"))
-                temp_audio_path = os.path.join(output_dir, f"temp_chunk_{idx}_{os.urandom(4).hex()}.mp3")
-                
-                print(f"\n[TTS] Processing chunk {idx}")
-                print(f"  - Text length: {len(summary)} characters")
-                
-                # Check if file already exists and is valid
-                if os.path.exists(audio_path):
-                    try:
-                        audio = AudioSegment.from_file(audio_path)
-                        if len(audio) > 0:
-                            print(f"  - Using existing audio file: {os.path.basename(audio_path)}")
-                            audio_queue.put((idx, audio_path))
-                            processed += 1
-                            continue
-                        else:
-                            print("  - Warning: Existing audio file is empty, regenerating...")
-                            os.remove(audio_path)
-                    except Exception as e:
-                        print(f"  - Warning: Corrupted audio file, regenerating: {str(e)}")
-                        try:
-                            os.remove(audio_path)
-                        except:
-                            pass
-                
-                # Generate new audio
-                print(f"  - Generating speech...")
-                start_time = time.time()
-                
-                # Generate to temp file first
-                result = tts_agent.text_to_speech(summary, temp_audio_path)
-                
-                if result and os.path.exists(temp_audio_path) and os.path.getsize(temp_audio_path) > 0:
-                    # Verify the audio file can be loaded
-                    try:
-                        audio = AudioSegment.from_file(temp_audio_path)
-                        if len(audio) > 0:
-                            # Move temp file to final location
-                            if os.path.exists(audio_path):
-                                try:
-                                    os.remove(audio_path)
-                                except:
-                                    pass
-                            os.rename(temp_audio_path, audio_path)
-                            
-                            elapsed = time.time() - start_time
-                            print(f"  - Success: Generated {len(audio)//1000}s of audio in {elapsed:.1f}s")
-                            print(f"  - Saved to: {os.path.basename(audio_path)}")
-                            audio_queue.put((idx, audio_path))
-                            processed += 1
-                        else:
-                            raise Exception("Generated audio has 0 duration")
-                    except Exception as e:
-                        print(f"  - Error: Generated audio is invalid: {str(e)}")
-                        failed += 1
-                else:
-                    print("  - Error: TTS did not generate output file")
-                    failed += 1
-                
-            except Exception as e:
-                print(f"  - Error during TTS: {str(e)}")
-                failed += 1
-            finally:
-                # Clean up temp file if it exists
-                if 'temp_audio_path' in locals() and os.path.exists(temp_audio_path):
-                    try:
-                        os.remove(temp_audio_path)
-                    except:
-                        pass
-            
-            # Small delay to prevent overwhelming the TTS engine
-            time.sleep(0.5)
-            
-    except Exception as e:
-        print(f"[TTS] Fatal error in TTS processing: {str(e)}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        # Ensure we always signal the end of processing
-        audio_queue.put(None)
-
-
-def merge_audio(output_file="podcast.mp3"):
-    print("\n[Publisher] Starting audio processing...")
-    chunks = {}
-    processed_chunks = 0
-    total_chunks = 0
-    
-    # Create output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # First, collect all audio files from the queue
-    audio_files = []
-    while True:
-        item = audio_queue.get()
-        if item is None:  # End of queue marker
-            break
-        audio_files.append(item)
-    
-    total_chunks = len(audio_files)
-    if total_chunks == 0:
-        print("[Publisher] No audio chunks to process")
-        return
+        check_job_options(args.chunk_tokens, target_chars, args.stream, args.segments, args.broker)
+    except ValueError as e:
+        parser.error(str(e))
     
-    print(f"[Publisher] Found {total_chunks} audio chunks to process")
-    
-    # Process each audio file
-    for idx, audio_path in audio_files:
-        try:
-            print(f"\n[Publisher] Processing chunk {idx}: {os.path.basename(audio_path)}")
-            
-            # Check if file exists and has content
-            if not os.path.exists(audio_path):
-                print(f"  - Error: File not found: {audio_path}")
-                continue
-                
-            file_size = os.path.getsize(audio_path)
-            if file_size == 0:
-                print(f"  - Error: Empty file: {audio_path}")
-                try:
-                    os.remove(audio_path)  # Remove empty file
-                except:
-                    pass
-                continue
-                
-            print(f"  - Size: {file_size / 1024:.1f} KB")
-            
-            # Try to load the audio file
-            try:
-                audio = AudioSegment.from_file(audio_path)
-                if len(audio) == 0:
-                    print("  - Error: Could not load audio (0 duration)")
-                    try:
-                        os.remove(audio_path)  # Remove corrupted file
-                    except:
-                        pass
-                    continue
-                    
-                chunks[idx] = audio
-                processed_chunks += 1
-                print(f"  - Success: Loaded {len(audio)}ms of audio")
-                
-            except Exception as e:
-                print(f"  - Error loading audio: {str(e)}")
-                # Try alternative method if available
-                try:
-                    audio = AudioSegment.from_file(audio_path, format="wav")
-                    if len(audio) > 0:
-                        chunks[idx] = audio
-                        processed_chunks += 1
-                        print(f"  - Success: Loaded with WAV format")
-                    else:
-                        raise Exception("WAV file has 0 duration")
-                except Exception as e2:
-                    print(f"  - Error loading as WAV: {str(e2)}")
-                    try:
-                        os.remove(audio_path)  # Remove corrupted file
-                    except:
-                        pass
-                    
-        except Exception as e:
-            print(f"[Publisher] Error processing chunk {idx}: {str(e)}")
+    output_dir = "output"
+    summary_cache = audio_cache = None
+    # A dry run only plans chunks, so it leaves the caches alone too
+    if not (args.no_cache or args.dry_run):
+        # Persistent cache of chunk summaries, shared by all summarizer workers
+        summary_cache = SummaryCache(os.path.join(output_dir, "cache", "summaries.db"))
+        # Synthesized audio keyed by text and voice settings, shared by all TTS workers
+        audio_cache = AudioCache(os.path.join(output_dir, "cache", "audio"))
+        if args.summary_cache_mb is not None:
+            summary_cache.max_bytes = args.summary_cache_mb * 1024 * 1024
+        if args.audio_cache_mb is not None:
+            audio_cache.max_bytes = args.audio_cache_mb * 1024 * 1024
     
-    # Check if we have any chunks to merge
-    if not chunks:
-        print("\n❌ No valid audio chunks found to merge.")
-        print("Please check if the TTS engine is working correctly.")
-        return
+    # Setup agents. Building them is cheap: the model and TTS engine load on first use
+    pdf_agent = PDFProcessingAgent()
+    summarizer = TextSummarizationAgent(cache=summary_cache)
+    tts_agent = TTSAgent()
+    publisher = PublishingAgent()
     
-    # Sort chunks by their index
-    sorted_indices = sorted(chunks.keys())
-    print(f"\n[Publisher] Merging {len(chunks)}/{total_chunks} valid audio chunks...")
+    job = PodcastJob(pdf_path, output_dir=output_dir, summarizer=summarizer, tts_agent=tts_agent,
+                     pdf_agent=pdf_agent, publisher=publisher, audio_cache=audio_cache,
+                     metrics=Metrics(trace=args.trace), chunk_tokens=args.chunk_tokens,
+                     extract_workers=args.extract_workers, summarize_workers=args.summarize_workers,
+                     target_chars=target_chars, stream=args.stream, tts_workers=args.tts_workers,
+                     tts_timeout=args.tts_timeout, text_queue_size=args.text_queue_size,
+                     summary_queue_size=args.summary_queue_size,
+                     audio_queue_size=args.audio_queue_size,
+                     memory_budget_bytes=int(args.memory_budget_mb * 1024 * 1024),
+                     strip_boilerplate=not args.keep_boilerplate, segments=args.segments,
+                     broker=TaskBroker(args.broker, journal_mode=args.broker_journal_mode)
+                     if args.broker else None)
     
-    # Create a temporary file for the final output
-    temp_output = os.path.join(output_dir, f"temp_{os.urandom(8).hex()}.mp3")
-    final_path = os.path.join(output_dir, output_file)
-    
-    try:
-        # Start with the first chunk
-        print(f"  - Starting with chunk {sorted_indices[0]}")
-        final_audio = chunks[sorted_indices[0]]
-        
-        # Concatenate remaining chunks with progress
-        for i, idx in enumerate(sorted_indices[1:], 1):
-            print(f"  - Adding chunk {idx} ({i+1}/{len(sorted_indices)})")
-            final_audio += chunks[idx]
-        
-        # Export to temporary file first
-        print("  - Exporting final audio...")
-        final_audio.export(
-            temp_output,
-            format="mp3",
-            bitrate="192k",
-            tags={"title": "Generated Podcast", "artist": "PDF to Podcast"}
-        )
-        
-        # Verify the output file
-        if os.path.exists(temp_output) and os.path.getsize(temp_output) > 0:
-            # Remove existing output file if it exists
-            if os.path.exists(final_path):
-                try:
-                    os.remove(final_path)
-                except:
-                    pass
-            
-            # Rename temp file to final name
-            os.rename(temp_output, final_path)
-            
-            # Get final stats
-            duration_sec = len(final_audio) / 1000  # Convert ms to seconds
-            size_mb = os.path.getsize(final_path) / (1024 * 1024)
-            
-            print("\n" + "=" * 50)
-            print("✅ Podcast generation completed successfully!")
-            print(f"   Output file: {os.path.abspath(final_path)}")
-            print(f"   Duration: {duration_sec:.1f} seconds")
-            print(f"   File size: {size_mb:.2f} MB")
-            print("=" * 50)
-        else:
-            print("\n❌ Failed to generate output file")
-            
-    except Exception as e:
-        print(f"\n❌ Error during audio merging: {str(e)}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        # Clean up temporary file if it exists
-        if os.path.exists(temp_output):
-            try:
-                os.remove(temp_output)
-            except:
-                pass
-
-
-if __name__ == "__main__":
-    pdf_path = "Atomic habits ( PDFDrive )-34-38.pdf"
+    if args.dry_run:
+        job.plan_chunks()
+        sys.exit(0)
     
-    if not os.path.exists(pdf_path):
-        print(f"Error: PDF file not found at {pdf_path}")
-        sys.exit(1)
+    # Each stage's fingerprint covers everything its output depends on; a
+    # change restarts that stage and the ones after it
+    manifest = JobManifest(os.path.join(output_dir, "job.db"))
+    stale = manifest.begin({
+        "extract": content_key(file_hash(pdf_path), str(job.make_chunker().max_tokens),
+                               str(CHARS_PER_TOKEN), str(job.strip_boilerplate)),
+        "summarize": content_key(summarizer.model_name, str(summarizer.max_tokens),
+                                 summarizer.PROMPT_TEMPLATE, summarizer.REDUCE_PROMPT_TEMPLATE,
+                                 str(args.stream), str(target_chars)),
+        "tts": json.dumps(tts_agent.settings(), sort_keys=True, default=str),
+        "merge": content_key(job.output_file, job.bitrate, json.dumps(job.tags, sort_keys=True),
+                             str(args.segments)),
+    }, restart=args.restart)
+    job.manifest = manifest
+    done = manifest.stage_detail("merge")
+    podcast_path = job.output_path
+    if done and os.path.exists(podcast_path) and file_hash(podcast_path) == done["hash"]:
+        print(f"Job already complete: {os.path.abspath(podcast_path)} (use --restart to redo it)")
+        sys.exit(0)
+    if stale != "extract":
+        progress = manifest.progress()
+        print(f"Resuming job: {progress['extracted']} chunks extracted, "
+              f"{progress['summarized']} summarized, {progress['synthesized']} synthesized"
+              + (f" ({stale} onwards will be redone)" if stale else ""))
     
     print(f"Starting podcast generation from: {pdf_path}")
     print("-" * 50)
     
+    metrics = job.metrics
+    pipeline = job.pipeline()
+    metrics.sample_queues(pipeline.channels)
+    
+    if args.summarize_workers <= 1 and not args.broker:
+        # Load the model while the PDF is being extracted; pool and broker workers load their own
+        summarizer.warm_up()
+    
     try:
-        # Launch threads for each agent
-        threads = [
-            threading.Thread(target=extract_text_chunks, args=(pdf_path,)),
-            threading.Thread(target=summarize_chunks),
-            threading.Thread(target=tts_chunks),
-            threading.Thread(target=merge_audio, args=("podcast.mp3",))
-        ]
+        job.run(pipeline)
         
-        for t in threads:
-            t.daemon = True  # Ensure threads exit when main program exits
-            t.start()
+        print_queue_stats(pipeline.channels, pipeline.budget)
         
-        # Wait for all threads to complete
-        for t in threads:
-            t.join()
+        metrics.stop()
+        report = metrics.report()
+        print_summary(report)
+        metrics.write_json(os.path.join(output_dir, "run_report.json"))
+        metrics.write_prometheus(os.path.join(output_dir, "metrics.prom"))
+        if args.trace:
+            metrics.write_trace(os.path.join(output_dir, "trace.json"))
+        print(f"[Metrics] Run report written to {os.path.join(output_dir, 'run_report.json')}")
             
         print("\n" + "=" * 50)
-        print("Podcast generation completed!" if os.path.exists(os.path.join(output_dir, "podcast.mp3")) 
+        print("Podcast generation completed!" if os.path.exists(podcast_path) 
               else "Podcast generation completed with some errors.")
         
     except KeyboardInterrupt:
@@ -371,4 +180,5 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"\nAn error occurred: {str(e)}")
     finally:
+        manifest.close()
         print("Exiting...")
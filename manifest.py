@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from cache import content_key
+
+# Stages in pipeline order; resetting one resets every stage after it
+STAGES = ("extract", "summarize", "tts", "merge")
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class JobManifest:
+    """Checkpoint journal of one job's chunks through extract -> summarize -> TTS -> merge.
+
+    Stored as SQLite in the output directory and updated as each chunk
+    finishes a stage, so a run that dies can be restarted and skip the work
+    already done. Every stage is recorded with a fingerprint of its inputs
+    (the PDF, chunk budget, model, prompts, voice); when one changes, that
+    stage and all later ones start over. Chunk texts, summaries and audio
+    files are checked against their content hashes before they are reused.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS stages ("
+        "stage TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, "
+        "complete INTEGER NOT NULL DEFAULT 0, detail TEXT)",
+        "CREATE TABLE IF NOT EXISTS chunks ("
+        "idx INTEGER PRIMARY KEY, text TEXT NOT NULL, text_hash TEXT NOT NULL, "
+        "summary TEXT, summary_hash TEXT)",
+        "CREATE TABLE IF NOT EXISTS audio ("
+        "key TEXT PRIMARY KEY, text_hash TEXT NOT NULL, path TEXT NOT NULL, "
+        "size INTEGER NOT NULL, hash TEXT NOT NULL, merged INTEGER NOT NULL DEFAULT 0)",
+    )
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Stage threads share one connection, serialized by the lock
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in self.SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    def _reset(self, conn, stage):
+        if stage == "extract":
+            conn.execute("DELETE FROM chunks")
+        elif stage == "summarize":
+            conn.execute("UPDATE chunks SET summary = NULL, summary_hash = NULL")
+        elif stage == "tts":
+            conn.execute("DELETE FROM audio")
+        elif stage == "merge":
+            conn.execute("UPDATE audio SET merged = 0")
+
+    def begin(self, fingerprints, restart=False):
+        """Open the job with a {stage: fingerprint} dict.
+
+        Returns the first stage that has to start over, or None when the
+        whole journal is still valid.
+        """
+        stale = None
+        with self._lock, self._conn as conn:
+            for stage in STAGES:
+                row = conn.execute("SELECT fingerprint FROM stages WHERE stage = ?",
+                                   (stage,)).fetchone()
+                if stale is None and (restart or row is None or row[0] != fingerprints[stage]):
+                    stale = stage
+                if stale is not None:
+                    self._reset(conn, stage)
+                    conn.execute("INSERT OR REPLACE INTO stages (stage, fingerprint, complete) "
+                                 "VALUES (?, ?, 0)", (stage, fingerprints[stage]))
+        return stale
+
+    def stage_detail(self, stage):
+        """Return the detail recorded when stage completed, or None if it hasn't."""
+        with self._lock:
+            row = self._conn.execute("SELECT complete, detail FROM stages WHERE stage = ?",
+                                     (stage,)).fetchone()
+        if row is None or not row[0]:
+            return None
+        return json.loads(row[1]) if row[1] else {}
+
+    def complete_stage(self, stage, detail=None):
+        with self._lock, self._conn as conn:
+            conn.execute("UPDATE stages SET complete = 1, detail = ? WHERE stage = ?",
+                         (json.dumps(detail or {}), stage))
+
+    def record_chunk(self, idx, text):
+        """Record an extracted chunk, keeping its summary if the text is unchanged."""
+        text_hash = content_key(text)
+        with self._lock, self._conn as conn:
+            row = conn.execute("SELECT text_hash FROM chunks WHERE idx = ?", (idx,)).fetchone()
+            if row is not None and row[0] == text_hash:
+                return
+            conn.execute("INSERT OR REPLACE INTO chunks (idx, text, text_hash) VALUES (?, ?, ?)",
+                         (idx, text, text_hash))
+
+    def chunks(self):
+        """Return the recorded (idx, text) chunks in order."""
+        with self._lock:
+            rows = self._conn.execute("SELECT idx, text, text_hash FROM chunks ORDER BY idx").fetchall()
+        # A corrupted row means extraction has to run again
+        if any(content_key(text) != text_hash for _, text, text_hash in rows):
+            return None
+        return [(idx, text) for idx, text, _ in rows]
+
+    def summary_for(self, idx, text):
+        """Return the recorded summary of chunk idx if it was made from this text, else None.
+
+        The summary is a string, or a list of sentences in streaming mode.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text_hash, summary, summary_hash FROM chunks WHERE idx = ?", (idx,)
+            ).fetchone()
+        if row is None or row[1] is None or row[0] != content_key(text):
+            return None
+        if content_key(row[1]) != row[2]:
+            return None
+        return json.loads(row[1])
+
+    def record_summary(self, idx, summary):
+        encoded = json.dumps(summary)
+        with self._lock, self._conn as conn:
+            conn.execute("UPDATE chunks SET summary = ?, summary_hash = ? WHERE idx = ?",
+                         (encoded, content_key(encoded), idx))
+
+    def audio_for(self, key, text):
+        """Return the recorded audio path for key if it was synthesized from text and is intact."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text_hash, path, size, hash FROM audio WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[0] != content_key(text):
+            return None
+        _, path, size, audio_hash = row
+        try:
+            if os.path.getsize(path) != size or file_hash(path) != audio_hash:
+                return None
+        except OSError:
+            return None
+        return path
+
+    def record_audio(self, key, text, path):
+        size = os.path.getsize(path)
+        audio_hash = file_hash(path)
+        with self._lock, self._conn as conn:
+            conn.execute("INSERT OR REPLACE INTO audio (key, text_hash, path, size, hash, merged) "
+                         "VALUES (?, ?, ?, ?, ?, 0)", (key, content_key(text), path, size, audio_hash))
+
+    def mark_merged(self, key):
+        with self._lock, self._conn as conn:
+            conn.execute("UPDATE audio SET merged = 1 WHERE key = ?", (key,))
+
+    def reset_merged(self):
+        """Forget merge progress; the podcast file is rebuilt from the start."""
+        with self._lock, self._conn as conn:
+            self._reset(conn, "merge")
+            conn.execute("UPDATE stages SET complete = 0 WHERE stage = 'merge'")
+
+    def progress(self):
+        """Return how many chunks have reached each stage."""
+        with self._lock:
+            conn = self._conn
+            return {
+                "extracted": conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0],
+                "summarized": conn.execute(
+                    "SELECT COUNT(*) FROM chunks WHERE summary IS NOT NULL").fetchone()[0],
+                "synthesized": conn.execute("SELECT COUNT(*) FROM audio").fetchone()[0],
+                "merged": conn.execute("SELECT COUNT(*) FROM audio WHERE merged = 1").fetchone()[0],
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,49 @@
+from chunking import approx_token_count
+
+# ~180 spoken words per minute at the default TTS rate, ~6 characters per word
+CHARS_PER_MINUTE = 180 * 6
+
+
+def group_summaries(summaries, max_tokens, count_tokens=None):
+    """Pack consecutive summaries into groups that fit in max_tokens."""
+    count_tokens = count_tokens or approx_token_count
+    groups = []
+    current = []
+    tokens = 0
+    for summary in summaries:
+        summary_tokens = count_tokens(summary)
+        if current and tokens + summary_tokens > max_tokens:
+            groups.append(current)
+            current = []
+            tokens = 0
+        current.append(summary)
+        tokens += summary_tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def reduce_summaries(summaries, reduce_many, target_chars, max_tokens, count_tokens=None,
+                     max_levels=8):
+    """Recursively merge ordered summaries until their total length fits target_chars.
+
+    reduce_many takes a list of texts and returns their reduced texts in the
+    same order, so each level can be spread across workers. Returns the final
+    list of summaries, which stays in document order.
+    """
+    level = 0
+    total = sum(len(s) for s in summaries)
+    while total > target_chars and level < max_levels:
+        level += 1
+        groups = group_summaries(summaries, max_tokens, count_tokens)
+        print(f"[Reduce] Level {level}: {len(summaries)} summaries ({total} characters) "
+              f"-> {len(groups)} groups")
+        reduced = reduce_many(["\n\n".join(group) for group in groups])
+        reduced_total = sum(len(s) for s in reduced)
+        if reduced_total >= total:
+            print("[Reduce] Warning: Summaries stopped shrinking, keeping the previous level")
+            break
+        summaries = reduced
+        total = reduced_total
+    print(f"[Reduce] Done after {level} level(s): {len(summaries)} summaries, {total} characters")
+    return summaries
@@ -0,0 +1,288 @@
+import bisect
+import collections
+import json
+import os
+import threading
+import time
+
+# Upper bounds, in seconds, of the per-chunk latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGES = ("extract", "summarize", "tts", "merge")
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self):
+        """Return [(upper bound, cumulative count)], ending with +Inf."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """Per-stage metrics for one run: latency histograms, throughput, queue depths,
+    cache hit rates and failures, plus optional per-chunk trace spans.
+
+    Stage threads and pool result loops record into one shared instance;
+    every method is thread-safe.
+    """
+
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.started = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+        self._latency = collections.defaultdict(Histogram)
+        self._counters = collections.defaultdict(float)  # (stage, name) -> value
+        self._busy = collections.defaultdict(float)  # stage -> summed chunk seconds
+        self._active = {}  # stage -> [first start, last end]
+        self._first_done = {}  # stage -> end of its earliest finished chunk
+        self._queue_depths = collections.defaultdict(list)  # queue -> [(offset, depth)]
+        self._spans = []
+        self._sampler = None
+        self._stop_sampling = threading.Event()
+
+    def observe(self, stage, seconds, key=None, chars=0, audio_seconds=0.0, started=None,
+                lane=None, failed=False):
+        """Record one chunk handled by stage in the given number of seconds.
+
+        A failed chunk still counts as busy time, but not as a finished chunk.
+        """
+        started = time.time() - seconds if started is None else started
+        with self._lock:
+            self._latency[stage].observe(seconds)
+            self._busy[stage] += seconds
+            window = self._active.setdefault(stage, [started, started + seconds])
+            window[0] = min(window[0], started)
+            window[1] = max(window[1], started + seconds)
+            if not failed:
+                self._counters[(stage, "chunks")] += 1
+                self._counters[(stage, "chars")] += chars
+                self._counters[(stage, "audio_seconds")] += audio_seconds
+                self._first_done[stage] = min(self._first_done.get(stage, started + seconds),
+                                              started + seconds)
+            if self.trace:
+                self._spans.append({"stage": stage, "key": _key_name(key), "start": started,
+                                    "seconds": seconds, "lane": lane or stage})
+
+    def timer(self, stage, key=None, lane=None):
+        """Context manager that times its block; set chars/audio_seconds/failed on the result."""
+        return _Timer(self, stage, key, lane)
+
+    def count(self, stage, name, value=1):
+        """Add to a counter such as failures or cache_hits."""
+        with self._lock:
+            self._counters[(stage, name)] += value
+
+    def record_cache(self, stage, stats):
+        if stats:
+            self.count(stage, "cache_hits", stats["hits"])
+            self.count(stage, "cache_misses", stats["misses"])
+
+    def sample_queues(self, queues, interval=0.5):
+        """Record the depth of each queue every interval seconds until stop() is called."""
+        def sample():
+            while not self._stop_sampling.is_set():
+                offset = time.time() - self.started
+                with self._lock:
+                    for q in queues:
+                        self._queue_depths[q.name].append((round(offset, 3), q.qsize()))
+                self._stop_sampling.wait(interval)
+
+        self._sampler = threading.Thread(target=sample, daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop_sampling.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.finished = time.time()
+
+    def report(self):
+        """Return the run report as a JSON-serializable dict."""
+        with self._lock:
+            wall = (self.finished or time.time()) - self.started
+            stages = {}
+            for stage in sorted(set(self._latency) | {s for s, _ in self._counters},
+                                key=_stage_order):
+                histogram = self._latency.get(stage) or Histogram()
+                window = self._active.get(stage)
+                active = window[1] - window[0] if window else 0.0
+                counters = {name: value for (s, name), value in self._counters.items()
+                            if s == stage}
+                hits = counters.get("cache_hits", 0)
+                lookups = hits + counters.get("cache_misses", 0)
+                stages[stage] = {
+                    "chunks": int(counters.get("chunks", 0)),
+                    "failures": int(counters.get("failures", 0)),
+                    "latency": {"count": histogram.count, "sum": round(histogram.sum, 4),
+                                "p50": round(histogram.quantile(0.5), 4),
+                                "p95": round(histogram.quantile(0.95), 4),
+                                "max": round(histogram.max, 4)},
+                    "busy_seconds": round(self._busy.get(stage, 0.0), 4),
+                    "active_seconds": round(active, 4),
+                    # For merge, this is the time to the first audio in the podcast
+                    "first_done_seconds": round(self._first_done[stage] - self.started, 4)
+                    if stage in self._first_done else None,
+                    "chars_per_second": round(counters.get("chars", 0) / active, 2) if active else 0.0,
+                    "audio_seconds": round(counters.get("audio_seconds", 0), 3),
+                    "audio_seconds_per_wall_second":
+                        round(counters.get("audio_seconds", 0) / active, 3) if active else 0.0,
+                    "cache_hit_rate": round(hits / lookups, 4) if lookups else None,
+                    "counters": {name: value for name, value in counters.items()},
+                }
+            queues = {name: {"max": max((d for _, d in samples), default=0),
+                             "mean": round(sum(d for _, d in samples) / len(samples), 2)
+                             if samples else 0, "samples": samples}
+                      for name, samples in self._queue_depths.items()}
+            report = {"wall_seconds": round(wall, 3), "stages": stages, "queues": queues,
+                      "bottleneck": max(stages, key=lambda s: stages[s]["busy_seconds"])
+                      if stages else None}
+            if self.trace:
+                report["spans"] = [dict(span, start=round(span["start"] - self.started, 4))
+                                   for span in self._spans]
+            return report
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.report(), indent=2))
+
+    def write_prometheus(self, path, prefix="podcast"):
+        """Write the metrics in the Prometheus text exposition format (for node_exporter's
+        textfile collector or a push gateway)."""
+        report = self.report()
+        lines = [f"# HELP {prefix}_stage_latency_seconds Time spent on one chunk by each stage.",
+                 f"# TYPE {prefix}_stage_latency_seconds histogram"]
+        with self._lock:
+            histograms = dict(self._latency)
+        for stage, histogram in sorted(histograms.items(), key=lambda item: _stage_order(item[0])):
+            for bound, count in histogram.cumulative():
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f'{prefix}_stage_latency_seconds_bucket{{stage="{stage}",le="{le}"}} {count}')
+            lines.append(f'{prefix}_stage_latency_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+            lines.append(f'{prefix}_stage_latency_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        counter_names = sorted({name for stats in report["stages"].values()
+                                for name in stats["counters"]})
+        for name in counter_names:
+            lines.append(f"# TYPE {prefix}_stage_{name}_total counter")
+            for stage, stats in report["stages"].items():
+                if name in stats["counters"]:
+                    lines.append(f'{prefix}_stage_{name}_total{{stage="{stage}"}} '
+                                 f'{stats["counters"][name]:g}')
+        for name, help_text in (("busy_seconds", "Summed per-chunk time of each stage."),
+                                ("chars_per_second", "Characters handled per active second."),
+                                ("audio_seconds_per_wall_second",
+                                 "Audio produced per active second.")):
+            lines.append(f"# HELP {prefix}_stage_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_stage_{name} gauge")
+            for stage, stats in report["stages"].items():
+                lines.append(f'{prefix}_stage_{name}{{stage="{stage}"}} {stats[name]:g}')
+        lines.append(f"# TYPE {prefix}_queue_depth_max gauge")
+        for name, stats in report["queues"].items():
+            lines.append(f'{prefix}_queue_depth_max{{queue="{name}"}} {stats["max"]}')
+        lines.append(f"# TYPE {prefix}_run_wall_seconds gauge")
+        lines.append(f"{prefix}_run_wall_seconds {report['wall_seconds']}")
+        _write_atomic(path, "\n".join(lines) + "\n")
+
+    def write_trace(self, path):
+        """Write the spans in Chrome trace event format (chrome://tracing, Perfetto)."""
+        with self._lock:
+            spans = list(self._spans)
+        lanes = {}
+        events = []
+        for span in spans:
+            tid = lanes.setdefault(span["lane"], len(lanes))
+            events.append({"name": f"{span['stage']} {span['key']}", "cat": span["stage"], "ph": "X",
+                           "ts": int((span["start"] - self.started) * 1e6),
+                           "dur": int(span["seconds"] * 1e6), "pid": 0, "tid": tid})
+        events.extend({"name": "thread_name", "ph": "M", "pid": 0, "tid": tid,
+                       "args": {"name": str(lane)}} for lane, tid in lanes.items())
+        _write_atomic(path, json.dumps({"traceEvents": events}))
+
+
+class _Timer:
+    def __init__(self, metrics, stage, key, lane):
+        self.metrics = metrics
+        self.stage = stage
+        self.key = key
+        self.lane = lane
+        self.chars = 0
+        self.audio_seconds = 0.0
+        self.failed = False  # Set when the block fails without raising
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, time.time() - self.started, self.key, self.chars,
+                             self.audio_seconds, self.started, self.lane,
+                             failed=self.failed or exc_type is not None)
+        if exc_type is not None:
+            self.metrics.count(self.stage, "failures")
+        return False
+
+
+def print_summary(report):
+    """Print a per-stage table and the stage that spent the most time working."""
+    print(f"\n[Metrics] {'stage':<10} {'chunks':>6} {'fail':>5} {'p50 s':>7} {'p95 s':>7} "
+          f"{'busy s':>8} {'chars/s':>9} {'audio x':>8} {'cache':>6}")
+    for stage, stats in report["stages"].items():
+        hit_rate = stats["cache_hit_rate"]
+        cache = "-" if hit_rate is None else f"{100 * hit_rate:.0f}%"
+        print(f"[Metrics] {stage:<10} {stats['chunks']:>6} {stats['failures']:>5} "
+              f"{stats['latency']['p50']:>7.2f} {stats['latency']['p95']:>7.2f} "
+              f"{stats['busy_seconds']:>8.1f} {stats['chars_per_second']:>9.0f} "
+              f"{stats['audio_seconds_per_wall_second']:>8.2f} {cache:>6}")
+    if report["bottleneck"]:
+        print(f"[Metrics] Busiest stage: {report['bottleneck']}")
+
+
+def _key_name(key):
+    if isinstance(key, tuple):
+        return "_".join(_key_name(part) for part in key)
+    return "" if key is None else str(key)
+
+
+def _stage_order(stage):
+    return (STAGES.index(stage) if stage in STAGES else len(STAGES), stage)
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
@@ -0,0 +1,70 @@
+# Value that closes a chunk in streaming mode. A chunk streamed as sentences
+# (idx, 0), (idx, 1), ... ends with a ((idx, n), CHUNK_END) item so the
+# reorder buffer knows the next key is (idx + 1, 0). A string rather than a
+# sentinel object so it survives pickling between processes.
+CHUNK_END = "<chunk-end>"
+
+
+def next_key(key, value):
+    """Return the key expected after (key, value)."""
+    if isinstance(key, tuple):
+        chunk, sentence = key
+        return (chunk + 1, 0) if value == CHUNK_END else (chunk, sentence + 1)
+    return key + 1
+
+
+def first_key(key):
+    """Return the first key of the sequence key belongs to."""
+    return (0, 0) if isinstance(key, tuple) else 0
+
+
+class ReorderBuffer:
+    """Release (key, value) items in key order as soon as every earlier key has arrived.
+
+    Keys are chunk indexes, or (chunk, sentence) pairs in streaming mode.
+    Failed chunks should still be pushed (with a value of None) so they
+    don't hold up the chunks after them. If a key never arrives, the buffer
+    stops waiting for it once more than max_pending later items are held.
+    """
+
+    def __init__(self, max_pending=256):
+        self.max_pending = max_pending
+        self.skipped = []
+        self._expected = None
+        self._pending = {}
+
+    def push(self, key, value):
+        """Add an item and return the list of items that are now in order."""
+        if self._expected is None:
+            self._expected = first_key(key)
+        if key < self._expected:
+            print(f"[Publisher] Warning: Chunk {key} arrived after it was skipped, dropping it")
+            return []
+        self._pending[key] = value
+        released = self._release()
+        if len(self._pending) > self.max_pending:
+            # Something upstream lost a chunk; stop waiting for it
+            self._skip_to(min(self._pending))
+            released += self._release()
+        return released
+
+    def flush(self):
+        """Release everything still held, skipping any keys that never arrived."""
+        released = []
+        while self._pending:
+            self._skip_to(min(self._pending))
+            released += self._release()
+        return released
+
+    def _skip_to(self, key):
+        print(f"[Publisher] Warning: Chunk {self._expected} never arrived, continuing from {key}")
+        self.skipped.append(self._expected)
+        self._expected = key
+
+    def _release(self):
+        released = []
+        while self._expected in self._pending:
+            value = self._pending.pop(self._expected)
+            released.append((self._expected, value))
+            self._expected = next_key(self._expected, value)
+        return released
@@ -0,0 +1,374 @@
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+import threading
+import time
+from queues import DEFAULT_QUEUE_SIZE, BoundedQueue, item_size
+
+EXECUTORS = ("inline", "thread", "process")
+
+# How long a cancelled pipeline waits for its stage threads to reach their
+# next queue call (which raises), so they stop before the caller cleans up
+CANCEL_GRACE_SECONDS = 3
+
+
+class PipelineError(Exception):
+    """A stage failed and the pipeline was cancelled; the stage's exception is the __cause__."""
+
+    def __init__(self, stage, key, error):
+        where = f" on {key}" if key is not None else ""
+        super().__init__(f"Stage {stage} failed{where}: {error}")
+        self.stage = stage
+        self.key = key
+
+
+class Channel:
+    """Asyncio end of a queues.BoundedQueue connecting two stages.
+
+    The BoundedQueue holds the items and does the admission (maxsize items
+    and the shared memory budget; an empty channel always accepts an item)
+    and high-water accounting; the channel waits on the event loop instead
+    of blocking a thread. Once closed and empty, get() returns None to
+    every consumer.
+    """
+
+    # Budget freed by another channel doesn't wake our producers, so they poll
+    POLL_SECONDS = BoundedQueue.POLL_SECONDS
+
+    def __init__(self, name, maxsize=0, budget=None):
+        self.name = name
+        self.queue = BoundedQueue(name, maxsize, budget)
+        self.closed = False
+        lock = asyncio.Lock()
+        self._not_empty = asyncio.Condition(lock)
+        self._not_full = asyncio.Condition(lock)
+
+    def qsize(self):
+        return self.queue.qsize()
+
+    async def put(self, item):
+        async with self._not_full:
+            if not self.queue.offer(item):
+                started = time.monotonic()
+                try:
+                    while not self.queue.offer(item):
+                        try:
+                            await asyncio.wait_for(self._not_full.wait(), self.POLL_SECONDS)
+                        except asyncio.TimeoutError:
+                            pass
+                finally:
+                    self.queue.blocked_seconds += time.monotonic() - started
+            self._not_empty.notify()
+
+    async def get(self):
+        """Return the next item, or None once the channel is closed and empty."""
+        async with self._not_empty:
+            while self.queue.empty():
+                if self.closed:
+                    return None
+                await self._not_empty.wait()
+            self._not_full.notify()
+            return self.queue.get_nowait()
+
+    async def close(self):
+        async with self._not_empty:
+            self.closed = True
+            self._not_empty.notify_all()
+
+    def stats(self):
+        return self.queue.stats()
+
+
+class _BlockingQueue:
+    """Thread-side end of a channel with the get/put of queue.Queue.
+
+    get() returns None once the channel is exhausted and put(None) closes
+    it, so code written around poison pills works unchanged. Both raise
+    asyncio.CancelledError once the pipeline is cancelled.
+    """
+
+    def __init__(self, channel, loop, cancelled):
+        self.channel = channel
+        self.name = channel.name
+        self._loop = loop
+        self._cancelled = cancelled
+
+    def _call(self, coro_function, *args):
+        if self._cancelled.is_set():
+            raise asyncio.CancelledError()
+        future = asyncio.run_coroutine_threadsafe(coro_function(*args), self._loop)
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except concurrent.futures.CancelledError:
+                raise asyncio.CancelledError()
+            except concurrent.futures.TimeoutError:
+                if self._cancelled.is_set():
+                    future.cancel()
+                    raise asyncio.CancelledError()
+
+    def get(self, block=True, timeout=None):
+        return self._call(self.channel.get)
+
+    def put(self, item, block=True, timeout=None):
+        if item is None:
+            self._call(self.channel.close)
+        else:
+            self._call(self.channel.put, item)
+
+    def qsize(self):
+        return self.channel.qsize()
+
+    def empty(self):
+        return self.channel.qsize() == 0
+
+
+class Stage:
+    """One step of a Pipeline, given either func or run.
+
+    func(item) is called once per item and returns the item to pass on,
+    None to drop it, or (with fan_out=True) a list of items. It runs on the
+    executor: "inline" on the event loop (coroutine functions are awaited,
+    so thousands of items can be in flight cheaply), "thread", "process"
+    (func and items must be picklable; initializer(*initargs) runs once in
+    each process, e.g. to load a model) or a concurrent.futures.Executor,
+    which may be shared with other pipelines and is not shut down. Up to
+    workers items are processed at once, so with more than one worker items
+    can leave out of order.
+
+    run(in_queue, out_queue) drives the stage itself on a thread of its own,
+    for stateful or pool-backed stages. in_queue.get() returns None when the
+    input is exhausted (in_queue is None for the first stage) and
+    out_queue.put(None) ends the output.
+
+    on_error(item, exc) returns a replacement for an item func failed on, or
+    None to drop it; without on_error the first failure cancels the pipeline.
+    queue_size bounds the stage's output channel, named output.
+    """
+
+    def __init__(self, name, func=None, run=None, executor="thread", workers=1,
+                 queue_size=DEFAULT_QUEUE_SIZE, output=None, fan_out=False, on_error=None,
+                 initializer=None, initargs=()):
+        if (func is None) == (run is None):
+            raise ValueError(f"Stage {name} needs exactly one of func or run")
+        if isinstance(executor, str) and executor not in EXECUTORS:
+            raise ValueError(f"Stage {name}: executor must be one of {EXECUTORS} or an Executor")
+        self.name = name
+        self.func = func
+        self.run = run
+        self.executor = executor
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.output = output or name
+        self.fan_out = fan_out
+        self.on_error = on_error
+        self.initializer = initializer
+        self.initargs = initargs
+
+
+def _call_list(func, item):
+    # Fan-out results are materialized where func runs, not on the event loop
+    result = func(item)
+    return None if result is None else list(result)
+
+
+def _key(item):
+    return item[0] if isinstance(item, tuple) and len(item) == 2 else None
+
+
+class Pipeline:
+    """Stages connected by bounded channels, run on one asyncio event loop.
+
+    Nothing is global, so several pipelines can run in one process, even
+    on one loop. With metrics, each per-item call is recorded under its
+    stage's name. A pipeline runs once.
+    """
+
+    def __init__(self, stages, budget=None, metrics=None):
+        self.stages = list(stages)
+        if not self.stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.budget = budget
+        self.metrics = metrics
+        # The channels between stages; the last stage's output is collected
+        self.channels = [Channel(stage.output, stage.queue_size, budget)
+                         for stage in self.stages[:-1]]
+        self._results = Channel(self.stages[-1].output)
+        self._cancelled = threading.Event()
+        self._threads = []
+        self._executors = []  # Executors created (and shut down) by this pipeline
+
+    def _executor_for(self, stage):
+        if stage.run is not None or stage.executor == "inline":
+            return None
+        if stage.executor == "thread":
+            executor = concurrent.futures.ThreadPoolExecutor(
+                stage.workers, thread_name_prefix=stage.name, initializer=stage.initializer,
+                initargs=stage.initargs)
+        elif stage.executor == "process":
+            executor = concurrent.futures.ProcessPoolExecutor(
+                stage.workers, initializer=stage.initializer, initargs=stage.initargs)
+        else:
+            return stage.executor
+        self._executors.append(executor)
+        return executor
+
+    async def _feed(self, source, channel):
+        """Put the items of a source iterable on the first stage's input."""
+        if hasattr(source, "__aiter__"):
+            async for item in source:
+                await channel.put(item)
+        else:
+            # A plain iterable may block (e.g. reading a file), so it is
+            # consumed on a thread
+            blocking = _BlockingQueue(channel, asyncio.get_running_loop(), self._cancelled)
+            await self._in_thread("source", lambda: [blocking.put(item) for item in source])
+        await channel.close()
+
+    async def _in_thread(self, name, target):
+        """Run target on a daemon thread, which a cancelled pipeline doesn't wait for."""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def settle(error):
+            if done.done():
+                return
+            if error is None:
+                done.set_result(None)
+            else:
+                done.set_exception(error)
+
+        def main():
+            error = None
+            try:
+                target()
+            except BaseException as e:
+                error = e
+            try:
+                loop.call_soon_threadsafe(settle, error)
+            except RuntimeError:
+                pass  # The loop has already gone
+
+        thread = threading.Thread(target=main, name=f"{name}-stage", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+        await done
+
+    async def _work(self, stage, executor, in_channel, out_channel):
+        loop = asyncio.get_running_loop()
+        func = functools.partial(_call_list, stage.func) if stage.fan_out else stage.func
+        while True:
+            item = await in_channel.get()
+            if item is None:
+                return
+            started = time.time()
+            failed = False
+            try:
+                if executor is None:
+                    result = func(item)
+                    if inspect.isawaitable(result):
+                        result = await result
+                else:
+                    result = await loop.run_in_executor(executor, func, item)
+            except Exception as e:
+                failed = True
+                if self.metrics is not None:
+                    self.metrics.count(stage.name, "failures")
+                if stage.on_error is None:
+                    raise PipelineError(stage.name, _key(item), e) from e
+                print(f"[Pipeline] Warning: {PipelineError(stage.name, _key(item), e)}")
+                result = stage.on_error(item, e)
+                if stage.fan_out and result is not None:
+                    result = [result]
+            if self.metrics is not None:
+                self.metrics.observe(stage.name, time.time() - started, _key(item),
+                                     item_size(item), started=started, failed=failed)
+            for out in (result or []) if stage.fan_out else [result]:
+                if out is not None:
+                    await out_channel.put(out)
+
+    async def _run_stage(self, stage, in_channel, out_channel):
+        loop = asyncio.get_running_loop()
+        if stage.run is not None:
+            in_queue = _BlockingQueue(in_channel, loop, self._cancelled) if in_channel else None
+            out_queue = _BlockingQueue(out_channel, loop, self._cancelled)
+            try:
+                await self._in_thread(stage.name, lambda: stage.run(in_queue, out_queue))
+            except Exception as e:
+                raise PipelineError(stage.name, None, e) from e
+        else:
+            executor = self._executor_for(stage)
+            await asyncio.gather(*(self._work(stage, executor, in_channel, out_channel)
+                                   for _ in range(stage.workers)))
+        # Input the stage left unread is discarded, so its producer can't
+        # stay blocked on a full channel
+        if in_channel is not None:
+            while await in_channel.get() is not None:
+                pass
+        # Only a stage that finished closes its output: after a failure or
+        # cancellation, downstream stages must not take it for the end of
+        # their input
+        await out_channel.close()
+
+    async def _collect(self, results):
+        while True:
+            item = await self._results.get()
+            if item is None:
+                return
+            results.append(item)
+
+    async def run(self, source=None):
+        """Run every stage to completion and return the items output by the last one.
+
+        source, an iterable or async iterable, feeds the first stage; a first
+        stage with run() produces its own input instead. A failed stage
+        cancels the others and raises PipelineError. Cancelling run() (e.g.
+        Ctrl-C under run_sync()) cancels every stage.
+        """
+        if source is None and self.stages[0].run is None:
+            raise ValueError(f"Stage {self.stages[0].name} needs a source to read from")
+        inputs = [None] + self.channels
+        tasks = []
+        if source is not None:
+            inputs[0] = Channel("source", self.stages[0].queue_size, self.budget)
+            tasks.append(asyncio.create_task(self._feed(source, inputs[0])))
+        outputs = self.channels + [self._results]
+        results = []
+        tasks += [asyncio.create_task(self._run_stage(stage, in_channel, out_channel))
+                  for stage, in_channel, out_channel in zip(self.stages, inputs, outputs)]
+        tasks.append(asyncio.create_task(self._collect(results)))
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        except BaseException:
+            self._cancelled.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for executor in self._executors:
+                executor.shutdown(wait=False, cancel_futures=True)
+            # Polled rather than joined, so other pipelines on the loop keep running
+            deadline = time.monotonic() + CANCEL_GRACE_SECONDS
+            while not self.stopped() and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            raise
+        for executor in self._executors:
+            executor.shutdown()
+        return results
+
+    def stopped(self):
+        """Return True once every stage thread has exited (always True for per-item stages)."""
+        return not any(thread.is_alive() for thread in self._threads)
+
+    def join(self, timeout=None):
+        """Wait up to timeout seconds in all for the stage threads to exit; return stopped()."""
+        deadline = None if timeout is None else time.time() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.time()))
+        return self.stopped()
+
+    def run_sync(self, source=None):
+        """Run the pipeline on a new event loop. Ctrl-C cancels it and raises KeyboardInterrupt."""
+        return asyncio.run(self.run(source))
@@ -0,0 +1,642 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from agents import PDFProcessingAgent, PublishingAgent, TextSummarizationAgent, TTSAgent
+from audio import StreamingConcat, load_chunk_header
+from boilerplate import BoilerplateFilter, NearDuplicateIndex, removal_report
+from broker import BrokerSummarizer, BrokerTTS
+from chunking import TextChunker
+from manifest import file_hash
+from mapreduce import reduce_summaries
+from metrics import Metrics
+from ordering import CHUNK_END, ReorderBuffer
+from pipeline import Pipeline, Stage
+from queues import DEFAULT_MEMORY_BUDGET_BYTES, DEFAULT_QUEUE_SIZE, BoundedQueue, MemoryBudget
+from workers import SummarizerPool, TTSPool, chunk_name, synthesize_chunk
+
+
+def _print_cache_stats(stats):
+    lookups = stats["hits"] + stats["misses"]
+    if lookups:
+        print(f"[Summarizer] Cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({100 * stats['hits'] / lookups:.0f}% hit rate)")
+
+
+class _SummaryRecorder:
+    """Stands in for a summary queue and records each finished summary in the job manifest."""
+
+    def __init__(self, manifest, out_queue, stream=False):
+        self.manifest = manifest
+        self.out_queue = out_queue
+        self.stream = stream
+        self._sentences = {}
+
+    def put(self, item):
+        key, text = item
+        marker = TextSummarizationAgent.TRUNCATION_MARKER
+        if self.stream:
+            idx, _ = key
+            if text is None:
+                sentences = self._sentences.pop(idx, [])
+                if sentences and not sentences[-1].endswith(marker):
+                    self.manifest.record_summary(idx, sentences)
+            else:
+                self._sentences.setdefault(idx, []).append(text)
+        elif text and not text.endswith(marker):
+            # Truncation fallbacks are not recorded, so a resumed run retries them
+            self.manifest.record_summary(key, text)
+        self.out_queue.put(item)
+
+
+def _skip_summarized(manifest, in_queue, out_queue, stream=False):
+    """Forward summaries already in the job manifest and return a queue of chunks still to summarize."""
+    pending = BoundedQueue("pending text", DEFAULT_QUEUE_SIZE)
+
+    def forward():
+        resumed = 0
+        try:
+            while True:
+                item = in_queue.get()
+                if item is None:
+                    break
+                idx, chunk = item
+                summary = manifest.summary_for(idx, chunk)
+                if summary is None:
+                    pending.put(item)
+                    continue
+                resumed += 1
+                if stream:
+                    for n, sentence in enumerate(summary):
+                        out_queue.put(((idx, n), sentence))
+                    out_queue.put(((idx, len(summary)), None))
+                else:
+                    out_queue.put((idx, summary))
+        finally:
+            if resumed:
+                print(f"[Summarizer] Resumed {resumed} summaries from the job manifest")
+            pending.put(None)
+
+    threading.Thread(target=forward, daemon=True).start()
+    return pending
+
+
+def _drain(in_queue):
+    """Discard items up to the poison pill so the producer isn't blocked on a bounded queue."""
+    while in_queue.get() is not None:
+        pass
+
+
+class _AudioRecorder:
+    """Stands in for the audio queue and records each synthesized chunk in the job manifest."""
+
+    def __init__(self, manifest, out_queue):
+        self.manifest = manifest
+        self.out_queue = out_queue
+        self.texts = {}  # idx -> text of chunks sent to TTS
+
+    def put(self, item):
+        idx, audio_path = item
+        text = self.texts.pop(idx, None)
+        if audio_path and audio_path != CHUNK_END and text is not None:
+            self.manifest.record_audio(chunk_name(idx), text, audio_path)
+        self.out_queue.put(item)
+
+
+def _skip_synthesized(manifest, in_queue, out_queue, recorder):
+    """Forward audio already in the job manifest and return a queue of summaries still to synthesize."""
+    pending = BoundedQueue("pending summaries", DEFAULT_QUEUE_SIZE)
+
+    def forward():
+        resumed = 0
+        try:
+            while True:
+                item = in_queue.get()
+                if item is None:
+                    break
+                idx, text = item
+                if text is not None:
+                    audio_path = manifest.audio_for(chunk_name(idx), text)
+                    if audio_path is not None:
+                        resumed += 1
+                        out_queue.put((idx, audio_path))
+                        continue
+                    recorder.texts[idx] = text
+                pending.put(item)
+        finally:
+            if resumed:
+                print(f"[TTS] Resumed {resumed} audio chunks from the job manifest")
+            pending.put(None)
+
+    threading.Thread(target=forward, daemon=True).start()
+    return pending
+
+
+def check_job_options(chunk_tokens=None, target_chars=None, stream=False, segments=False,
+                      broker=None):
+    """Raise ValueError if PodcastJob options are invalid or can't be combined."""
+    for name, value in (("chunk_tokens", chunk_tokens), ("target_chars", target_chars)):
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value <= 0):
+            raise ValueError(f"{name} must be a positive integer, not {value!r}")
+    for name, value in (("stream", stream), ("segments", segments)):
+        if not isinstance(value, bool):
+            raise ValueError(f"{name} must be true or false, not {value!r}")
+    if stream and target_chars:
+        raise ValueError("stream cannot be combined with a target length")
+    if stream and broker:
+        raise ValueError("stream cannot be combined with a broker")
+
+
+class PodcastJob:
+    """Turn one PDF into a podcast: extract -> summarize -> TTS -> merge.
+
+    Everything a run needs (agents, caches, manifest, metrics, options) is
+    held by the job rather than in module globals, so several jobs can run
+    in one process. The stages run on a pipeline.Pipeline; the agents and
+    worker pools plug in as its blocking stages.
+    """
+
+    def __init__(self, pdf_path, output_dir="output", output_file="podcast.mp3", summarizer=None,
+                 tts_agent=None, pdf_agent=None, publisher=None, audio_cache=None, manifest=None,
+                 metrics=None, chunk_tokens=None, extract_workers=1, summarize_workers=1,
+                 target_chars=None, stream=False, tts_workers=1, tts_timeout=300,
+                 text_queue_size=DEFAULT_QUEUE_SIZE, summary_queue_size=DEFAULT_QUEUE_SIZE,
+                 audio_queue_size=DEFAULT_QUEUE_SIZE, memory_budget_bytes=DEFAULT_MEMORY_BUDGET_BYTES,
+                 strip_boilerplate=True, segments=False, broker=None, title="Generated Podcast"):
+        self.pdf_path = pdf_path
+        self.output_dir = output_dir
+        self.output_file = output_file
+        # Agents are cheap to build: the model and TTS engine load on first use
+        self.summarizer = summarizer or TextSummarizationAgent()
+        self.tts_agent = tts_agent or TTSAgent()
+        self.pdf_agent = pdf_agent or PDFProcessingAgent()
+        self.publisher = publisher or PublishingAgent()
+        self.audio_cache = audio_cache
+        # Checkpoint journal of the job, so an interrupted run can resume
+        self.manifest = manifest
+        # Per-stage latency, throughput, queue depth, cache and failure metrics
+        self.metrics = metrics or Metrics()
+        self.chunk_tokens = chunk_tokens
+        self.extract_workers = extract_workers
+        self.summarize_workers = summarize_workers
+        self.target_chars = target_chars
+        self.stream = stream
+        self.tts_workers = tts_workers
+        self.tts_timeout = tts_timeout
+        # A TaskBroker sends summarize and TTS work to workers on other
+        # machines instead of the local models and pools
+        self.broker = broker
+        # Drop running headers, footers, page numbers and near-duplicate chunks
+        # before they reach the LLM and TTS
+        self.strip_boilerplate = strip_boilerplate
+        # The queues between stages are bounded, so a fast stage blocks
+        # instead of piling work up in memory ahead of a slow one
+        self.queue_sizes = (text_queue_size, summary_queue_size, audio_queue_size)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.output_path = os.path.join(output_dir, output_file)
+        # How the merged podcast is encoded and tagged
+        self.bitrate = "192k"
+        self.tags = {"title": title, "artist": "PDF to Podcast"}
+        # With segments, the publisher also grows an HLS playlist as chunks are
+        # merged, so listening can start long before the podcast is finished
+        self.segment_dir = (os.path.join(output_dir, f"{os.path.splitext(output_file)[0]}_segments")
+                            if segments else None)
+
+    def make_chunker(self):
+        """Build a chunker sized to the summarizer's context unless a budget is given."""
+        return TextChunker(max_tokens=self.chunk_tokens or self.summarizer.input_token_budget(),
+                           count_tokens=self.summarizer.count_tokens)
+
+    def _pages(self):
+        if self.extract_workers > 1:
+            return self.pdf_agent.iter_pages_parallel(self.pdf_path, workers=self.extract_workers)
+        return self.pdf_agent.iter_pages(self.pdf_path)
+
+    def _cleaners(self):
+        """Return the boilerplate filter and near-duplicate index for one pass, or Nones."""
+        if not self.strip_boilerplate:
+            return None, None
+        return BoilerplateFilter(), NearDuplicateIndex()
+
+    def plan_chunks(self):
+        """Chunk the PDF without summarizing it and report the expected number of LLM calls."""
+        chunker = self.make_chunker()
+        boilerplate, duplicates = self._cleaners()
+        pages = self._pages()
+        if boilerplate is not None:
+            pages = boilerplate.filter(pages)
+
+        chunks = []
+        total_chars = 0
+        for _, page_text in pages:
+            total_chars += len(page_text) + 1
+            chunks.extend(chunker.feed(page_text + "\n"))
+        chunks.extend(chunker.flush())
+        if duplicates is not None:
+            chunks = [chunk for key, chunk in enumerate(chunks) if duplicates.add(key, chunk) is None]
+            print(f"[PDF] Boilerplate: {removal_report(boilerplate, duplicates)}")
+        chunk_count = len(chunks)
+
+        print(f"[PDF] {total_chars} characters -> {chunk_count} chunks of up to "
+              f"{chunker.max_tokens} tokens")
+        print(f"[PDF] Expected LLM calls: {chunk_count} "
+              f"(fixed 1000-character slicing would need {-(-total_chars // 1000)})")
+        return chunk_count
+
+    def extract(self, in_queue, out_queue):
+        manifest = self.manifest
+        metrics = self.metrics
+        if manifest is not None and manifest.stage_detail("extract") is not None:
+            chunks = manifest.chunks()
+            if chunks is not None:
+                print(f"[PDF] Resuming: {len(chunks)} chunks from the job manifest, skipping extraction")
+                try:
+                    for item in chunks:
+                        out_queue.put(item)
+                finally:
+                    out_queue.put(None)
+                return
+
+        print("[PDF] Extracting text...")
+        # Pages are streamed out of the PDF agent and chunks are queued as soon as
+        # the chunker completes them, so only the unsent tail is held in memory.
+        chunker = self.make_chunker()
+        print(f"[PDF] Packing sentences into chunks of up to {chunker.max_tokens} tokens")
+        chunk_count = 0
+        page_count = 0
+        if self.extract_workers > 1:
+            print(f"[PDF] Using {self.extract_workers} extraction processes")
+        pages = self._pages()
+        boilerplate, duplicates = self._cleaners()
+        if boilerplate is not None:
+            pages = boilerplate.filter(pages)
+        ready = time.time()
+
+        def queue_chunk(chunk, page_number=None):
+            nonlocal chunk_count, ready
+            # A chunk that nearly repeats an earlier one is summarized only once
+            if duplicates is not None:
+                original = duplicates.add(chunk_count, chunk)
+                if original is not None:
+                    print(f"[PDF] Skipping chunk: near-duplicate of chunk {original}")
+                    metrics.count("extract", "duplicate_chunks")
+                    return
+            if page_number is not None:
+                print(f"[PDF] Queued chunk {chunk_count} (page {page_number})")
+            # A chunk's extraction time runs from the previous chunk being queued,
+            # so time spent blocked on a full queue is not counted
+            metrics.observe("extract", time.time() - ready, chunk_count, len(chunk), started=ready)
+            if manifest is not None:
+                manifest.record_chunk(chunk_count, chunk)
+            out_queue.put((chunk_count, chunk))
+            chunk_count += 1
+            ready = time.time()
+
+        try:
+            # A quick pass that only chunks the text, so the LLM work ahead is
+            # known before the first chunk reaches the summarizer
+            self.plan_chunks()
+            for page_number, page_text in pages:
+                page_count += 1
+                for chunk in chunker.feed(page_text + "\n"):
+                    queue_chunk(chunk, page_number)
+
+            for chunk in chunker.flush():
+                queue_chunk(chunk)
+
+            if boilerplate is not None:
+                print(f"[PDF] Boilerplate: {removal_report(boilerplate, duplicates)}")
+                metrics.count("extract", "boilerplate_chars",
+                              boilerplate.chars_removed + duplicates.duplicate_chars)
+
+            if page_count == 0:
+                print("[PDF] Error: No text could be extracted from the PDF")
+            elif chunk_count == 0:
+                print("[PDF] Error: No valid text chunks could be created")
+            else:
+                print(f"[PDF] Extracted {chunk_count} text chunks from {page_count} pages")
+                if manifest is not None:
+                    manifest.complete_stage("extract", {"chunks": chunk_count, "pages": page_count})
+
+        except Exception as e:
+            print(f"[PDF] Error: {str(e)}")
+            metrics.count("extract", "failures")
+        finally:
+            out_queue.put(None)  # Poison pill; always sent so we don't deadlock
+
+    def _summarize_serial(self, in_queue, out_queue):
+        summarizer = self.summarizer
+        while True:
+            item = in_queue.get()
+            if item is None:
+                break
+            idx, chunk = item
+            print(f"[Summarizer] Processing chunk of {len(chunk)} characters")
+            if self.stream:
+                # Hand each sentence to TTS as soon as the model finishes it
+                n = 0
+                with self.metrics.timer("summarize", idx) as timer:
+                    timer.chars = len(chunk)
+                    for n, sentence in enumerate(summarizer.summarize_stream(chunk), start=1):
+                        out_queue.put(((idx, n - 1), sentence))
+                out_queue.put(((idx, n), None))  # End of this chunk's sentences
+                print(f"[Summarizer] Processed chunk {idx}")
+                continue
+            with self.metrics.timer("summarize", idx) as timer:
+                timer.chars = len(chunk)
+                summary = summarizer.summarize(chunk)  # Fixed method name
+            print(f"[Summarizer] Generated summary of {len(summary)} characters")
+            out_queue.put((idx, summary))
+            print(f"[Summarizer] Processed chunk {idx}")
+
+    def summarize(self, text_queue, summary_queue):
+        summarizer = self.summarizer
+        metrics = self.metrics
+        cache = summarizer.cache
+        pool = None
+        # Map-reduce needs every chunk summary before it can reduce, so collect
+        # them locally instead of streaming them straight to TTS
+        out_queue = queue.Queue() if self.target_chars else summary_queue
+        in_queue = text_queue
+        produced = out_queue
+        if self.manifest is not None:
+            in_queue = _skip_summarized(self.manifest, text_queue, out_queue, self.stream)
+            produced = _SummaryRecorder(self.manifest, out_queue, self.stream)
+        try:
+            if self.broker is not None:
+                pool = BrokerSummarizer(self.broker, summarizer, metrics)
+                pool.start()
+                pool.run(in_queue, produced)
+            elif self.summarize_workers > 1:
+                pool = SummarizerPool(self.summarize_workers, model_name=summarizer.model_name,
+                                      max_tokens=summarizer.max_tokens,
+                                      cache_path=cache.path if cache else None,
+                                      cache_bytes=cache.max_bytes if cache else None,
+                                      metrics=metrics, model_factory=summarizer.model_factory)
+                pool.start()
+                pool.run(in_queue, produced, stream=self.stream)
+            else:
+                self._summarize_serial(in_queue, produced)
+
+            if self.target_chars:
+                summaries = []
+                while not out_queue.empty():
+                    summaries.append(out_queue.get())
+                summaries = [summary for _, summary in sorted(summaries)]
+
+                def reduce_many(texts):
+                    template = summarizer.REDUCE_PROMPT_TEMPLATE
+                    if pool is None:
+                        return [summarizer.summarize(text, template) for text in texts]
+                    # Every group comes back: one whose worker died is retried on
+                    # another, or truncated as a failing model would do
+                    reduced = dict(pool.map(enumerate(texts), template))
+                    return [reduced[i] for i in range(len(texts))]
+
+                summaries = reduce_summaries(summaries, reduce_many, self.target_chars,
+                                             max_tokens=summarizer.input_token_budget(),
+                                             count_tokens=summarizer.count_tokens)
+                for idx, summary in enumerate(summaries):
+                    summary_queue.put((idx, summary))
+        except Exception as e:
+            print(f"[Summarizer] Error: {str(e)}")
+            metrics.count("summarize", "failures")
+        finally:
+            if pool is not None:
+                pool.stop()
+                _print_cache_stats(pool.cache_stats)
+                metrics.record_cache("summarize", pool.cache_stats)
+            elif cache:
+                _print_cache_stats(cache.stats())
+                metrics.record_cache("summarize", cache.stats())
+            summary_queue.put(None)  # Pass poison pill forward
+
+    def tts(self, summary_queue, audio_queue):
+        print("\n[TTS] Starting text-to-speech processing...")
+        tts_agent = self.tts_agent
+        metrics = self.metrics
+        cache = self.audio_cache
+
+        if self.broker is None and (not hasattr(tts_agent, 'engine') or tts_agent.engine is None):
+            # Unread summaries are discarded by the pipeline
+            print("[!] WARNING: TTS engine not available. Audio will not be generated.")
+            audio_queue.put(None)  # Signal end of processing
+            return
+
+        processed = 0
+        failed = 0
+        pool = None
+        in_queue = summary_queue
+        out_queue = audio_queue
+        if self.manifest is not None:
+            out_queue = _AudioRecorder(self.manifest, audio_queue)
+            in_queue = _skip_synthesized(self.manifest, summary_queue, audio_queue, out_queue)
+
+        try:
+            if self.broker is not None:
+                pool = BrokerTTS(self.broker, tts_agent, self.output_dir, metrics)
+                pool.start()
+                processed, failed = pool.run(in_queue, out_queue)
+            elif self.tts_workers > 1:
+                pool = TTSPool(self.tts_workers, self.output_dir, task_timeout=self.tts_timeout,
+                               cache_dir=cache.directory if cache else None,
+                               cache_bytes=cache.max_bytes if cache else None, metrics=metrics,
+                               engine_factory=tts_agent.engine_factory)
+                if pool.start() == 0:
+                    print("[!] WARNING: No TTS worker could start an engine. Audio will not be generated.")
+                    _drain(in_queue)
+                    return
+                processed, failed = pool.run(in_queue, out_queue)
+                if pool.restarts:
+                    print(f"[TTS] Restarted {pool.restarts} wedged worker(s)")
+            else:
+                while True:
+                    item = in_queue.get()
+                    if item is None:  # End of processing signal
+                        break
+
+                    idx, summary = item
+                    if summary is None:
+                        out_queue.put((idx, CHUNK_END))  # Streamed chunk is complete
+                        continue
+                    if not summary.strip():
+                        print(f"[TTS] Warning: Empty text for chunk {idx}")
+                        out_queue.put((idx, None))
+                        failed += 1
+                        metrics.count("tts", "failures")
+                        continue
+
+                    # Failures are forwarded too, so the publisher doesn't wait for them
+                    with metrics.timer("tts", idx) as timer:
+                        timer.chars = len(summary)
+                        audio_path = synthesize_chunk(tts_agent, idx, summary, self.output_dir, cache)
+                        header = load_chunk_header(audio_path) if audio_path else None
+                        timer.audio_seconds = header["duration_ms"] / 1000 if header else 0.0
+                        timer.failed = audio_path is None
+                    out_queue.put((idx, audio_path))
+                    if audio_path:
+                        processed += 1
+                    else:
+                        failed += 1
+                        metrics.count("tts", "failures")
+
+            print(f"\n[TTS] Completed: {processed} chunks processed, {failed} failed")
+            stats = pool.cache_stats if pool is not None else cache.stats() if cache else None
+            metrics.record_cache("tts", stats)
+            if stats and stats["hits"] + stats["misses"]:
+                print(f"[TTS] Audio cache: {stats['hits']} hits, {stats['misses']} misses")
+
+        except Exception as e:
+            print(f"[TTS] Fatal error in TTS processing: {str(e)}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            if pool is not None:
+                pool.stop()
+            # Ensure we always signal the end of processing
+            audio_queue.put(None)
+
+    def merge(self, audio_queue, out_queue, max_pending=256):
+        """Append audio chunks to the podcast in order; puts the podcast's path on out_queue."""
+        print("\n[Publisher] Starting audio processing...")
+        manifest = self.manifest
+        metrics = self.metrics
+
+        # Create output directory if it doesn't exist
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        # Chunks are appended to a temporary file as soon as every earlier chunk
+        # has arrived; out-of-order chunks wait in a bounded reorder buffer
+        temp_output = os.path.join(self.output_dir, f"temp_{os.urandom(8).hex()}.mp3")
+        final_path = self.output_path
+        reorder = ReorderBuffer(max_pending)
+        merger = StreamingConcat(temp_output, bitrate=self.bitrate, tags=self.tags,
+                                 segment_dir=self.segment_dir)
+        received = 0
+        failed = 0
+        if manifest is not None:
+            manifest.reset_merged()  # The podcast is always rebuilt from the first chunk
+
+        published = 0
+
+        def publish_segments():
+            nonlocal published
+            for segment_path, seconds in merger.new_segments():
+                if published == 0:
+                    print(f"[Publisher] Streaming: {os.path.abspath(merger.playlist_path)} is playable")
+                    metrics.count("merge", "first_segment_seconds", time.time() - metrics.started)
+                self.publisher.publish(segment_path, playlist=merger.playlist_path, seconds=seconds)
+                metrics.count("merge", "segments")
+                published += 1
+
+        def append(released):
+            nonlocal failed
+            for idx, audio_path in released:
+                if audio_path == CHUNK_END:
+                    continue
+                if audio_path is None:
+                    print(f"[Publisher] Skipping failed chunk {idx}")
+                    failed += 1
+                    continue
+                # Chunks were validated when they were synthesized, so only
+                # check that the file is still there; nothing is decoded here
+                if not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
+                    print(f"  - Error: Chunk {idx} file is missing or empty: {audio_path}")
+                    failed += 1
+                    metrics.count("merge", "failures")
+                    continue
+                with metrics.timer("merge", idx) as timer:
+                    merger.append(audio_path)
+                    header = load_chunk_header(audio_path)
+                    timer.audio_seconds = header["duration_ms"] / 1000 if header else 0.0
+                if manifest is not None:
+                    manifest.mark_merged(chunk_name(idx))
+                print(f"[Publisher] Appended chunk {idx} ({merger.chunks} so far)")
+                publish_segments()
+
+        try:
+            while True:
+                item = audio_queue.get()
+                if item is None:  # End of queue marker
+                    break
+                if item[1] != CHUNK_END:
+                    received += 1
+                append(reorder.push(*item))
+            append(reorder.flush())
+
+            # Check if we have any chunks to merge
+            if merger.chunks == 0:
+                merger.abort()
+                if received == 0:
+                    print("[Publisher] No audio chunks to process")
+                else:
+                    print("\n❌ No valid audio chunks found to merge.")
+                    print("Please check if the TTS engine is working correctly.")
+                return
+
+            print(f"\n[Publisher] Finalizing {merger.chunks}/{received} audio chunks "
+                  f"({failed} failed, {len(reorder.skipped)} never arrived)...")
+            finalize_started = time.time()
+            duration_sec = merger.close()
+            metrics.count("merge", "finalize_seconds", time.time() - finalize_started)
+            publish_segments()
+            if published:
+                print(f"[Publisher] Published {published} segments to "
+                      f"{os.path.abspath(merger.playlist_path)}")
+
+            # Verify the output file
+            if os.path.exists(temp_output) and os.path.getsize(temp_output) > 0:
+                # Replace any existing output file
+                os.replace(temp_output, final_path)
+                self.publisher.publish(final_path)
+                if manifest is not None and failed == 0 and not reorder.skipped:
+                    manifest.complete_stage("merge", {"path": os.path.abspath(final_path),
+                                                      "hash": file_hash(final_path)})
+                out_queue.put(final_path)
+
+                # Get final stats
+                size_mb = os.path.getsize(final_path) / (1024 * 1024)
+
+                print("\n" + "=" * 50)
+                print("✅ Podcast generation completed successfully!")
+                print(f"   Output file: {os.path.abspath(final_path)}")
+                print(f"   Duration: {duration_sec:.1f} seconds")
+                print(f"   File size: {size_mb:.2f} MB")
+                print("=" * 50)
+            else:
+                print("\n❌ Failed to generate output file")
+
+        except asyncio.CancelledError:
+            merger.abort()
+            print("\n[Publisher] Cancelled, podcast not written")
+            raise
+        except Exception as e:
+            merger.abort()
+            print(f"\n❌ Error during audio merging: {str(e)}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            # Clean up temporary file if it exists
+            if os.path.exists(temp_output):
+                try:
+                    os.remove(temp_output)
+                except:
+                    pass
+            out_queue.put(None)
+
+    def pipeline(self):
+        """Build the job's Pipeline; its channels are the text, summary and audio queues."""
+        text_size, summary_size, audio_size = self.queue_sizes
+        budget = MemoryBudget(self.memory_budget_bytes) if self.memory_budget_bytes else None
+        return Pipeline([
+            Stage("extract", run=self.extract, output="text", queue_size=text_size),
+            Stage("summarize", run=self.summarize, output="summary", queue_size=summary_size),
+            Stage("tts", run=self.tts, output="audio", queue_size=audio_size),
+            Stage("merge", run=self.merge, output="podcast"),
+        ], budget=budget, metrics=self.metrics)
+
+    def run(self, pipeline=None):
+        """Run the job to completion and return the podcast's path, or None if none was written."""
+        paths = (pipeline or self.pipeline()).run_sync()
+        return paths[0] if paths else None
@@ -0,0 +1,129 @@
+import collections
+import queue
+import threading
+import time
+
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_MEMORY_BUDGET_BYTES = 64 * 1024 * 1024
+
+
+def item_size(item):
+    """Approximate the memory held by a queue item from the text it carries."""
+    if isinstance(item, str):
+        return len(item)
+    if isinstance(item, (tuple, list)):
+        return sum(item_size(part) for part in item)
+    return 0
+
+
+class MemoryBudget:
+    """A byte budget shared by several queues."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.high_water = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, size, force=False):
+        """Reserve size bytes and return True, or return False if they don't fit."""
+        with self._lock:
+            if not force and self.used + size > self.max_bytes:
+                return False
+            self.used += size
+            self.high_water = max(self.high_water, self.used)
+            return True
+
+    def release(self, size):
+        with self._lock:
+            self.used -= size
+
+
+class BoundedQueue(queue.Queue):
+    """A queue that blocks producers when it is full or the memory budget is spent.
+
+    An empty queue always accepts an item, so a stage can't be starved by
+    the items waiting in front of other stages. None (the poison pill) is
+    never blocked, so shutdown can't deadlock. The largest number of items
+    and bytes held at once are kept as high-water marks.
+    """
+
+    # Budget freed by another queue doesn't wake our producers, so they poll
+    POLL_SECONDS = 0.1
+
+    def __init__(self, name, maxsize=0, budget=None):
+        super().__init__()  # Bounds are enforced in put()
+        self.name = name
+        self.limit = maxsize
+        self.budget = budget
+        self.bytes = 0
+        self.high_water = 0
+        self.high_water_bytes = 0
+        self.blocked_seconds = 0.0
+        self._sizes = collections.deque()
+
+    def _admit(self, size):
+        if self.limit and self._qsize() >= self.limit:
+            return False
+        if self.budget is None:
+            return True
+        return self.budget.reserve(size, force=self._qsize() == 0)
+
+    def put(self, item, block=True, timeout=None):
+        size = item_size(item) if item is not None else 0
+        with self.not_full:
+            if item is not None and not self._admit(size):
+                if not block:
+                    raise queue.Full
+                started = time.monotonic()
+                deadline = None if timeout is None else started + timeout
+                while not self._admit(size):
+                    wait = self.POLL_SECONDS
+                    if deadline is not None:
+                        wait = min(wait, deadline - time.monotonic())
+                        if wait <= 0:
+                            self.blocked_seconds += time.monotonic() - started
+                            raise queue.Full
+                    self.not_full.wait(wait)
+                self.blocked_seconds += time.monotonic() - started
+            self._put(item)
+            self._sizes.append(size)
+            self.bytes += size
+            self.high_water = max(self.high_water, self._qsize())
+            self.high_water_bytes = max(self.high_water_bytes, self.bytes)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def offer(self, item):
+        """Put item and return True if it is admitted right away, else return False."""
+        try:
+            self.put(item, block=False)
+        except queue.Full:
+            return False
+        return True
+
+    def _get(self):
+        size = self._sizes.popleft()
+        self.bytes -= size
+        if self.budget is not None and size:
+            self.budget.release(size)
+        return super()._get()
+
+    def stats(self):
+        return {"limit": self.limit, "high_water": self.high_water,
+                "high_water_bytes": self.high_water_bytes,
+                "blocked_seconds": round(self.blocked_seconds, 3)}
+
+
+def print_queue_stats(queues, budget=None):
+    """Report each queue's high-water marks and how long its producers were blocked."""
+    print("[Pipeline] Queue high-water marks:")
+    for q in queues:
+        stats = q.stats()
+        limit = stats["limit"] or "unbounded"
+        print(f"  - {q.name}: {stats['high_water']}/{limit} items, "
+              f"{stats['high_water_bytes'] / 1024:.1f} KB, "
+              f"producer blocked {stats['blocked_seconds']:.1f}s")
+    if budget is not None:
+        print(f"  - memory budget: peak {budget.high_water / 1024:.1f} KB "
+              f"of {budget.max_bytes / 1024:.0f} KB")
@@ -0,0 +1,550 @@
+"""Long-running podcast service: warm agents and a local job queue behind an HTTP API.
+
+Usage:
+    python service.py serve [--port 8750] [--slots 2] [--max-queued 16] [--fake]
+    python service.py submit book.pdf [--follow] [--upload]
+
+API (JSON over HTTP, bound to localhost):
+    POST   /jobs              {"pdf_path": ...} or a PDF as the request body -> 202 {"id": ...}
+    GET    /jobs              every job's status
+    GET    /jobs/<id>         one job's status
+    GET    /jobs/<id>/events  progress as newline-delimited JSON, streamed until the job ends
+    GET    /jobs/<id>/result  the podcast MP3
+    GET    /jobs/<id>/segments/playlist.m3u8
+                              HLS playlist of a job with the segments option,
+                              playable while the job runs
+    DELETE /jobs/<id>         cancel a queued or running job
+    GET    /health            slots and queue depth
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from agents import TextSummarizationAgent, TTSAgent
+from audio import PLAYLIST_NAME
+from cache import AudioCache, SummaryCache
+from metrics import Metrics
+from podcast import PodcastJob, check_job_options
+
+DEFAULT_PORT = 8750
+DEFAULT_SLOTS = 2
+DEFAULT_MAX_QUEUED = 16
+MAX_UPLOAD_BYTES = 256 * 1024 * 1024
+# Per-job options a client may set; everything else is the service's
+JOB_OPTIONS = ("chunk_tokens", "target_chars", "stream", "segments")
+FINISHED = ("done", "failed", "cancelled")
+# How long a cancelled or failed job's stage threads get to exit before its slot is replaced
+SLOT_RELEASE_SECONDS = 5
+# Files of a job's segments directory that may be served, with their content types
+_SEGMENT_FILE = re.compile(r"^(playlist\.m3u8|segment_\d+\.ts)$")
+_CONTENT_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t", ".mp3": "audio/mpeg"}
+
+
+class ServiceFull(Exception):
+    """The job queue is at its admission limit."""
+
+
+class ServiceJob:
+    """A submitted job: its state and the progress events streamed to clients."""
+
+    def __init__(self, job_id, pdf_path, directory, options):
+        self.id = job_id
+        self.pdf_path = pdf_path
+        self.directory = directory
+        self.options = options
+        self.state = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.segment_dir = None
+        self.error = None
+        self.progress = {}
+        self.events = []
+        self.task = None
+        self._changed = threading.Condition()
+
+    def emit(self, event, **fields):
+        with self._changed:
+            self.events.append(dict(fields, event=event, job=self.id,
+                                    seconds=round(time.time() - self.created, 3)))
+            self._changed.notify_all()
+
+    def set_state(self, state, **fields):
+        if state == "running":
+            self.started = time.time()
+        elif state in FINISHED:
+            self.finished = time.time()
+        self.state = state
+        self.emit(state, **fields)
+
+    def wait_events(self, cursor, timeout=15):
+        """Return the events after cursor, waiting up to timeout for one to arrive."""
+        with self._changed:
+            if len(self.events) <= cursor and self.state not in FINISHED:
+                self._changed.wait(timeout)
+            return self.events[cursor:]
+
+    def status(self):
+        return {"id": self.id, "pdf_path": self.pdf_path, "state": self.state,
+                "options": self.options, "progress": self.progress, "error": self.error,
+                "result": f"/jobs/{self.id}/result" if self.result else None,
+                "playlist": self.playlist(),
+                "created": self.created,
+                "queued_seconds": round((self.started or time.time()) - self.created, 3),
+                "run_seconds": round((self.finished or time.time()) - self.started, 3)
+                if self.started else None}
+
+    def playlist(self):
+        """The URL path of the job's HLS playlist, once it has a segment to play."""
+        if self.segment_dir and os.path.exists(os.path.join(self.segment_dir, PLAYLIST_NAME)):
+            return f"/jobs/{self.id}/segments/{PLAYLIST_NAME}"
+        return None
+
+
+class _AgentSlot:
+    """One warm summarizer and TTS agent, used by one running job at a time."""
+
+    def __init__(self, slot_id, summary_cache, model_factory=None, engine_factory=None):
+        self.id = slot_id
+        self.summarizer = TextSummarizationAgent(cache=summary_cache, model_factory=model_factory)
+        self.tts_agent = TTSAgent(engine_factory=engine_factory)
+
+    def warm_up(self):
+        self.summarizer.warm_up()
+        if self.tts_agent.engine is None:
+            print(f"[Service] Warning: Slot {self.id} has no TTS engine")
+
+
+class PodcastService:
+    """Runs podcast jobs on warm agents.
+
+    Each of the slots holds a loaded model and TTS engine, so jobs skip the
+    startup cost; at most slots jobs run at once and up to max_queued more
+    wait their turn. Every job's pipeline runs on the service's event loop.
+    """
+
+    def __init__(self, output_dir=os.path.join("output", "service"), slots=DEFAULT_SLOTS,
+                 max_queued=DEFAULT_MAX_QUEUED, cache_dir=os.path.join("output", "cache"),
+                 model_factory=None, engine_factory=None, progress_interval=0.5):
+        self.output_dir = output_dir
+        self.slots = max(1, slots)
+        self.max_queued = max_queued
+        self.model_factory = model_factory
+        self.engine_factory = engine_factory
+        self.progress_interval = progress_interval
+        self.summary_cache = SummaryCache(os.path.join(cache_dir, "summaries.db")) if cache_dir else None
+        self.audio_cache = AudioCache(os.path.join(cache_dir, "audio")) if cache_dir else None
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = None
+        # Free slots; waiting jobs get them in submission order. The queue
+        # belongs to the event loop, so other threads read the count instead
+        self._free = asyncio.Queue()
+        self._free_count = 0
+        self._slot_count = 0
+
+    def _new_slot(self):
+        with self._lock:
+            slot_id = self._slot_count
+            self._slot_count += 1
+        slot = _AgentSlot(slot_id, self.summary_cache, self.model_factory, self.engine_factory)
+        slot.warm_up()
+        return slot
+
+    def start(self):
+        """Load the agents of every slot and start the event loop."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._loop.run_forever, name="service-loop",
+                                        daemon=True)
+        started = time.time()
+        slots = [self._new_slot() for _ in range(self.slots)]
+        for slot in slots:
+            self._loop.call_soon_threadsafe(self._release, slot)
+        self._thread.start()
+        print(f"[Service] {self.slots} warm slots ready in {time.time() - started:.1f}s")
+
+    def stop(self):
+        """Cancel every unfinished job and stop the event loop."""
+        for job in list(self.jobs.values()):
+            self.cancel(job.id)
+        deadline = time.time() + 10
+        while time.time() < deadline and any(job.state not in FINISHED for job in self.jobs.values()):
+            time.sleep(0.1)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    def _release(self, slot):
+        """Return a slot to the free queue; runs on the event loop."""
+        with self._lock:
+            self._free_count += 1
+        self._free.put_nowait(slot)
+
+    def free_slots(self):
+        with self._lock:
+            return self._free_count
+
+    def queued(self):
+        return sum(1 for job in self.jobs.values() if job.state == "queued")
+
+    def submit(self, pdf_path, options=None, directory=None):
+        """Queue a job and return it; raises ServiceFull at the admission limit.
+
+        Raises ValueError for unknown or invalid options.
+        """
+        if not isinstance(options or {}, dict):
+            raise ValueError("options must be an object")
+        options = {name: value for name, value in (options or {}).items() if value is not None}
+        unknown = sorted(set(options) - set(JOB_OPTIONS))
+        if unknown:
+            raise ValueError(f"unknown options {', '.join(unknown)}; jobs accept {', '.join(JOB_OPTIONS)}")
+        check_job_options(**options)
+        with self._lock:
+            if self.queued() >= self.max_queued:
+                raise ServiceFull(f"{self.max_queued} jobs are already waiting")
+            job_id = f"{self._next_id:06d}"
+            self._next_id += 1
+            job = ServiceJob(job_id, pdf_path, directory or os.path.join(self.output_dir, job_id),
+                             options)
+            self.jobs[job_id] = job
+        job.emit("queued", pdf_path=pdf_path)
+        print(f"[Service] Job {job_id} queued: {pdf_path}")
+        future = asyncio.run_coroutine_threadsafe(self._run(job), self._loop)
+        job.task = future
+        return job
+
+    def new_directory(self):
+        """Reserve a job directory for an uploaded PDF."""
+        with self._lock:
+            directory = os.path.join(self.output_dir, f"upload_{os.urandom(6).hex()}")
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.state in FINISHED or job.task is None:
+            return False
+        job.task.cancel()
+        return True
+
+    async def _monitor(self, job, metrics):
+        """Emit a progress event whenever a stage finishes more chunks, and one when playable."""
+        playable = False
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            stages = metrics.report()["stages"]
+            progress = {stage: stats["chunks"] for stage, stats in stages.items()}
+            if progress != job.progress:
+                job.progress = progress
+                job.emit("progress", chunks=progress)
+            if not playable and job.playlist():
+                playable = True
+                job.emit("playable", playlist=job.playlist())
+
+    async def _run(self, job):
+        try:
+            slot = await self._free.get()
+            with self._lock:
+                self._free_count -= 1
+        except asyncio.CancelledError:
+            job.set_state("cancelled")
+            print(f"[Service] Job {job.id} cancelled before it started")
+            return
+        pipeline = None
+        print(f"[Service] Job {job.id} running on slot {slot.id}")
+        try:
+            job.set_state("running", slot=slot.id)
+            metrics = Metrics()
+            podcast = PodcastJob(job.pdf_path, output_dir=job.directory,
+                                 summarizer=slot.summarizer, tts_agent=slot.tts_agent,
+                                 audio_cache=self.audio_cache, metrics=metrics, **job.options)
+            job.segment_dir = podcast.segment_dir
+            pipeline = podcast.pipeline()
+            monitor = asyncio.create_task(self._monitor(job, metrics))
+            try:
+                paths = await pipeline.run()
+            finally:
+                monitor.cancel()
+            job.progress = {stage: stats["chunks"]
+                            for stage, stats in metrics.report()["stages"].items()}
+            if paths:
+                job.result = paths[0]
+                job.set_state("done", result=f"/jobs/{job.id}/result", chunks=job.progress)
+            else:
+                job.error = "No podcast was produced; see the service log"
+                job.set_state("failed", error=job.error)
+        except asyncio.CancelledError:
+            job.set_state("cancelled")
+        except Exception as e:
+            job.error = str(e)
+            job.set_state("failed", error=job.error)
+        finally:
+            if pipeline is not None and job.state in ("cancelled", "failed"):
+                # A stage that is still running uses the agents; give the slot fresh ones,
+                # loading them off the event loop
+                loop = asyncio.get_running_loop()
+                if not await loop.run_in_executor(None, pipeline.join, SLOT_RELEASE_SECONDS):
+                    print(f"[Service] Replacing the agents of slot {slot.id}, "
+                          f"still busy after the job {job.state}")
+                    slot = await loop.run_in_executor(None, self._new_slot)
+            self._release(slot)
+            print(f"[Service] Job {job.id} {job.state}")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "PodcastService/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        pass  # Jobs log their own progress
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _job(self, job_id):
+        job = self.service.jobs.get(job_id)
+        if job is None:
+            self._send_json(404, {"error": f"No job {job_id}"})
+        return job
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if parts == ["health"]:
+            self._send_json(200, {"slots": self.service.slots, "free_slots": self.service.free_slots(),
+                                  "queued": self.service.queued(),
+                                  "max_queued": self.service.max_queued})
+        elif parts == ["jobs"]:
+            self._send_json(200, [job.status() for job in self.service.jobs.values()])
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = self._job(parts[1])
+            if job is not None:
+                self._send_json(200, job.status())
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events":
+            job = self._job(parts[1])
+            if job is not None:
+                self._stream_events(job)
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "result":
+            job = self._job(parts[1])
+            if job is None:
+                return
+            if not job.result or not os.path.exists(job.result):
+                self._send_json(409, {"error": f"Job {job.id} is {job.state}", "state": job.state})
+                return
+            self._send_file(job.result)
+        elif len(parts) == 4 and parts[0] == "jobs" and parts[2] == "segments":
+            job = self._job(parts[1])
+            if job is None:
+                return
+            path = os.path.join(job.segment_dir, parts[3]) if job.segment_dir else None
+            if path is None or not _SEGMENT_FILE.match(parts[3]) or not os.path.exists(path):
+                self._send_json(404, {"error": f"No segment {parts[3]} for job {job.id}"})
+                return
+            # The playlist grows while the job runs, so players must re-fetch it
+            self._send_file(path, {"Cache-Control": "no-cache"} if parts[3] == PLAYLIST_NAME else None)
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def _send_file(self, path, headers=None):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_response(200)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", _CONTENT_TYPES.get(os.path.splitext(path)[1],
+                                                               "application/octet-stream"))
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                self.wfile.write(block)
+
+    def _stream_events(self, job):
+        # HTTP/1.0 without a Content-Length: the stream ends when the connection closes
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        cursor = 0
+        try:
+            while True:
+                events = job.wait_events(cursor)
+                for event in events:
+                    self.wfile.write((json.dumps(event) + "\n").encode("utf-8"))
+                self.wfile.flush()
+                cursor += len(events)
+                if job.state in FINISHED and cursor >= len(job.events):
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client went away
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_UPLOAD_BYTES:
+            self._send_json(413, {"error": f"Uploads are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"})
+            return
+        body = self.rfile.read(length)
+        directory = None
+        try:
+            if self.headers.get("Content-Type") == "application/pdf":
+                # The PDF itself; options come as JSON in a header
+                directory = self.service.new_directory()
+                pdf_path = os.path.join(directory, "input.pdf")
+                with open(pdf_path, "wb") as f:
+                    f.write(body)
+                options = json.loads(self.headers.get("X-Job-Options") or "{}")
+            else:
+                request = json.loads(body or b"{}")
+                pdf_path = request.get("pdf_path")
+                options = request.get("options") or {}
+                if not pdf_path or not os.path.exists(pdf_path):
+                    self._send_json(400, {"error": f"PDF file not found at {pdf_path}"})
+                    return
+            job = self.service.submit(pdf_path, options, directory)
+        except (ServiceFull, ValueError) as e:
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)  # The upload never became a job
+            if isinstance(e, ServiceFull):
+                self._send_json(503, {"error": str(e)}, {"Retry-After": "30"})
+            else:
+                self._send_json(400, {"error": f"Bad request: {e}"})
+            return
+        self._send_json(202, {"id": job.id, "status": f"/jobs/{job.id}",
+                              "events": f"/jobs/{job.id}/events"})
+
+    def do_DELETE(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "jobs":
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        job = self._job(parts[1])
+        if job is not None:
+            cancelled = self.service.cancel(job.id)
+            self._send_json(202 if cancelled else 409, job.status())
+
+
+def serve(service, host="127.0.0.1", port=DEFAULT_PORT):
+    """Start the service and answer HTTP requests until Ctrl-C."""
+    service.start()
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.service = service
+    print(f"[Service] Listening on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[Service] Shutting down...")
+    finally:
+        server.server_close()
+        service.stop()
+
+
+def submit(url, pdf_path, options, upload=False, follow=False):
+    """Client side: submit a PDF, optionally print its progress until it ends. Returns an exit code."""
+    if upload:
+        with open(pdf_path, "rb") as f:
+            request = urllib.request.Request(f"{url}/jobs", data=f.read(), method="POST",
+                                             headers={"Content-Type": "application/pdf",
+                                                      "X-Job-Options": json.dumps(options)})
+    else:
+        body = json.dumps({"pdf_path": os.path.abspath(pdf_path), "options": options})
+        request = urllib.request.Request(f"{url}/jobs", data=body.encode("utf-8"), method="POST",
+                                         headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request) as response:
+            job = json.load(response)
+    except urllib.error.HTTPError as e:
+        print(f"Error: {json.load(e).get('error', e.reason)}")
+        return 1
+    except urllib.error.URLError as e:
+        print(f"Error: Service not reachable at {url}: {e.reason}")
+        return 1
+    print(f"Job {job['id']} submitted")
+    if not follow:
+        return 0
+    state = None
+    with urllib.request.urlopen(f"{url}{job['events']}") as response:
+        for line in response:
+            event = json.loads(line)
+            state = event["event"]
+            details = {k: v for k, v in event.items() if k not in ("event", "job", "seconds")}
+            print(f"[{event['seconds']:7.1f}s] {state} {json.dumps(details) if details else ''}")
+            if state == "playable":
+                print(f"Listen now: {url}{event['playlist']}")
+    if state == "done":
+        print(f"Podcast: {url}/jobs/{job['id']}/result")
+    return 0 if state == "done" else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run, or submit jobs to, the podcast service.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="start the service")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--slots", type=int, default=DEFAULT_SLOTS,
+                              help="warm model/TTS engine pairs, i.e. jobs run at once "
+                                   f"(default: {DEFAULT_SLOTS})")
+    serve_parser.add_argument("--max-queued", type=int, default=DEFAULT_MAX_QUEUED,
+                              help="jobs waiting for a slot before new ones are refused "
+                                   f"(default: {DEFAULT_MAX_QUEUED})")
+    serve_parser.add_argument("--output-dir", default=os.path.join("output", "service"))
+    serve_parser.add_argument("--no-cache", action="store_true",
+                              help="don't read or write the summary and audio caches")
+    serve_parser.add_argument("--fake", action="store_true",
+                              help="use the stand-in model and TTS engine from fakes.py")
+
+    submit_parser = subparsers.add_parser("submit", help="submit a PDF to a running service")
+    submit_parser.add_argument("pdf_path")
+    submit_parser.add_argument("--url", default=f"http://127.0.0.1:{DEFAULT_PORT}")
+    submit_parser.add_argument("--upload", action="store_true",
+                               help="send the PDF itself instead of its path")
+    submit_parser.add_argument("--follow", action="store_true",
+                               help="print progress until the job ends")
+    submit_parser.add_argument("--chunk-tokens", type=int, default=None)
+    submit_parser.add_argument("--target-chars", type=int, default=None)
+    submit_parser.add_argument("--stream", action="store_true")
+    submit_parser.add_argument("--segments", action="store_true",
+                               help="also publish an HLS playlist that is playable while the job runs")
+    args = parser.parse_args(argv)
+
+    if args.command == "submit":
+        options = {name: getattr(args, name) for name in JOB_OPTIONS if getattr(args, name)}
+        return submit(args.url.rstrip("/"), args.pdf_path, options, args.upload, args.follow)
+
+    model_factory = engine_factory = None
+    if args.fake:
+        from fakes import FakeLLM, FakeTTS
+        model_factory = FakeLLM(seconds_per_call=0.05, seconds_per_token=0.002)
+        engine_factory = FakeTTS(seconds_per_call=0.02, realtime_factor=0.02)
+    service = PodcastService(args.output_dir, args.slots, args.max_queued,
+                             cache_dir=None if args.no_cache else os.path.join("output", "cache"),
+                             model_factory=model_factory, engine_factory=engine_factory)
+    serve(service, args.host, args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from boilerplate import BoilerplateFilter
+
+WORDS = ["apples", "bridges", "candles", "dragons", "engines", "forests", "glaciers", "harbors"]
+
+
+def _body(n):
+    # Digits are normalized away, so pages differ by their words
+    word = WORDS[n]
+    return (f"{word.title()} fill this page, and nothing about {word} repeats elsewhere.\n"
+            f"A second line says more on {word} than anyone needs.\n"
+            f"Finally {word} close the page.")
+
+
+def _is_page_number(line):
+    return BoilerplateFilter()._strip([line]) == ""
+
+
+def _filter(pages):
+    return [text for _, text in BoilerplateFilter().filter(enumerate(pages))]
+
+
+def test_arabic_page_numbers_are_stripped():
+    for line in ("12", "Page 12", "12 of 300", "- 12 -"):
+        assert _is_page_number(line), line
+
+
+def test_words_made_of_roman_letters_are_kept():
+    for line in ("civil", "ill", "vili", "cl", "mix", "Civic", "I will"):
+        assert not _is_page_number(line), line
+
+
+def test_roman_page_numbers_are_stripped_when_they_recur():
+    numerals = ["i", "ii", "iii", "iv", "v", "vi", "vii", "viii"]
+    pages = _filter([_body(n) + "\n" + numeral for n, numeral in enumerate(numerals)])
+    assert pages == [_body(n) for n in range(len(numerals))]
+
+
+def test_a_lone_roman_numeral_line_is_kept():
+    pages = [_body(n) for n in range(8)]
+    pages[3] = "I\n" + pages[3]
+    assert _filter(pages)[3].startswith("I\n")
+
+
+def test_short_common_openings_are_kept():
+    pages = [f"In the {word} of things the story begins.\nThen {word} end it." for word in WORDS]
+    assert _filter(pages) == pages
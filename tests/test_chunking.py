@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import TextSummarizationAgent
+from chunking import CHARS_PER_TOKEN, TextChunker, approx_token_count
+
+
+def test_default_chunk_budget_in_characters():
+    # 2048-token context - 500-token summary - 20-token prompt - 64 overhead
+    budget = TextSummarizationAgent.token_budget(500)
+    assert budget == 1464
+    assert budget * CHARS_PER_TOKEN == 4392
+
+
+def test_chunks_stay_within_the_character_budget():
+    budget = TextSummarizationAgent.token_budget(500)
+    text = " ".join(f"Sentence {i} has a figure of {i * 7.5:.2f}% in it." for i in range(2000))
+    chunks = TextChunker(budget).chunk(text)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= budget * CHARS_PER_TOKEN for chunk in chunks)
+
+
+def test_token_estimate_rounds_up():
+    assert approx_token_count("") == 0
+    assert approx_token_count("a") == 1
+    assert approx_token_count("a" * (CHARS_PER_TOKEN + 1)) == 2
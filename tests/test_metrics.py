@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Metrics
+
+
+def test_failed_spans_are_busy_time_but_not_finished_chunks():
+    metrics = Metrics()
+    with metrics.timer("tts", 0) as timer:
+        timer.failed = True
+    metrics.observe("tts", 0.5, 1, chars=10, failed=True)
+    stats = metrics.report()["stages"]["tts"]
+    assert stats["chunks"] == 0
+    assert stats["first_done_seconds"] is None
+    assert stats["busy_seconds"] >= 0.5
+
+    with metrics.timer("tts", 2) as timer:
+        timer.chars = 10
+    stats = metrics.report()["stages"]["tts"]
+    assert stats["chunks"] == 1
+    assert stats["first_done_seconds"] is not None
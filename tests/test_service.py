@@ -0,0 +1,47 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import FakeLLM, FakeTTS
+from service import PodcastService
+
+PDF_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        "Atomic habits ( PDFDrive )-34-38.pdf")
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = PodcastService(str(tmp_path / "service"), slots=1, cache_dir=None,
+                             model_factory=FakeLLM(summary_words=10), engine_factory=FakeTTS())
+    service.start()
+    yield service
+    service.stop()
+
+
+def _finish(job):
+    job.task.result(timeout=120)
+    return [event["event"] for event in job.events if event["event"] != "progress"]
+
+
+def test_slot_is_reused_after_a_failed_job(service, tmp_path):
+    first = service.submit(str(tmp_path / "missing.pdf"))
+    second = service.submit(str(tmp_path / "also-missing.pdf"))
+    assert _finish(first) == ["queued", "running", "failed"]
+    assert _finish(second) == ["queued", "running", "failed"]
+    # The stages had exited, so the slot went back as it was
+    assert service._slot_count == 1
+    assert service.free_slots() == 1
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="merging needs ffmpeg")
+def test_job_after_a_failed_job_runs_to_done(service, tmp_path):
+    failed = service.submit(str(tmp_path / "missing.pdf"))
+    job = service.submit(PDF_PATH, {"chunk_tokens": 300})
+    assert _finish(failed) == ["queued", "running", "failed"]
+    assert _finish(job) == ["queued", "running", "done"]
+    assert os.path.exists(job.result)
+    assert service.free_slots() == 1
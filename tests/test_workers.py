@@ -0,0 +1,74 @@
+import os
+import queue
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import TextSummarizationAgent
+from fakes import FakeLLM
+from workers import SummarizerPool
+
+
+class CrashingLLM(FakeLLM):
+    """Kills the worker process on text containing "crash", once if once_path is set."""
+
+    def __init__(self, once_path=None):
+        super().__init__(summary_words=5)
+        self.once_path = once_path
+
+    def __call__(self, model_name, n_threads=None):
+        model = super().__call__(model_name, n_threads)
+        generate = model.generate
+
+        def crash_or_generate(prompt, max_tokens=200, streaming=False):
+            if "crash" in prompt and not (self.once_path and os.path.exists(self.once_path)):
+                if self.once_path:
+                    open(self.once_path, "w").close()
+                os._exit(1)
+            return generate(prompt, max_tokens, streaming)
+
+        model.generate = crash_or_generate
+        return model
+
+
+def _run(pool, texts, stream=False):
+    in_queue, out_queue = queue.Queue(), queue.Queue()
+    for item in enumerate(texts):
+        in_queue.put(item)
+    in_queue.put(None)
+    pool.start()
+    try:
+        processed = pool.run(in_queue, out_queue, stream=stream)
+    finally:
+        pool.stop()
+    results = []
+    while not out_queue.empty():
+        results.append(out_queue.get())
+    return processed, results
+
+
+def test_chunk_of_a_dead_worker_is_retried(tmp_path):
+    pool = SummarizerPool(2, model_factory=CrashingLLM(str(tmp_path / "crashed")))
+    texts = ["first chunk text", "please crash here", "third chunk text", "fourth chunk text"]
+    processed, results = _run(pool, texts)
+    assert processed == 4
+    summaries = dict(results)
+    assert sorted(summaries) == [0, 1, 2, 3]
+    assert summaries[1] == "please crash here"
+
+
+def test_chunk_that_kills_every_worker_falls_back_to_truncation():
+    pool = SummarizerPool(2, model_factory=CrashingLLM())
+    processed, results = _run(pool, ["one chunk", "crash me"])
+    summaries = dict(results)
+    assert processed == 2
+    assert summaries[0] == "one chunk"
+    assert summaries[1] == "crash me" + TextSummarizationAgent.TRUNCATION_MARKER
+
+
+def test_streamed_chunk_of_a_dead_worker_is_closed():
+    pool = SummarizerPool(2, model_factory=CrashingLLM(), retries=0)
+    processed, results = _run(pool, ["one chunk here.", "crash me."], stream=True)
+    assert processed == 2
+    keys = {key for key, text in results if text is None}
+    assert {idx for idx, _ in keys} == {0, 1}
@@ -0,0 +1,583 @@
+import collections
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from agents import TextSummarizationAgent, TTSAgent
+from audio import load_chunk_header, read_wav_header, write_sidecar
+from cache import AudioCache, SummaryCache, link_or_copy
+from ordering import CHUNK_END
+
+_TIMEOUT = object()
+
+
+def _summarizer_worker(worker_id, model_name, max_tokens, n_threads, cache_path, cache_bytes,
+                       model_factory, tasks, results, current):
+    """Process entry point: load a private model and summarize chunks until a poison pill.
+
+    current holds the sequence number of the task being worked on, in shared
+    memory, so the pool knows which chunk was lost if this process dies.
+    """
+    cache = SummaryCache(cache_path, cache_bytes) if cache_path else None
+    summarizer = TextSummarizationAgent(model_name, max_tokens=max_tokens, n_threads=n_threads,
+                                        cache=cache, model_factory=model_factory)
+    print(f"[Summarizer-{worker_id}] Ready")
+    try:
+        while True:
+            item = tasks.get()
+            if item is None:
+                break
+            seq, idx, chunk, prompt_template, stream = item
+            current.value = seq
+            print(f"[Summarizer-{worker_id}] Processing chunk {idx} of {len(chunk)} characters")
+            started = time.time()
+            if stream:
+                # Send each sentence as soon as it is generated, then an
+                # end-of-chunk marker
+                n = 0
+                for n, sentence in enumerate(summarizer.summarize_stream(chunk, prompt_template),
+                                             start=1):
+                    results.put((seq, ((idx, n - 1), sentence)))
+                results.put((seq, ((idx, n), None)))
+            else:
+                results.put((seq, (idx, summarizer.summarize(chunk, prompt_template))))
+            results.put({"timing": (idx, worker_id, started, time.time() - started, len(chunk))})
+    finally:
+        # Tell the pool this worker is done, along with its cache counters
+        results.put({"worker": worker_id, "cache": cache.stats() if cache else None})
+
+
+class SummarizerPool:
+    """Run N summarizer processes, each holding its own GPT4All model.
+
+    The pool stays warm between start() and stop(), so several rounds of work
+    (e.g. the map and reduce levels of a hierarchical summary) share the
+    loaded models. When a worker dies, the chunk it was on is handed to the
+    survivors up to retries times, then falls back to the truncated text as
+    a failing model would; a streamed chunk that already sent sentences is
+    closed where it stopped.
+    """
+
+    def __init__(self, workers, model_name="orca-mini-3b-gguf2-q4_0.ggml", max_tokens=500,
+                 n_threads=None, cache_path=None, cache_bytes=None, prefetch=2, metrics=None,
+                 model_factory=None, retries=1, health_interval=1.0):
+        self.workers = max(1, workers)
+        self.retries = retries
+        self.health_interval = health_interval
+        self.metrics = metrics
+        # Must be picklable; each worker calls it to build its own model
+        self.model_factory = model_factory
+        # Chunks handed to the workers but not yet summarized; anything
+        # beyond this waits in the (bounded) input queue
+        self.max_in_flight = self.workers * max(1, prefetch)
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        # Workers open their own connection to the shared cache database
+        self.cache_path = cache_path
+        self.cache_bytes = cache_bytes
+        self.cache_stats = {"hits": 0, "misses": 0}
+        # Split the cores between the models instead of letting each one
+        # spawn a thread per core
+        self.n_threads = n_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self._processes = []
+        self._current = []  # Per worker: sequence number of its task, in shared memory
+        self._finished = set()  # Workers that exited after a poison pill
+        self._dead = set()  # Workers that exited without one
+        self._pending = {}  # seq -> [idx, text, prompt_template, stream, attempts, sentences sent]
+        self._recovered = collections.deque()  # Fallback results for chunks of dead workers
+        self._next_seq = 0
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker processes."""
+        self._tasks = multiprocessing.Queue()
+        self._results = multiprocessing.Queue()
+        self._current = [multiprocessing.Value("q", -1, lock=False) for _ in range(self.workers)]
+        self._processes = [
+            multiprocessing.Process(
+                target=_summarizer_worker,
+                args=(n, self.model_name, self.max_tokens, self.n_threads,
+                      self.cache_path, self.cache_bytes, self.model_factory, self._tasks,
+                      self._results, self._current[n]),
+                daemon=True,
+            )
+            for n in range(self.workers)
+        ]
+        for p in self._processes:
+            p.start()
+        self._finished = set()
+        self._dead = set()
+        self._pending = {}
+        self._recovered.clear()
+        print(f"[Summarizer] Started {self.workers} workers with {self.n_threads} threads each")
+
+    def _submit(self, idx, text, prompt_template, stream):
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._pending[seq] = [idx, text, prompt_template, stream, 0, 0]
+        self._tasks.put((seq, idx, text, prompt_template, stream))
+
+    def _check_workers(self):
+        """Find workers that died, and retry or give up the chunk each was working on."""
+        self._checked = time.time()
+        for n, process in enumerate(self._processes):
+            # A worker that took its poison pill exits with 0; its last message is on the way
+            if n in self._finished or n in self._dead or process.is_alive() or process.exitcode == 0:
+                continue
+            self._dead.add(n)
+            print(f"[Summarizer] Warning: Worker {n} exited unexpectedly "
+                  f"(exit code {process.exitcode})")
+            if self.metrics is not None:
+                self.metrics.count("summarize", "worker_deaths")
+            with self._lock:
+                task = self._pending.get(self._current[n].value)
+            if task is None:
+                continue  # It was between chunks, or its last result already arrived
+            idx, text, prompt_template, stream, attempts, sent = task
+            if sent == 0 and attempts < self.retries:
+                print(f"[Summarizer] Retrying chunk {idx} on another worker")
+                task[4] += 1
+                self._tasks.put((self._current[n].value, idx, text, prompt_template, stream))
+                continue
+            self._give_up(self._current[n].value)
+        if len(self._dead) + len(self._finished) == len(self._processes):
+            # Nobody is left to take the queued chunks
+            with self._lock:
+                orphaned = sorted(self._pending)
+            for seq in orphaned:
+                self._give_up(seq)
+
+    def _give_up(self, seq):
+        """Queue the truncated-text fallback a failing model would give for a task."""
+        with self._lock:
+            task = self._pending.pop(seq, None)
+        if task is None:
+            return
+        idx, text, prompt_template, stream, attempts, sent = task
+        print(f"[Summarizer] Error: Giving up on chunk {idx}, using truncated text")
+        if self.metrics is not None:
+            self.metrics.count("summarize", "failures")
+        fallback = text[:500] + TextSummarizationAgent.TRUNCATION_MARKER
+        if not stream:
+            self._recovered.append((idx, fallback))
+            return
+        if sent == 0:
+            self._recovered.append(((idx, 0), fallback))
+            sent = 1
+        self._recovered.append(((idx, sent), None))
+
+    def _next_result(self, timeout=1.0):
+        """Return the next (idx, summary), _TIMEOUT, or None once every worker is gone."""
+        while True:
+            if self._recovered:
+                return self._recovered.popleft()
+            if time.time() - self._checked > self.health_interval:
+                self._check_workers()
+                if self._recovered:
+                    continue
+            if len(self._finished) + len(self._dead) == len(self._processes):
+                if self._dead:
+                    print(f"[Summarizer] Warning: {len(self._dead)} worker(s) exited unexpectedly")
+                return None
+            try:
+                item = self._results.get(timeout=timeout)
+            except queue.Empty:
+                self._check_workers()
+                if not self._recovered and len(self._finished) + len(self._dead) < len(self._processes):
+                    return _TIMEOUT
+                continue
+            if isinstance(item, dict) and "timing" in item:
+                # Per-chunk latency measured in the worker
+                if self.metrics is not None:
+                    idx, worker_id, started, seconds, chars = item["timing"]
+                    self.metrics.observe("summarize", seconds, idx, chars, started=started,
+                                         lane=f"summarizer-{worker_id}")
+                continue
+            if isinstance(item, dict):
+                self._finished.add(item["worker"])
+                for name, count in (item["cache"] or {}).items():
+                    self.cache_stats[name] += count
+                continue
+            seq, result = item
+            with self._lock:
+                task = self._pending.get(seq)
+                if task is None:
+                    continue  # The chunk was already given up
+                key, text = result
+                if task[3] and text is not None:
+                    task[5] += 1
+                else:
+                    del self._pending[seq]
+            return result
+
+    def map(self, items, prompt_template=None):
+        """Summarize an iterable of (idx, text) and yield (idx, summary) as each completes."""
+        submitted = 0
+        for idx, text in items:
+            self._submit(idx, text, prompt_template, False)
+            submitted += 1
+        received = 0
+        while received < submitted:
+            item = self._next_result()
+            if item is _TIMEOUT:
+                continue
+            if item is None:
+                return
+            received += 1
+            yield item
+
+    def run(self, in_queue, out_queue, prompt_template=None, stream=False):
+        """Summarize (idx, chunk) items from in_queue into (idx, summary) items on out_queue.
+
+        With stream=True, ((idx, sentence_idx), sentence) items are forwarded
+        as the model generates them instead, followed by ((idx, count), None)
+        once the chunk is complete. Returns the number of chunks once
+        in_queue yields None and every submitted chunk has come back. The
+        caller is responsible for forwarding the poison pill downstream.
+        """
+        submitted = [0]
+        fed = threading.Event()
+        in_flight = threading.Semaphore(self.max_in_flight)
+
+        def feed():
+            while True:
+                in_flight.acquire()
+                item = in_queue.get()
+                if item is None:
+                    break
+                self._submit(item[0], item[1], prompt_template, stream)
+                submitted[0] += 1
+            fed.set()
+
+        threading.Thread(target=feed, daemon=True).start()
+
+        processed = 0
+        while not (fed.is_set() and processed == submitted[0]):
+            item = self._next_result()
+            if item is _TIMEOUT:
+                continue
+            if item is None:
+                break
+            key, text = item
+            out_queue.put(item)
+            if stream and text is not None:
+                continue
+            # A summary, or the end-of-chunk marker in streaming mode
+            processed += 1
+            in_flight.release()
+            print(f"[Summarizer] Processed chunk {key}")
+        return processed
+
+    def stop(self):
+        """Send one poison pill per worker and wait for them to drain."""
+        for _ in self._processes:
+            self._tasks.put(None)
+        while self._next_result() is not None:
+            pass
+        for p in self._processes:
+            p.join(timeout=5)
+        self._processes = []
+
+
+def chunk_name(idx):
+    """File name stem for a chunk index or a tuple key such as (chunk, sentence)."""
+    if isinstance(idx, tuple):
+        return "_".join(chunk_name(i) for i in idx)
+    return str(idx)
+
+
+def synthesize_chunk(tts_agent, idx, text, output_dir, audio_cache=None):
+    """Synthesize one summary to output_dir/chunk_<idx>.wav and return its path, or None on failure.
+
+    Chunks are PCM WAV with a JSON header sidecar, validated from the header
+    rather than by decoding.
+    """
+    temp_audio_path = None
+    try:
+        # Create output directory if it doesn't exist
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # Generate a unique filename for this chunk
+        name = chunk_name(idx)
+        extension = tts_agent.FORMAT
+        audio_path = os.path.abspath(os.path.join(output_dir, f"chunk_{name}.{extension}"))
+        temp_audio_path = os.path.join(output_dir, f"temp_chunk_{name}_{os.urandom(4).hex()}.{extension}")
+        
+        print(f"\n[TTS] Processing chunk {idx}")
+        print(f"  - Text length: {len(text)} characters")
+        
+        # Reuse audio only when the text and voice settings are unchanged;
+        # the cache index validates the file without decoding it
+        key = None
+        if audio_cache is not None:
+            key = audio_cache.make_key(text, tts_agent.settings())
+            cached = audio_cache.get(key)
+            if cached is not None:
+                cached_path, duration_ms = cached
+                link_or_copy(cached_path, temp_audio_path)
+                os.replace(temp_audio_path, audio_path)
+                header = read_wav_header(audio_path)
+                if header is not None:
+                    write_sidecar(audio_path, header)
+                print(f"  - Using cached audio: {duration_ms / 1000:.1f}s")
+                return audio_path
+        
+        # Generate new audio
+        print(f"  - Generating speech...")
+        start_time = time.time()
+        
+        # Generate to temp file first
+        result = tts_agent.text_to_speech(text, temp_audio_path)
+        if not (result and os.path.exists(temp_audio_path) and os.path.getsize(temp_audio_path) > 0):
+            print("  - Error: TTS did not generate output file")
+            return None
+        
+        # Verify the audio from its header; the samples are not decoded
+        header = read_wav_header(temp_audio_path)
+        if header is None or header["frames"] == 0:
+            print("  - Error: Generated audio is not PCM WAV or has 0 duration")
+            return None
+        
+        # Move temp file to final location
+        if os.path.exists(audio_path):
+            try:
+                os.remove(audio_path)
+            except:
+                pass
+        os.rename(temp_audio_path, audio_path)
+        write_sidecar(audio_path, header)
+        if key is not None:
+            audio_cache.put(key, audio_path, header["duration_ms"])
+        
+        elapsed = time.time() - start_time
+        print(f"  - Success: Generated {header['duration_ms']//1000}s of audio in {elapsed:.1f}s")
+        print(f"  - Saved to: {os.path.basename(audio_path)}")
+        return audio_path
+        
+    except Exception as e:
+        print(f"  - Error during TTS: {str(e)}")
+        return None
+    finally:
+        # Clean up temp file if it exists
+        if temp_audio_path and os.path.exists(temp_audio_path):
+            try:
+                os.remove(temp_audio_path)
+            except:
+                pass
+
+
+def _tts_worker(worker_id, output_dir, cache_dir, cache_bytes, engine_factory, tasks, results):
+    """Process entry point: own a pyttsx3 engine and synthesize chunks until a poison pill."""
+    audio_cache = AudioCache(cache_dir, cache_bytes) if cache_dir else None
+    tts_agent = TTSAgent(engine_factory=engine_factory)
+    results.put(("ready", worker_id, tts_agent.engine is not None))
+    while True:
+        item = tasks.get()
+        if item is None:
+            break
+        idx, text = item
+        if not text or not text.strip():
+            print(f"[TTS] Warning: Empty text for chunk {idx}")
+            results.put(("done", worker_id, (idx, None, False, time.time(), 0.0)))
+            continue
+        hits = audio_cache.hits if audio_cache else 0
+        started = time.time()
+        audio_path = synthesize_chunk(tts_agent, idx, text, output_dir, audio_cache)
+        elapsed = time.time() - started
+        cache_hit = audio_cache is not None and audio_cache.hits > hits
+        if audio_path is None:
+            # The engine may be in a bad state after a failure; start a fresh one
+            print(f"[TTS-{worker_id}] Reinitializing engine after a failed chunk")
+            tts_agent._init_engine()
+        results.put(("done", worker_id, (idx, audio_path, cache_hit, started, elapsed)))
+
+
+class TTSPool:
+    """Run N TTS processes, each with its own pyttsx3 engine.
+
+    At most one chunk is in flight per worker, so the worker count is the
+    concurrency limit. A worker that takes longer than task_timeout on a
+    chunk, or dies, is considered wedged: it is killed and replaced, and the
+    chunk is retried once on another worker.
+    """
+
+    def __init__(self, workers, output_dir, task_timeout=300, retries=1, cache_dir=None,
+                 cache_bytes=None, metrics=None, engine_factory=None):
+        self.workers = max(1, workers)
+        self.metrics = metrics
+        self.engine_factory = engine_factory  # Must be picklable
+        self.output_dir = output_dir
+        # Workers open their own handle on the shared audio cache
+        self.cache_dir = cache_dir
+        self.cache_bytes = cache_bytes
+        self.cache_stats = {"hits": 0, "misses": 0}
+        self.task_timeout = task_timeout
+        self.retries = retries
+        self.restarts = 0
+        self._lock = threading.Lock()
+        # Every spawned process gets a fresh id, so late results from a
+        # killed worker can't be mistaken for its replacement's
+        self._next_id = 0
+        self._slots = {}  # worker_id -> (process, task queue)
+        self._busy = {}  # worker_id -> (item, attempt, started)
+        self._idle = queue.Queue()
+        self._retry_queue = queue.Queue()
+
+    def _spawn(self):
+        worker_id = self._next_id
+        self._next_id += 1
+        tasks = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=_tts_worker,
+            args=(worker_id, self.output_dir, self.cache_dir, self.cache_bytes, self.engine_factory,
+                  tasks, self._results),
+            daemon=True,
+        )
+        process.start()
+        self._slots[worker_id] = (process, tasks)
+        return worker_id
+
+    def start(self):
+        """Start the worker processes and return how many have a working engine."""
+        self._results = multiprocessing.Queue()
+        for _ in range(self.workers):
+            self._spawn()
+        ready = 0
+        for _ in range(self.workers):
+            try:
+                kind, worker_id, ok = self._results.get(timeout=60)
+            except queue.Empty:
+                break
+            if ok:
+                ready += 1
+                self._idle.put(worker_id)
+        threading.Thread(target=self._retry, daemon=True).start()
+        print(f"[TTS] Started {self.workers} workers, {ready} with a working engine")
+        return ready
+
+    def _retry(self):
+        """Hand chunks of restarted workers to the next idle worker until stop()."""
+        while True:
+            item = self._retry_queue.get()
+            if item is None:
+                break
+            self._dispatch(self._idle.get(), *item)
+
+    def _dispatch(self, worker_id, item, attempt):
+        with self._lock:
+            self._busy[worker_id] = (item, attempt, time.time())
+        self._slots[worker_id][1].put(item)
+
+    def _restart(self, worker_id):
+        process, _ = self._slots.pop(worker_id)
+        if process.is_alive():
+            process.terminate()
+        process.join(timeout=5)
+        self.restarts += 1
+        self._spawn()
+
+    def _check_health(self):
+        """Restart wedged or dead workers; return the chunks they were working on."""
+        now = time.time()
+        orphaned = []
+        with self._lock:
+            busy = list(self._busy.items())
+        for worker_id, (item, attempt, started) in busy:
+            process = self._slots[worker_id][0]
+            if process.is_alive() and now - started < self.task_timeout:
+                continue
+            reason = "timed out" if process.is_alive() else "died"
+            print(f"[TTS] Warning: Worker {worker_id} {reason} on chunk {item[0]}, restarting it")
+            if self.metrics is not None:
+                self.metrics.count("tts", "restarts")
+            with self._lock:
+                self._busy.pop(worker_id, None)
+            self._restart(worker_id)
+            orphaned.append((item, attempt))
+        return orphaned
+
+    def run(self, in_queue, out_queue):
+        """Synthesize (idx, text) items from in_queue, putting (idx, path) on out_queue.
+
+        Chunks that fail are reported as (idx, None). Returns (processed,
+        failed) once in_queue yields None and every chunk has finished. The
+        caller forwards the poison pill downstream.
+        """
+        submitted = [0]
+        fed = threading.Event()
+
+        def feed():
+            # Only hand out work to idle workers; this is the concurrency limit
+            while True:
+                item = in_queue.get()
+                if item is None:
+                    break
+                if item[1] is None:
+                    out_queue.put((item[0], CHUNK_END))  # Streamed chunk is complete
+                    continue
+                submitted[0] += 1
+                self._dispatch(self._idle.get(), item, 0)
+            fed.set()
+
+        threading.Thread(target=feed, daemon=True).start()
+
+        processed = 0
+        failed = 0
+        while not (fed.is_set() and processed + failed == submitted[0]):
+            try:
+                kind, worker_id, payload = self._results.get(timeout=1.0)
+            except queue.Empty:
+                kind = None
+            if kind == "ready":
+                # A restarted worker becomes available once its engine is up.
+                # Without an engine its chunks fail fast and it keeps retrying
+                # initialization, so it still rejoins rather than stalling us.
+                if not payload:
+                    print(f"[TTS] Warning: Restarted worker {worker_id} has no working engine")
+                self._idle.put(worker_id)
+            elif kind == "done":
+                with self._lock:
+                    current = self._busy.pop(worker_id, None)
+                if current is None:
+                    continue  # Late result from a worker we already replaced
+                self._idle.put(worker_id)
+                idx, audio_path, cache_hit, started, elapsed = payload
+                if self.cache_dir:
+                    self.cache_stats["hits" if cache_hit else "misses"] += 1
+                if self.metrics is not None:
+                    header = load_chunk_header(audio_path) if audio_path else None
+                    self.metrics.observe("tts", elapsed, idx, len(current[0][1]),
+                                         header["duration_ms"] / 1000 if header else 0.0,
+                                         started, lane=f"tts-{worker_id}", failed=audio_path is None)
+                    if audio_path is None:
+                        self.metrics.count("tts", "failures")
+                # Failures are forwarded too, so the publisher doesn't wait for them
+                out_queue.put((idx, audio_path))
+                if audio_path:
+                    processed += 1
+                else:
+                    failed += 1
+            for item, attempt in self._check_health():
+                if attempt < self.retries:
+                    self._retry_queue.put((item, attempt + 1))
+                else:
+                    print(f"[TTS] Error: Giving up on chunk {item[0]}")
+                    if self.metrics is not None:
+                        self.metrics.count("tts", "failures")
+                    out_queue.put((item[0], None))
+                    failed += 1
+        return processed, failed
+
+    def stop(self):
+        """Send one poison pill per worker and wait for them to exit."""
+        self._retry_queue.put(None)
+        for process, tasks in self._slots.values():
+            tasks.put(None)
+        for process, _ in self._slots.values():
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._slots = {}